@@ -0,0 +1,159 @@
+"""Boots the app on local stand-ins and measures scripted scenarios.
+
+Mongo is replaced by mongomock and Redis by fakeredis (or by disposable servers, with
+--mongo-uri / --redis-uri), and GitHub by an in-process fake API. Each scenario runs
+against a freshly seeded app, and the results are written as JSON so runs on different
+commits can be compared:
+
+    python -m benchmarks.run --output before.json
+    python -m benchmarks.run --output after.json --baseline before.json
+"""
+
+from argparse import ArgumentParser, Namespace
+import asyncio
+from datetime import UTC, datetime
+import json
+import logging
+import platform
+import subprocess
+import sys
+from time import perf_counter
+from typing import Any
+from litestar.testing import AsyncTestClient
+from subtask_api import app
+from .scenarios import SCENARIOS, Scenario
+from .standins import gridfs_support, standin_context
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if len(ordered) == 0:
+        return 0
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+async def run_scenario(scenario: Scenario, args: Namespace) -> dict[str, Any]:
+    """Seeds a fresh app for a scenario, then measures its requests
+
+    Returns:
+        dict[str, Any]: Throughput (requests/s), latency percentiles (ms) & error count
+    """
+    context = standin_context(
+        args.mongo_uri, args.redis_uri, repos=scenario.repos, issues=scenario.issues
+    )
+    await context.mongo.drop_database(context.config.databases.mongo.database)
+    await context.redis.flushdb()
+    app.state.context = context
+
+    requests = args.requests or scenario.requests
+    async with AsyncTestClient(app=app, raise_server_exceptions=False) as client:
+        await scenario.setup(client, context)
+        for index in range(min(args.warmup, requests)):
+            await scenario.request(client, index)
+
+        latencies: list[float] = []
+        errors = 0
+        pending = iter(range(requests))
+
+        async def worker() -> None:
+            nonlocal errors
+            for index in pending:
+                started = perf_counter()
+                response = await scenario.request(client, index)
+                latencies.append(perf_counter() - started)
+                if response.status_code >= 400:
+                    errors += 1
+
+        started = perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = perf_counter() - started
+
+    latencies.sort()
+    return {
+        "description": scenario.description,
+        "requests": requests,
+        "concurrency": args.concurrency,
+        "errors": errors,
+        "throughput": round(requests / elapsed, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def current_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict[str, Any], baseline: dict[str, Any]) -> str:
+    """Formats each scenario's change against a baseline run"""
+    lines = [f"{'scenario':<14}{'throughput':>22}{'p50 ms':>22}{'p99 ms':>22}"]
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+
+        columns = []
+        for key in ("throughput", "p50_ms", "p99_ms"):
+            change = (
+                (current[key] - previous[key]) / previous[key] * 100
+                if previous[key]
+                else 0
+            )
+            columns.append(f"{previous[key]:>9} -> {current[key]:<9}{change:+.0f}%")
+        lines.append(f"{name:<14}" + "".join(f"{i:>22}" for i in columns))
+    return "\n".join(lines)
+
+
+async def main(args: Namespace) -> None:
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    names = args.scenarios.split(",") if args.scenarios else list(SCENARIOS.keys())
+    unknown = [i for i in names if i not in SCENARIOS]
+    if len(unknown) > 0:
+        sys.exit(f"Unknown scenarios: {', '.join(unknown)}")
+
+    results: dict[str, Any] = {
+        "commit": current_commit(),
+        "timestamp": datetime.now(UTC).isoformat(),
+        "python": platform.python_version(),
+        "mongo": "server" if args.mongo_uri else "mongomock",
+        "redis": "server" if args.redis_uri else "fakeredis",
+        "scenarios": {},
+    }
+    with gridfs_support(args.mongo_uri):
+        for name in names:
+            print(f"Running {name}...", file=sys.stderr)
+            results["scenarios"][name] = await run_scenario(SCENARIOS[name], args)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            print(compare(results, json.load(baseline_file)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scenarios", help=f"Comma-separated subset of: {', '.join(SCENARIOS)}"
+    )
+    parser.add_argument(
+        "--requests", type=int, help="Measured requests per scenario (overrides defaults)"
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests first")
+    parser.add_argument("--mongo-uri", help="Disposable Mongo server (it is wiped)")
+    parser.add_argument("--redis-uri", help="Disposable Redis server (it is flushed)")
+    parser.add_argument("--output", help="File to write results to (default: stdout)")
+    parser.add_argument("--baseline", help="Earlier results to compare against")
+    asyncio.run(main(parser.parse_args()))
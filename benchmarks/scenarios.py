@@ -0,0 +1,206 @@
+from datetime import UTC, datetime, timedelta
+import os
+import httpx
+from litestar.testing import AsyncTestClient
+from subtask_api.models import (
+    GridFile,
+    Project,
+    ProjectConnection,
+    ProjectGrant,
+    ProjectMember,
+    ProjectPermission,
+    UserConnection,
+)
+from subtask_api.utils import ServerContext
+
+BENCHMARK_PASSWORD = "benchmark-passphrase"
+
+
+async def create_user(client: AsyncTestClient, username: str = "benchmark") -> str:
+    """Creates a user through the API, leaving the client logged in as them
+
+    Returns:
+        str: The new user's ID
+    """
+    response = await client.post(
+        "/user/auth/create",
+        json={
+            "username": username,
+            "displayName": username,
+            "password": BENCHMARK_PASSWORD,
+        },
+    )
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+async def create_connection(user_id: str) -> UserConnection:
+    connection = UserConnection(
+        user_id=user_id,
+        type="github",
+        access_token="benchmark",
+        access_expire=datetime.now(UTC) + timedelta(days=1),
+        refresh_token="benchmark",
+        refresh_expire=datetime.now(UTC) + timedelta(days=30),
+    )
+    await connection.save()
+    return connection
+
+
+class Scenario:
+    """A scripted request, repeated against a freshly seeded app"""
+
+    name: str = ""
+    description: str = ""
+    requests: int = 1000  # Default number of measured requests
+    repos: int = 0  # Repositories served by the fake GitHub API
+    issues: int = 0  # Issues in each fake repository
+
+    async def setup(self, client: AsyncTestClient, context: ServerContext) -> None:
+        pass
+
+    async def request(self, client: AsyncTestClient, index: int) -> httpx.Response:
+        raise NotImplementedError
+
+
+class AnonymousRoot(Scenario):
+    name = "anonymous"
+    description = "GET / without a session cookie"
+
+    async def request(self, client: AsyncTestClient, index: int) -> httpx.Response:
+        return await client.get("/")
+
+
+class SessionSelf(Scenario):
+    name = "session"
+    description = "GET /user/self/ with a persisted session"
+
+    async def setup(self, client: AsyncTestClient, context: ServerContext) -> None:
+        await create_user(client)
+
+    async def request(self, client: AsyncTestClient, index: int) -> httpx.Response:
+        return await client.get("/user/self/")
+
+
+class Login(Scenario):
+    name = "login"
+    description = "POST /user/auth/login, hashing the passphrase each time"
+    requests = 50
+
+    async def setup(self, client: AsyncTestClient, context: ServerContext) -> None:
+        await create_user(client)
+
+    async def request(self, client: AsyncTestClient, index: int) -> httpx.Response:
+        return await client.post(
+            "/user/auth/login",
+            json={"username": "benchmark", "password": BENCHMARK_PASSWORD},
+        )
+
+
+class FileDownload(Scenario):
+    description = "GET /files/{id} for a {size} byte file"
+
+    def __init__(self, name: str, size: int) -> None:
+        self.name = name
+        self.size = size
+        self.description = self.description.replace("{size}", str(size))
+        self.file_id = ""
+
+    async def setup(self, client: AsyncTestClient, context: ServerContext) -> None:
+        user_id = await create_user(client)
+        created = await GridFile.create(
+            os.urandom(self.size),
+            "users",
+            user_id,
+            file_name="benchmark.bin",
+            file_type="application/octet-stream",
+        )
+        self.file_id = created.id
+
+    async def request(self, client: AsyncTestClient, index: int) -> httpx.Response:
+        return await client.get(f"/files/{self.file_id}")
+
+
+class ProjectListing(Scenario):
+    name = "projects"
+    description = "GET /projects/ for a member of 10k projects"
+    requests = 50
+    projects = 10000
+
+    async def setup(self, client: AsyncTestClient, context: ServerContext) -> None:
+        user_id = await create_user(client)
+        member = ProjectMember(
+            user_id=user_id,
+            permission=ProjectPermission.OWNER,
+            grant=ProjectGrant.OWNER,
+        )
+        for offset in range(0, self.projects, 1000):
+            await Project.insert_many(
+                [
+                    Project(name=f"Project {i}", summary="", members=[member])
+                    for i in range(offset, min(offset + 1000, self.projects))
+                ]
+            )
+
+    async def request(self, client: AsyncTestClient, index: int) -> httpx.Response:
+        return await client.get("/projects/")
+
+
+class LocationListing(Scenario):
+    name = "locations"
+    description = "GET /connections/{id}/locations for a GitHub user with 5k repositories"
+    requests = 200
+    repos = 5000
+
+    async def setup(self, client: AsyncTestClient, context: ServerContext) -> None:
+        connection = await create_connection(await create_user(client))
+        self.connection_id = connection.id
+
+    async def request(self, client: AsyncTestClient, index: int) -> httpx.Response:
+        return await client.get(f"/connections/{self.connection_id}/locations")
+
+
+class IssueSync(Scenario):
+    name = "sync"
+    description = "POST /projects/{id}/sync for an unchanged 2k-issue repository"
+    requests = 50
+    repos = 1
+    issues = 2000  # Kept small as mongomock scans the collection for every upsert
+
+    async def setup(self, client: AsyncTestClient, context: ServerContext) -> None:
+        user_id = await create_user(client)
+        connection = await create_connection(user_id)
+        project = Project(
+            name="Synced",
+            connection=ProjectConnection(connection_id=connection.id, location=0),
+            members=[
+                ProjectMember(
+                    user_id=user_id,
+                    permission=ProjectPermission.OWNER,
+                    grant=ProjectGrant.OWNER,
+                )
+            ],
+        )
+        await project.save()
+        self.project_id = project.id
+        # The first (full) sync isn't measured
+        response = await client.post(f"/projects/{project.id}/sync")
+        response.raise_for_status()
+
+    async def request(self, client: AsyncTestClient, index: int) -> httpx.Response:
+        return await client.post(f"/projects/{self.project_id}/sync")
+
+
+SCENARIOS: dict[str, Scenario] = {
+    i.name: i
+    for i in [
+        AnonymousRoot(),
+        SessionSelf(),
+        Login(),
+        FileDownload("files_small", 64 * 1024),
+        FileDownload("files_large", 4 * 1024 * 1024),
+        ProjectListing(),
+        LocationListing(),
+        IssueSync(),
+    ]
+}
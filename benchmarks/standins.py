@@ -0,0 +1,159 @@
+from contextlib import contextmanager
+from datetime import UTC, datetime, timedelta
+import hashlib
+import json
+from typing import Any, Callable, Iterator
+import httpx
+from subtask_api.utils import ServerConfig, ServerContext
+
+GITHUB_PAGE_SIZE = 100
+ISSUES_EPOCH = datetime(2024, 1, 1, tzinfo=UTC)
+
+
+def standin_config() -> ServerConfig:
+    """A config with placeholder credentials, for contexts whose clients are supplied directly"""
+    placeholder = {
+        "connection_uri": "",
+        "username": "",
+        "password": "",
+        "database": "subtask_benchmark",
+    }
+    return ServerConfig(
+        databases={"mongo": placeholder, "redis": placeholder},
+        oauth={
+            "github": {
+                "app_id": "0",
+                "client_id": "benchmark",
+                "client_secret": "benchmark",
+                "private_key": "",
+            }
+        },
+    )
+
+
+def fake_repository(index: int) -> dict[str, Any]:
+    return {
+        "id": index,
+        "full_name": f"benchmark/repository-{index}",
+        "description": f"Benchmark repository #{index}",
+    }
+
+
+def fake_issue(index: int) -> dict[str, Any]:
+    return {
+        "id": 1000000 + index,
+        "number": index + 1,
+        "title": f"Benchmark issue #{index + 1}",
+        "state": "closed" if index % 3 == 0 else "open",
+        "labels": [{"name": f"label-{index % 10}"}],
+        "html_url": f"https://github.com/benchmark/repository-0/issues/{index + 1}",
+        "updated_at": (ISSUES_EPOCH + timedelta(seconds=index)).strftime(
+            "%Y-%m-%dT%H:%M:%SZ"
+        ),
+        "body": "Lorem ipsum " * 50,
+    }
+
+
+def github_transport(repos: int, issues: int = 0) -> httpx.MockTransport:
+    """Serves a fake GitHub API of `repos` repositories, honouring pagination, `since` & ETags
+
+    Args:
+        repos (int): Number of repositories the user can access
+        issues (int, optional): Number of issues in every repository. Defaults to 0.
+
+    Returns:
+        httpx.MockTransport: Transport to build the context's HTTP client with
+    """
+
+    def paginate(
+        request: httpx.Request, make_item: Callable[[int], Any], first: int, last: int
+    ) -> httpx.Response:
+        """Serves the requested page of the items numbered `first` to `last`"""
+        page = int(request.url.params.get("page", "1"))
+        per_page = int(request.url.params.get("per_page", "30"))
+        start = first + (page - 1) * per_page
+        body = json.dumps(
+            [make_item(i) for i in range(start, min(start + per_page, last))]
+        ).encode()
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304, headers={"ETag": etag})
+
+        headers = {"ETag": etag, "Content-Type": "application/json"}
+        if start + per_page < last:
+            next_url = request.url.copy_set_param("page", page + 1)
+            headers["Link"] = f'<{next_url}>; rel="next"'
+        return httpx.Response(200, content=body, headers=headers)
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path == "/user/repos":
+            return paginate(request, fake_repository, 0, repos)
+
+        if path.startswith("/repositories/") and path.endswith("/issues"):
+            since = request.url.params.get("since")
+            first = 0
+            if since:
+                changed = datetime.fromisoformat(since) - ISSUES_EPOCH
+                first = min(max(int(changed.total_seconds()), 0), issues)
+            return paginate(request, fake_issue, first, issues)
+
+        return httpx.Response(404, json={"message": "Not Found"})
+
+    return httpx.MockTransport(handle)
+
+
+def standin_context(
+    mongo_uri: str | None = None,
+    redis_uri: str | None = None,
+    repos: int = 0,
+    issues: int = 0,
+) -> ServerContext:
+    """Builds a ServerContext on local stand-ins
+
+    Args:
+        mongo_uri (str | None, optional): A disposable Mongo server to use instead of mongomock. Defaults to None.
+        redis_uri (str | None, optional): A disposable Redis server to use instead of fakeredis. Defaults to None.
+        repos (int, optional): Repositories served by the fake GitHub API. Defaults to 0.
+        issues (int, optional): Issues in each fake repository. Defaults to 0.
+
+    Returns:
+        ServerContext: The context, ready to initialize
+    """
+    if mongo_uri:
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        mongo = AsyncIOMotorClient(mongo_uri)
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+
+        mongo = AsyncMongoMockClient()
+
+    if redis_uri:
+        from redis.asyncio import Redis
+
+        redis = Redis.from_url(redis_uri)
+    else:
+        from fakeredis import FakeAsyncRedis
+
+        redis = FakeAsyncRedis()
+
+    return ServerContext(
+        config=standin_config(),
+        redis=redis,
+        mongo=mongo,
+        http=httpx.AsyncClient(transport=github_transport(repos, issues)),
+    )
+
+
+@contextmanager
+def gridfs_support(mongo_uri: str | None) -> Iterator[None]:
+    """Lets GridFS run on mongomock (a no-op when a real server is used)"""
+    if mongo_uri:
+        yield
+        return
+
+    from mongomock_motor import enabled_gridfs_integration
+
+    with enabled_gridfs_integration():
+        yield
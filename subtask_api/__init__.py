@@ -1,19 +1,42 @@
 from datetime import datetime
+from functools import partial
 from typing import Any
 from litestar import Litestar, get, MediaType, Request, Response
 from litestar.datastructures import State
 
-from .utils import ServerContext, CookieSessionManager, provide_session, provide_context
+from .utils import (
+    ServerContext,
+    CookieSessionManager,
+    IdentityMapMiddleware,
+    TimingMiddleware,
+    provide_session,
+    provide_context,
+)
 from litestar.status_codes import HTTP_500_INTERNAL_SERVER_ERROR
 from litestar.di import Provide
 from .models import Session, ExpandedSession
+from .connections import GITHUB_EVENT_JOB, process_github_event, refresh_expiring
 from .controllers import *
 
 
 async def handle_startup(app: Litestar) -> None:
-    context = ServerContext()
+    # A context may already be provided (e.g. one built on local stand-ins)
+    if app.state.context is None:
+        app.state.context = ServerContext()
+    context: ServerContext = app.state.context
+    context.jobs.register(GITHUB_EVENT_JOB, partial(process_github_event, context))
+    context.jobs.every(
+        "refresh_tokens",
+        context.config.http.token_refresh_interval,
+        partial(refresh_expiring, context),
+    )
     await context.initialize()
-    app.state.context = context
+
+
+async def handle_shutdown(app: Litestar) -> None:
+    if app.state.context:
+        await app.state.context.close()
+        app.state.context = None
 
 
 @get("/")
@@ -39,16 +62,22 @@ app = Litestar(
     route_handlers=[
         get_root,
         get_file_content,
+        get_metrics,
         UserAuthenticationController,
         ConnectionController,
         ConnectionOperationController,
         UserSelfController,
         ProjectMetaController,
         SingleProjectController,
+        TaskController,
+        ProjectFeedController,
+        HealthController,
+        WebhookController,
     ],
     state=State(state={"context": None}),
     on_startup=[handle_startup],
-    middleware=[CookieSessionManager],
+    on_shutdown=[handle_shutdown],
+    middleware=[TimingMiddleware, IdentityMapMiddleware, CookieSessionManager],
     exception_handlers={Exception: plain_text_exception_handler},
     dependencies={
         "session": Provide(provide_session),
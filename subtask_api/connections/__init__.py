@@ -1,14 +1,21 @@
-from .base import BaseConnectionProvider
+from .base import BaseConnectionProvider, ConnectionItem, RateLimitBudget
 from .github import GithubConnectionProvider
-from ..models import UserConnection
-from ..utils import ServerContext
-
-CONNECTION_PROVIDERS = {"github": GithubConnectionProvider}
-
-
-async def get_provider(
-    connection: UserConnection, context: ServerContext
-) -> GithubConnectionProvider | None:
-    return await CONNECTION_PROVIDERS.get(connection.type).create(
-        getattr(context.config.oauth, connection.type), connection
-    )
+from .providers import (
+    CONNECTION_PROVIDERS,
+    get_provider,
+    refresh_connection,
+    refresh_expiring,
+)
+from .sync import (
+    SyncInProgressError,
+    SyncResult,
+    apply_items,
+    remove_items,
+    sync_project,
+)
+from .webhooks import (
+    GITHUB_EVENT_JOB,
+    github_event_job,
+    process_github_event,
+    verify_github_signature,
+)
@@ -1,15 +1,96 @@
-from typing import Type, TypeVar
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime, timedelta
+from math import ceil
+import time
+from typing import Any, AsyncIterator, Type, TypeVar
 from pydantic import BaseModel
+import httpx
+from litestar.exceptions import TooManyRequestsException
+from litestar.stores.base import Store
 from ..utils import OAUTH_CONFIGS
 from ..models import UserConnection, ConnectionLocation
 
 
+def as_utc(value: datetime) -> datetime:
+    """Marks a datetime read back from Mongo (which drops the zone, storing UTC) as UTC"""
+    return value.replace(tzinfo=UTC) if value.tzinfo is None else value
+
+
 class ConnectionProfileInfo(BaseModel):
     account_name: str | None
     account_image: str | None
 
+
+class ConnectionItem(BaseModel):
+    """An upstream work item (e.g. a GitHub issue) that can be mirrored as a task"""
+
+    id: str
+    number: int | None = None
+    title: str
+    open: bool
+    labels: list[str] = []
+    url: str | None = None
+    updated: datetime
+
+
 TConnection = TypeVar("TConnection")
 
+
+def refresh_due(connection: UserConnection, ahead: float = 0) -> bool:
+    """Whether a connection's access token expires within `ahead` seconds"""
+    expires = as_utc(connection.access_expire)
+    return datetime.now(UTC) + timedelta(seconds=ahead) > expires
+
+
+class RateLimitBudget:
+    """Tracks an upstream API's remaining rate limit for one connection, queueing calls
+    once it runs low instead of letting them fail.
+
+    Upstream responses report the authoritative budget through `update`; between them,
+    each call optimistically spends one request.
+    """
+
+    def __init__(self, reserve: int = 0, max_wait: float = 0, concurrency: int = 4) -> None:
+        self.reserve = reserve  # Requests left unspent, as other workers share the limit
+        self.max_wait = max_wait  # Longest a call waits for the limit to reset
+        self.remaining: int | None = None  # Unknown until the first response
+        self.reset_at = 0.0  # Epoch seconds when the limit resets
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    def wait_time(self) -> float:
+        """Seconds until a call may be made without dipping into the reserve"""
+        if self.remaining is None or self.remaining > self.reserve:
+            return 0
+        return max(self.reset_at - time.time(), 0)
+
+    def update(self, remaining: int, reset_at: float) -> None:
+        self.remaining = remaining
+        self.reset_at = reset_at
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[None]:
+        """Holds a slot for one upstream call, waiting for the limit to reset if exhausted
+
+        Raises:
+            TooManyRequestsException: If the limit resets later than `max_wait`
+        """
+        async with self.semaphore:
+            wait = self.wait_time()
+            if wait > self.max_wait:
+                raise TooManyRequestsException(
+                    "Connection rate limit exhausted",
+                    headers={"Retry-After": str(ceil(wait))},
+                )
+            if wait > 0:
+                await asyncio.sleep(wait)
+                self.remaining = None
+
+            if self.remaining is not None:
+                self.remaining -= 1
+            yield
+
+
 class BaseConnectionProvider:
     @classmethod
     def get_redirect_url(cls, config: OAUTH_CONFIGS) -> str:
@@ -17,13 +98,13 @@ class BaseConnectionProvider:
 
     @classmethod
     async def get_connection(
-        cls, config: OAUTH_CONFIGS, **kwargs
+        cls, config: OAUTH_CONFIGS, http: httpx.AsyncClient, **kwargs
     ) -> UserConnection | None:
         raise NotImplementedError
 
     @classmethod
     async def refresh(
-        cls, config: OAUTH_CONFIGS, connection: UserConnection
+        cls, config: OAUTH_CONFIGS, http: httpx.AsyncClient, connection: UserConnection
     ) -> UserConnection:
         raise NotImplementedError
 
@@ -31,20 +112,69 @@ class BaseConnectionProvider:
     async def create(
         cls: Type[TConnection],
         config: OAUTH_CONFIGS,
+        http: httpx.AsyncClient,
         connection: UserConnection,
         *args,
         **kwargs
     ) -> TConnection:
-        return cls(config, connection, *args, **kwargs)
+        return cls(config, http, connection, *args, **kwargs)
 
     def __init__(
-        self, config: OAUTH_CONFIGS, connection: UserConnection, *args, **kwargs
+        self,
+        config: OAUTH_CONFIGS,
+        http: httpx.AsyncClient,
+        connection: UserConnection,
+        cache: Store,
+        budget: RateLimitBudget,
+        *args,
+        **kwargs
     ) -> None:
         self.config = config
+        self.http = http
         self.connection = connection
+        self.cache = cache  # Upstream responses, kept for conditional requests
+        self.budget = budget
+
+    @property
+    def expired(self) -> bool:
+        return refresh_due(self.connection)
 
     async def get_profile_info(self) -> ConnectionProfileInfo:
         raise NotImplementedError
 
+    @classmethod
+    def valid_cursor(cls, cursor: str) -> bool:
+        """Whether a client-supplied cursor has the shape iter_locations produces"""
+        return True
+
+    async def iter_locations(
+        self, cursor: str | None = None
+    ) -> AsyncIterator[tuple[str, ConnectionLocation]]:
+        """Iterates over possible project locations as they are fetched
+
+        Args:
+            cursor (str | None, optional): Opaque position to resume from. Defaults to None.
+
+        Yields:
+            tuple[str, ConnectionLocation]: Each location, with the cursor pointing after it
+        """
+        raise NotImplementedError
+        yield
+
     async def get_locations(self) -> list[ConnectionLocation]:
         raise NotImplementedError
+
+    async def iter_items(
+        self, location: Any, since: datetime | None = None
+    ) -> AsyncIterator[list[ConnectionItem]]:
+        """Iterates over a location's items changed since a time, oldest change first
+
+        Args:
+            location (Any): Location ID, as listed by iter_locations
+            since (datetime | None, optional): Only yield items changed at/after this time. Defaults to None.
+
+        Yields:
+            list[ConnectionItem]: Each batch of items, as fetched
+        """
+        raise NotImplementedError
+        yield
@@ -1,94 +1,124 @@
-import asyncio
 from datetime import UTC, datetime, timedelta
-from typing import Type, TypeVar
-from github import Github, Auth
-from litestar.exceptions import ClientException
+import re
+from typing import Any, AsyncIterator, TypeVar
 import httpx
+from litestar.stores.base import Store
 
 from ..models import UserConnection, ConnectionLocation
 
-from .base import BaseConnectionProvider, ConnectionProfileInfo
+from .base import (
+    BaseConnectionProvider,
+    ConnectionItem,
+    ConnectionProfileInfo,
+    RateLimitBudget,
+)
+from .github_client import GithubClient
 from ..utils import GithubOAuthConfig
 from urllib.parse import quote, parse_qs
 
 TConnection = TypeVar("TConnection")
+LOCATIONS_PAGE_SIZE = 100
+ISSUES_PAGE_SIZE = 100
+LOCATION_CURSOR = re.compile(r"[1-9]\d{0,5}:\d{1,3}")  # page:offset within the page
+
+
+def shape_locations(repos: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Keeps only the repository fields locations are built from, so cached pages stay small"""
+    return [
+        ConnectionLocation(
+            id=repo["id"],
+            display_name=repo["full_name"],
+            description=repo["description"],
+        ).model_dump(mode="json")
+        for repo in repos
+    ]
+
+
+def shape_issues(issues: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Keeps only the issue fields tasks are synced from (dropping bodies, users etc.)"""
+    return [
+        {
+            "id": issue["id"],
+            "number": issue["number"],
+            "title": issue["title"],
+            "state": issue["state"],
+            "labels": [i["name"] for i in issue["labels"]],
+            "html_url": issue["html_url"],
+            "updated_at": issue["updated_at"],
+            "pull_request": "pull_request" in issue,
+        }
+        for issue in issues
+    ]
+
+
+def issue_item(issue: dict[str, Any]) -> ConnectionItem:
+    """Builds the item for an issue, as reduced by shape_issues"""
+    return ConnectionItem(
+        id=str(issue["id"]),
+        number=issue["number"],
+        title=issue["title"],
+        open=issue["state"] == "open",
+        labels=issue["labels"],
+        url=issue["html_url"],
+        updated=issue["updated_at"],
+    )
+
 
 class GithubConnectionProvider(BaseConnectionProvider):
 
     def __init__(
-        self, config: GithubOAuthConfig, connection: UserConnection, github: Github
-    ) -> None:
-        super().__init__(config, connection)
-        self.github = github
-
-    @classmethod
-    async def create(
-        cls: Type["GithubConnectionProvider"],
+        self,
         config: GithubOAuthConfig,
+        http: httpx.AsyncClient,
         connection: UserConnection,
-        *args,
-        **kwargs,
-    ) -> "GithubConnectionProvider":
-        github = await cls.create_authenticated_github(config, connection)
-        return cls(config, connection, github)
-
-    @classmethod
-    async def create_authenticated_github(
-        cls, config: GithubOAuthConfig, connection: UserConnection
-    ) -> Github:
-        if datetime.now(UTC) > connection.access_expire.astimezone(UTC):
-            connection = await cls.refresh(config, connection)
-        if not connection:
-            raise ClientException(
-                "GH access token is invalid and was unable to be refreshed."
-            )
-        return Github(
-            auth=Auth.AppUserAuth(
-                config.client_id, config.client_secret, connection.access_token
-            )
-        )
+        cache: Store,
+        budget: RateLimitBudget,
+    ) -> None:
+        super().__init__(config, http, connection, cache, budget)
+        self.github = GithubClient(http, connection.access_token, cache, budget)
 
     @classmethod
     async def refresh(
-        cls, config: GithubOAuthConfig, connection: UserConnection
+        cls,
+        config: GithubOAuthConfig,
+        http: httpx.AsyncClient,
+        connection: UserConnection,
     ) -> UserConnection:
-        print(connection)
-        async with httpx.AsyncClient() as client:
-            result = await client.post(
-                "https://github.com/login/oauth/access_token",
-                params={
-                    "client_id": config.client_id,
-                    "client_secret": config.client_secret,
-                    "grant_type": "refresh_token",
-                    "refresh_token": connection.refresh_token,
-                },
-                follow_redirects=True,
-                headers={"Content-Type": "application/json"},
-            )
-            if result.is_success:
-                result_dict = {
-                    k: v[0] if type(v) == list else v
-                    for k, v in parse_qs(result.text).items()
-                }
-                if "error" in result_dict.keys():
-                    return None
-                return UserConnection(
-                    id=connection.id,
-                    user_id=connection.user_id,
-                    type="github",
-                    access_token=result_dict.get("access_token", ""),
-                    access_expire=datetime.now(UTC)
-                    + timedelta(seconds=float(result_dict.get("expires_in", "0"))),
-                    refresh_token=result_dict.get("refresh_token", ""),
-                    refresh_expire=datetime.now(UTC)
-                    + timedelta(
-                        seconds=float(result_dict.get("refresh_token_expires_in", "0"))
-                    ),
-                    account_name=connection.account_name,
-                    account_image=connection.account_image,
-                )
-            else:
+        result = await http.post(
+            "https://github.com/login/oauth/access_token",
+            params={
+                "client_id": config.client_id,
+                "client_secret": config.client_secret,
+                "grant_type": "refresh_token",
+                "refresh_token": connection.refresh_token,
+            },
+            follow_redirects=True,
+            headers={"Content-Type": "application/json"},
+        )
+        if result.is_success:
+            result_dict = {
+                k: v[0] if type(v) == list else v
+                for k, v in parse_qs(result.text).items()
+            }
+            if "error" in result_dict.keys():
                 return None
+            return UserConnection(
+                id=connection.id,
+                user_id=connection.user_id,
+                type="github",
+                access_token=result_dict.get("access_token", ""),
+                access_expire=datetime.now(UTC)
+                + timedelta(seconds=float(result_dict.get("expires_in", "0"))),
+                refresh_token=result_dict.get("refresh_token", ""),
+                refresh_expire=datetime.now(UTC)
+                + timedelta(
+                    seconds=float(result_dict.get("refresh_token_expires_in", "0"))
+                ),
+                account_name=connection.account_name,
+                account_image=connection.account_image,
+            )
+        else:
+            return None
 
     @classmethod
     def get_redirect_url(cls, config: GithubOAuthConfig) -> str:
@@ -96,79 +126,131 @@ class GithubConnectionProvider(BaseConnectionProvider):
 
     @classmethod
     async def get_connection(
-        cls, config: GithubOAuthConfig, code: str = None, **kwargs
+        cls,
+        config: GithubOAuthConfig,
+        http: httpx.AsyncClient,
+        code: str = None,
+        **kwargs,
     ) -> UserConnection | None:
-        async with httpx.AsyncClient() as client:
-            result = await client.post(
-                "https://github.com/login/oauth/access_token",
-                params={
-                    "client_id": config.client_id,
-                    "client_secret": config.client_secret,
-                    "code": code,
-                },
-                follow_redirects=True,
-                headers={"Content-Type": "application/json"},
+        result = await http.post(
+            "https://github.com/login/oauth/access_token",
+            params={
+                "client_id": config.client_id,
+                "client_secret": config.client_secret,
+                "code": code,
+            },
+            follow_redirects=True,
+            headers={"Content-Type": "application/json"},
+        )
+        if result.is_success:
+            result_dict = {
+                k: v[0] if type(v) == list else v
+                for k, v in parse_qs(result.text).items()
+            }
+            return UserConnection(
+                type="github",
+                user_id="",
+                access_token=result_dict.get("access_token", ""),
+                access_expire=datetime.now(UTC)
+                + timedelta(seconds=float(result_dict.get("expires_in", "0"))),
+                refresh_token=result_dict.get("refresh_token", ""),
+                refresh_expire=datetime.now(UTC)
+                + timedelta(
+                    seconds=float(result_dict.get("refresh_token_expires_in", "0"))
+                ),
             )
-            if result.is_success:
-                result_dict = {
-                    k: v[0] if type(v) == list else v
-                    for k, v in parse_qs(result.text).items()
-                }
-                print(result_dict)
-                return UserConnection(
-                    type="github",
-                    user_id="",
-                    access_token=result_dict.get("access_token", ""),
-                    access_expire=datetime.now(UTC)
-                    + timedelta(seconds=float(result_dict.get("expires_in", "0"))),
-                    refresh_token=result_dict.get("refresh_token", ""),
-                    refresh_expire=datetime.now(UTC)
-                    + timedelta(
-                        seconds=float(result_dict.get("refresh_token_expires_in", "0"))
-                    ),
-                )
-            else:
-                return None
+        else:
+            return None
 
     @classmethod
     async def get_access_token(
-        cls, config: GithubOAuthConfig, code: str = None, **kwargs
+        cls,
+        config: GithubOAuthConfig,
+        http: httpx.AsyncClient,
+        code: str = None,
+        **kwargs,
     ) -> str | None:
-        async with httpx.AsyncClient() as client:
-            result = await client.post(
-                "https://github.com/login/oauth/access_token",
-                params={
-                    "client_id": config.client_id,
-                    "client_secret": config.client_secret,
-                    "code": code,
-                },
-                follow_redirects=True,
-                headers={"Content-Type": "application/json"},
-            )
-            if result.is_success:
-                result_dict = parse_qs(result.text)
-                return result_dict.get("access_token", [None])[0]
-            else:
-                return None
+        result = await http.post(
+            "https://github.com/login/oauth/access_token",
+            params={
+                "client_id": config.client_id,
+                "client_secret": config.client_secret,
+                "code": code,
+            },
+            follow_redirects=True,
+            headers={"Content-Type": "application/json"},
+        )
+        if result.is_success:
+            result_dict = parse_qs(result.text)
+            return result_dict.get("access_token", [None])[0]
+        else:
+            return None
 
     async def get_profile_info(self) -> ConnectionProfileInfo:
-        result = await asyncio.to_thread(self.github.get_user)
+        result = await self.github.get("/user")
         return ConnectionProfileInfo(
-            account_name=result.name, account_image=result.avatar_url
+            account_name=result.data["name"], account_image=result.data["avatar_url"]
         )
 
+    @classmethod
+    def valid_cursor(cls, cursor: str) -> bool:
+        return LOCATION_CURSOR.fullmatch(cursor) is not None
+
+    async def iter_locations(
+        self, cursor: str | None = None
+    ) -> AsyncIterator[tuple[str, ConnectionLocation]]:
+        page, offset = (int(i) for i in cursor.split(":")) if cursor else (1, 0)
+        async for page, response in self.github.paginate(
+            "/user/repos",
+            params={"affiliation": "owner,collaborator", "sort": "updated"},
+            page=page,
+            per_page=LOCATIONS_PAGE_SIZE,
+            shape=shape_locations,
+        ):
+            for index, location in enumerate(response.data[offset:], start=offset + 1):
+                yield f"{page}:{index}", ConnectionLocation(**location)
+            offset = 0
+
     async def get_locations(self) -> list[ConnectionLocation]:
-        repos = await asyncio.to_thread(
-            lambda: [
-                i
-                for i in self.github.get_user().get_repos(
-                    affiliation="owner,collaborator", sort="updated"
-                )
-            ]
-        )
-        return [
-            ConnectionLocation(
-                id=repo.id, display_name=repo.full_name, description=repo.description
+        return [location async for _, location in self.iter_locations()]
+
+    async def iter_items(
+        self, location: Any, since: datetime | None = None
+    ) -> AsyncIterator[list[ConnectionItem]]:
+        """Iterates over a repository's issues (not pull requests) changed since a time
+
+        Pages are fetched by keyset on `since` rather than by page number, so issues
+        updated mid-sync move further along instead of shifting unseen ones onto pages
+        already fetched. An unchanged repository revalidates to a free 304.
+        """
+        repository = location["id"] if isinstance(location, dict) else location
+        page = 1
+        while True:
+            params = {
+                "state": "all",
+                "sort": "updated",
+                "direction": "asc",
+                "per_page": ISSUES_PAGE_SIZE,
+                "page": page,
+            }
+            if since:
+                params["since"] = since.astimezone(UTC).strftime("%Y-%m-%dT%H:%M:%SZ")
+            response = await self.github.get(
+                f"/repositories/{repository}/issues",
+                params=params,
+                fresh_for=0,
+                shape=shape_issues,
             )
-            for repo in repos
-        ]
+            yield [
+                issue_item(issue)
+                for issue in response.data
+                if not issue["pull_request"]
+            ]
+
+            if not response.has_next or len(response.data) == 0:
+                break
+            newest = datetime.fromisoformat(response.data[-1]["updated_at"])
+            if since is None or newest > since:
+                since, page = newest, 1
+            else:  # A whole page changed within the same second
+                page += 1
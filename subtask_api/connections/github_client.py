@@ -0,0 +1,182 @@
+import time
+from typing import Any, AsyncIterator, Callable
+from urllib.parse import urlencode
+import httpx
+from litestar.exceptions import ClientException, TooManyRequestsException
+from litestar.stores.base import Store
+from pydantic import BaseModel
+
+from .base import RateLimitBudget
+
+GITHUB_API = "https://api.github.com"
+CACHE_FRESH_FOR = 60  # Seconds a cached response is served without revalidation
+CACHE_EXPIRE = 86400  # Seconds a cached response is kept for conditional requests
+
+
+class GithubResponse(BaseModel):
+    data: Any
+    etag: str | None = None
+    last_modified: str | None = None
+    link: str = ""
+    checked: float  # When upstream last confirmed this response
+    cached: bool = False  # Served from the cache (fresh or revalidated with a 304)
+
+    @property
+    def has_next(self) -> bool:
+        return 'rel="next"' in self.link
+
+
+class GithubClient:
+    """Async access to the GitHub REST API for one connection.
+
+    GET responses are cached per connection and revalidated with `If-None-Match` /
+    `If-Modified-Since`, so unchanged resources cost a 304 (which GitHub does not count
+    against the rate limit). Every call goes through the connection's `RateLimitBudget`.
+    """
+
+    def __init__(
+        self, http: httpx.AsyncClient, token: str, cache: Store, budget: RateLimitBudget
+    ) -> None:
+        self.http = http
+        self.cache = cache
+        self.budget = budget
+        self.headers = {
+            "Accept": "application/vnd.github+json",
+            "Authorization": f"Bearer {token}",
+            "X-GitHub-Api-Version": "2022-11-28",
+        }
+
+    def track_budget(self, response: httpx.Response) -> None:
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset = response.headers.get("X-RateLimit-Reset")
+        if remaining is not None and reset is not None:
+            self.budget.update(int(remaining), float(reset))
+
+        # Secondary rate limits only say how long to back off
+        retry_after = response.headers.get("Retry-After")
+        if response.status_code in (403, 429) and retry_after is not None:
+            self.budget.update(0, time.time() + float(retry_after))
+
+    def rate_limited(self, response: httpx.Response) -> bool:
+        return response.status_code == 429 or (
+            response.status_code == 403
+            and (
+                response.headers.get("X-RateLimit-Remaining") == "0"
+                or "Retry-After" in response.headers
+            )
+        )
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Sends a request within the rate limit budget, retrying once if GitHub throttles it
+
+        Raises:
+            TooManyRequestsException: If the budget is exhausted for longer than its `max_wait`
+        """
+        headers = {**self.headers, **kwargs.pop("headers", {})}
+        for attempt in range(2):
+            async with self.budget.acquire():
+                response = await self.http.request(
+                    method, GITHUB_API + path, headers=headers, **kwargs
+                )
+            self.track_budget(response)
+            if not self.rate_limited(response) or attempt > 0:
+                return response
+        return response
+
+    async def get(
+        self,
+        path: str,
+        params: dict[str, Any] | None = None,
+        fresh_for: float = CACHE_FRESH_FOR,
+        shape: Callable[[Any], Any] | None = None,
+    ) -> GithubResponse:
+        """Gets a resource, from the cache when fresh and with a conditional request otherwise
+
+        Args:
+            path (str): API path, eg `/user/repos`
+            params (dict[str, Any] | None, optional): Query parameters. Defaults to None.
+            fresh_for (float, optional): Seconds a cached copy is trusted without asking GitHub. Defaults to CACHE_FRESH_FOR.
+            shape (Callable[[Any], Any] | None, optional): Reduces the decoded body to what callers need before it is cached. Defaults to None.
+
+        Raises:
+            ClientException: If GitHub returns an error
+            TooManyRequestsException: If rate limited with no cached copy to fall back on
+
+        Returns:
+            GithubResponse: The (possibly cached) response
+        """
+        key = path + "?" + urlencode(sorted((params or {}).items()))
+        if shape:
+            key = f"{shape.__qualname__}:{key}"
+
+        cached_raw = await self.cache.get(key)
+        cached = GithubResponse.model_validate_json(cached_raw) if cached_raw else None
+        if cached and time.time() - cached.checked < fresh_for:
+            cached.cached = True
+            return cached
+
+        headers = {}
+        if cached and cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached and cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+
+        try:
+            response = await self.request("GET", path, params=params, headers=headers)
+        except TooManyRequestsException:
+            if cached:  # Stale data beats no data while the limit resets
+                cached.cached = True
+                return cached
+            raise
+
+        if response.status_code == 304 and cached:
+            cached.checked = time.time()
+            cached.cached = True
+        elif response.is_success:
+            data = response.json()
+            cached = GithubResponse(
+                data=shape(data) if shape else data,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+                link=response.headers.get("Link", ""),
+                checked=time.time(),
+            )
+        elif self.rate_limited(response) and cached:
+            cached.cached = True
+            return cached
+        elif self.rate_limited(response):
+            raise TooManyRequestsException(
+                "GitHub rate limit exhausted",
+                headers={
+                    "Retry-After": str(max(int(self.budget.reset_at - time.time()), 1))
+                },
+            )
+        else:
+            raise ClientException(f"GitHub request failed ({response.status_code})")
+
+        await self.cache.set(
+            key, cached.model_dump_json(exclude={"cached"}), expires_in=CACHE_EXPIRE
+        )
+        return cached
+
+    async def paginate(
+        self,
+        path: str,
+        params: dict[str, Any] | None = None,
+        page: int = 1,
+        per_page: int = 100,
+        **kwargs,
+    ) -> AsyncIterator[tuple[int, GithubResponse]]:
+        """Gets each page of a paginated resource in turn
+
+        Yields:
+            tuple[int, GithubResponse]: Each page number & its response
+        """
+        while True:
+            response = await self.get(
+                path, params={**(params or {}), "per_page": per_page, "page": page}, **kwargs
+            )
+            yield page, response
+            if not response.has_next:
+                break
+            page += 1
@@ -0,0 +1,154 @@
+from datetime import UTC, datetime, timedelta
+import logging
+from litestar.exceptions import ClientException, ServiceUnavailableException
+from redis.exceptions import LockError
+from .base import BaseConnectionProvider, RateLimitBudget, refresh_due
+from .github import GithubConnectionProvider
+from ..models import UserConnection
+from ..utils import ServerContext
+
+logger = logging.getLogger("subtask.connections")
+
+CONNECTION_PROVIDERS = {"github": GithubConnectionProvider}
+REFRESH_LOCK_TIMEOUT = 30  # Seconds a token refresh may hold its connection's lock
+
+
+async def refresh_connection(
+    connection: UserConnection,
+    context: ServerContext,
+    ahead: float = 0,
+    wait: bool = True,
+) -> UserConnection | None:
+    """Refreshes a connection's access token, once across every worker
+
+    Refreshing spends the refresh token, so concurrent refreshes would race each other.
+    One worker holds the connection's lock while it refreshes; the others wait for it,
+    then reuse the token it stored.
+
+    Args:
+        connection (UserConnection): Connection to refresh
+        context (ServerContext): Server context
+        ahead (float, optional): Also refresh tokens expiring within this many seconds. Defaults to 0.
+        wait (bool, optional): Wait for a refresh in progress elsewhere, instead of returning None. Defaults to True.
+
+    Raises:
+        ClientException: If the token could not be refreshed
+        ServiceUnavailableException: If another worker's refresh took too long to wait for
+
+    Returns:
+        UserConnection | None: The connection with a valid token, or None if it's refreshing elsewhere (without `wait`)
+    """
+    if not refresh_due(connection, ahead):
+        return connection
+
+    lock = context.redis.lock(
+        f"SUBTASK_TOKEN_REFRESH_LOCK:{connection.id}",
+        timeout=REFRESH_LOCK_TIMEOUT,
+        blocking_timeout=context.config.http.token_refresh_wait,
+    )
+    if not await lock.acquire(blocking=wait):
+        if wait:
+            raise ServiceUnavailableException("Timed out waiting for a token refresh")
+        return None
+
+    try:
+        # Re-read the stored token, which a refresh may have replaced while waiting
+        current = await UserConnection.get(connection.id)
+        if current is None:
+            raise ClientException("Connection no longer exists")
+        if not refresh_due(current, ahead):
+            return current
+
+        refreshed = await CONNECTION_PROVIDERS[current.type].refresh(
+            getattr(context.config.oauth, current.type), context.http, current
+        )
+        if not refreshed:
+            raise ClientException(
+                "GH access token is invalid and was unable to be refreshed."
+            )
+        await refreshed.save()
+        return refreshed
+    finally:
+        try:
+            await lock.release()
+        except LockError:
+            # Held past REFRESH_LOCK_TIMEOUT, so another worker may have refreshed too
+            logger.warning("Token refresh lock of `%s` expired early", connection.id)
+
+
+async def refresh_expiring(context: ServerContext) -> int:
+    """Refreshes every token expiring within `token_refresh_ahead`, before requests need it
+
+    Connections being refreshed by another worker are skipped.
+
+    Returns:
+        int: Number of connections refreshed
+    """
+    ahead = context.config.http.token_refresh_ahead
+    now = datetime.now(UTC)
+    refreshed = 0
+    async for connection in UserConnection.iter_query(
+        {
+            "access_expire": {"$lt": now + timedelta(seconds=ahead)},
+            "refresh_expire": {"$gt": now},
+        }
+    ):
+        try:
+            if await refresh_connection(connection, context, ahead=ahead, wait=False):
+                refreshed += 1
+        except Exception:
+            logger.warning(
+                "Failed to refresh connection `%s`", connection.id, exc_info=True
+            )
+    if refreshed > 0:
+        logger.info("Refreshed %s expiring connection tokens", refreshed)
+    return refreshed
+
+
+async def get_provider(
+    connection: UserConnection, context: ServerContext
+) -> GithubConnectionProvider | None:
+    """Gets a live provider for a connection, reusing a cached instance while its token is valid
+
+    An expired token is refreshed first (waiting on any refresh already in progress).
+    Providers of the same connection share one rate limit budget, which outlives tokens.
+
+    Args:
+        connection (UserConnection): Connection to get a provider for
+        context (ServerContext): Server context owning the provider caches & HTTP pool
+
+    Raises:
+        ClientException: If the connection's token could not be refreshed
+
+    Returns:
+        GithubConnectionProvider | None: The provider instance
+    """
+    cached: BaseConnectionProvider | None = context.providers.get(
+        (connection.id, connection.access_token)
+    )
+    if cached and not cached.expired:
+        return cached
+
+    stale = (connection.id, connection.access_token)
+    connection = await refresh_connection(connection, context)
+    budget: RateLimitBudget | None = context.rate_limits.get(connection.id)
+    if budget is None:
+        budget = RateLimitBudget(
+            reserve=context.config.http.rate_limit_reserve,
+            max_wait=context.config.http.rate_limit_max_wait,
+            concurrency=context.config.http.provider_concurrency,
+        )
+        context.rate_limits.set(connection.id, budget)
+
+    provider = await CONNECTION_PROVIDERS.get(connection.type).create(
+        getattr(context.config.oauth, connection.type),
+        context.http,
+        connection,
+        context.response_cache(connection.id),
+        budget,
+    )
+    context.providers.pop(stale)
+    context.providers.set(
+        (provider.connection.id, provider.connection.access_token), provider
+    )
+    return provider
@@ -0,0 +1,307 @@
+from datetime import datetime
+import logging
+from beanie.odm.utils.dump import get_dict
+from pydantic import BaseModel
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from ..models import (
+    Project,
+    Task,
+    TaskAttribute,
+    TaskSource,
+    TaskStatus,
+    TaskTag,
+    UserConnection,
+    ranks_after,
+)
+from ..utils import ChangeEvent, ServerContext
+from .base import ConnectionItem, as_utc
+from .providers import get_provider
+
+logger = logging.getLogger("subtask.sync")
+
+OPEN_STATUS = "Open"
+CLOSED_STATUS = "Closed"
+SYNC_LOCK_TIMEOUT = 120  # Seconds a sync may go without progress before its lock lapses
+# Task fields owned by the upstream item, overwritten on every sync
+SYNCED_FIELDS = {"name", "status", "tags", "source"}
+
+
+class SyncInProgressError(Exception):
+    pass
+
+
+class SyncResult(BaseModel):
+    created: int = 0
+    updated: int = 0
+    since: datetime | None = None  # The project's sync cursor afterwards
+
+
+async def ensure_attributes(
+    project: str, items: list[ConnectionItem], context: ServerContext
+) -> tuple[dict[str, str], dict[str, str]]:
+    """Finds the statuses & tags items map onto, creating any the project lacks
+
+    Returns:
+        tuple[dict[str, str], dict[str, str]]: Status IDs by name, tag IDs by label
+    """
+    attributes = await context.attributes.get(project)
+    statuses = {i.name: i.id for i in attributes.statuses.values()}
+    tags = {i.name: i.id for i in attributes.tags.values()}
+
+    status_names = {OPEN_STATUS if i.open else CLOSED_STATUS for i in items}
+    new_statuses = [
+        TaskStatus(project=project, name=i) for i in status_names if i not in statuses
+    ]
+    new_tags = [
+        TaskTag(project=project, name=i)
+        for i in {label for item in items for label in item.labels}
+        if i not in tags
+    ]
+    created: list[TaskAttribute] = [*new_statuses, *new_tags]
+    if len(created) == 0:
+        return statuses, tags
+
+    failed: set[int] = set()
+    try:
+        await TaskAttribute.get_motor_collection().insert_many(
+            [get_dict(i, to_db=True) for i in created], ordered=False
+        )
+    except BulkWriteError as e:
+        # Another sync created the same attribute first (unique names index)
+        failed = {i["index"] for i in e.details["writeErrors"]}
+    await context.after_bulk_write(
+        TaskAttribute,
+        project,
+        [
+            ChangeEvent(
+                kind="attribute",
+                action="created",
+                id=i.id,
+                fields=i.model_dump(mode="json"),
+            )
+            for index, i in enumerate(created)
+            if index not in failed
+        ],
+    )
+    if len(failed) > 0:
+        attributes = await context.attributes.get(project)
+        statuses = {i.name: i.id for i in attributes.statuses.values()}
+        tags = {i.name: i.id for i in attributes.tags.values()}
+    else:
+        statuses.update({i.name: i.id for i in new_statuses})
+        tags.update({i.name: i.id for i in new_tags})
+    return statuses, tags
+
+
+async def apply_items(
+    project: Project,
+    connection: UserConnection,
+    items: list[ConnectionItem],
+    context: ServerContext,
+) -> SyncResult:
+    """Upserts the tasks mirroring upstream items in one bulk write
+
+    Tasks are matched by their source, so applying the same item twice (or from two
+    workers at once) never duplicates it. New tasks are appended to the project's root.
+
+    Args:
+        project (Project): Project the items belong to
+        connection (UserConnection): Connection the items were fetched through (new tasks' creator)
+        items (list[ConnectionItem]): Items to mirror
+        context (ServerContext): Server context
+
+    Returns:
+        SyncResult: How many tasks were created & updated
+    """
+    latest = {i.id: i for i in items}
+    if len(latest) == 0:
+        return SyncResult()
+
+    existing: dict[str, str] = {}
+    async for i in Task.get_motor_collection().find(
+        {"project": project.id, "source.id": {"$in": list(latest.keys())}},
+        {"source.id": True, "source.updated": True},
+    ):
+        # Skip items no newer than their task (`since` is inclusive, and events may
+        # arrive out of order)
+        source = i["source"]
+        if as_utc(source["updated"]) >= latest[source["id"]].updated:
+            latest.pop(source["id"])
+        else:
+            existing[source["id"]] = i["_id"]
+    if len(latest) == 0:
+        return SyncResult()
+
+    statuses, tags = await ensure_attributes(project.id, list(latest.values()), context)
+    ranks = iter(
+        ranks_after(
+            await Task.sibling_rank(project.id, None),
+            len([i for i in latest if i not in existing]),
+        )
+    )
+
+    operations: list[UpdateOne] = []
+    events: list[ChangeEvent] = []
+    for item in latest.values():
+        task = Task(
+            project=project.id,
+            name=item.title,
+            status=statuses[OPEN_STATUS if item.open else CLOSED_STATUS],
+            tags=[tags[i] for i in item.labels],
+            creator=connection.user_id,
+            source=TaskSource(
+                connection=connection.id,
+                id=item.id,
+                number=item.number,
+                url=item.url,
+                updated=item.updated,
+            ),
+        )
+        synced = get_dict(task, to_db=True, keep_nulls=True)
+        changes = {k: v for k, v in synced.items() if k in SYNCED_FIELDS}
+        if item.id in existing:
+            operations.append(
+                UpdateOne({"_id": existing[item.id]}, {"$set": changes})
+            )
+            events.append(
+                ChangeEvent(
+                    kind="task",
+                    action="updated",
+                    id=existing[item.id],
+                    fields=task.model_dump(mode="json", include=SYNCED_FIELDS),
+                )
+            )
+        else:
+            task.place(None, next(ranks))
+            synced = get_dict(task, to_db=True, keep_nulls=True)
+            operations.append(
+                UpdateOne(
+                    {"project": project.id, "source.id": item.id},
+                    {
+                        "$set": changes,
+                        "$setOnInsert": {
+                            k: v for k, v in synced.items() if k not in changes
+                        },
+                    },
+                    upsert=True,
+                )
+            )
+            events.append(
+                ChangeEvent(
+                    kind="task",
+                    action="created",
+                    id=task.id,
+                    fields=task.model_dump(mode="json"),
+                )
+            )
+
+    failed: set[int] = set()
+    try:
+        written = await Task.get_motor_collection().bulk_write(
+            operations, ordered=False
+        )
+        result = SyncResult(
+            created=written.upserted_count,
+            updated=written.matched_count,
+        )
+    except BulkWriteError as e:
+        # Another sync inserted the same item first (unique source index)
+        failed = {i["index"] for i in e.details["writeErrors"]}
+        result = SyncResult(
+            created=e.details["nUpserted"], updated=e.details["nMatched"]
+        )
+
+    await context.after_bulk_write(
+        Task, project.id, [e for i, e in enumerate(events) if i not in failed]
+    )
+    return result
+
+
+async def remove_items(
+    project: Project, item_ids: list[str], context: ServerContext
+) -> int:
+    """Deletes the tasks mirroring upstream items that no longer exist
+
+    Returns:
+        int: Number of tasks deleted
+    """
+    removed = [
+        i["_id"]
+        async for i in Task.get_motor_collection().find(
+            {"project": project.id, "source.id": {"$in": item_ids}}, {"_id": True}
+        )
+    ]
+    if len(removed) == 0:
+        return 0
+
+    await Task.get_motor_collection().delete_many(
+        {"_id": {"$in": removed}, "project": project.id}
+    )
+    await context.after_bulk_write(
+        Task,
+        project.id,
+        [ChangeEvent(kind="task", action="deleted", id=i) for i in removed],
+    )
+    return len(removed)
+
+
+async def sync_project(project: Project, context: ServerContext) -> SyncResult:
+    """Mirrors the items changed upstream since the project's last sync into its tasks
+
+    Items are applied a page at a time, advancing the project's cursor after each, so
+    an interrupted sync resumes where it stopped.
+
+    Args:
+        project (Project): Connected project to sync
+        context (ServerContext): Server context
+
+    Raises:
+        ValueError: If the project has no (valid) connection
+        SyncInProgressError: If the project is already being synced
+
+    Returns:
+        SyncResult: How many tasks were created & updated, and the new cursor
+    """
+    if not project.connection:
+        raise ValueError("Project is not connected to a location")
+    connection = await UserConnection.from_id(project.connection.connection_id)
+    if not connection:
+        raise ValueError("Project's connection no longer exists")
+
+    lock = context.redis.lock(
+        f"SUBTASK_SYNC_LOCK:{project.id}", timeout=SYNC_LOCK_TIMEOUT
+    )
+    if not await lock.acquire(blocking=False):
+        raise SyncInProgressError(f"Project `{project.id}` is already syncing")
+
+    since = project.connection.since and as_utc(project.connection.since)
+
+    total = SyncResult(since=since)
+    try:
+        provider = await get_provider(connection, context)
+        async for items in provider.iter_items(
+            project.connection.location, since=since
+        ):
+            applied = await apply_items(project, connection, items, context)
+            total.created += applied.created
+            total.updated += applied.updated
+            newest = max((i.updated for i in items), default=None)
+            if newest and (total.since is None or newest > total.since):
+                total.since = newest
+                await Project.get_motor_collection().update_one(
+                    {"_id": project.id}, {"$set": {"connection.since": newest}}
+                )
+                await context.documents.evict(Project, project.id)
+            await lock.reacquire()
+    finally:
+        await lock.release()
+
+    project.connection.since = total.since
+    logger.info(
+        "Synced project `%s`: %s created, %s updated",
+        project.id,
+        total.created,
+        total.updated,
+    )
+    return total
@@ -0,0 +1,53 @@
+import hashlib
+import hmac
+from typing import Any
+from ..models import Project, UserConnection
+from ..utils import ServerContext
+from .github import issue_item, shape_issues
+from .sync import apply_items, remove_items
+
+GITHUB_EVENT_JOB = "github_event"
+REMOVED_ACTIONS = {"deleted", "transferred"}  # Issue actions that take it out of a repo
+
+
+def verify_github_signature(secret: str, body: bytes, signature: str | None) -> bool:
+    """Checks a delivery's `X-Hub-Signature-256` header against the webhook secret"""
+    if not signature:
+        return False
+    expected = "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def github_event_job(event: str, body: dict[str, Any]) -> dict[str, Any] | None:
+    """Reduces a webhook delivery to the payload of the job processing it
+
+    Args:
+        event (str): The delivery's `X-GitHub-Event` header
+        body (dict[str, Any]): The decoded delivery
+
+    Returns:
+        dict[str, Any] | None: The job payload, or None if the event isn't mirrored
+    """
+    if event == "issues" and "issue" in body and "repository" in body:
+        return {
+            "repository": body["repository"]["id"],
+            "action": body.get("action"),
+            "issue": shape_issues([body["issue"]])[0],
+        }
+    return None
+
+
+async def process_github_event(context: ServerContext, payload: dict[str, Any]) -> None:
+    """Applies a queued issue event to the tasks of every project connected to its repository"""
+    item = issue_item(payload["issue"])
+    async for project in Project.iter_query(
+        {"connection.location": payload["repository"]}
+    ):
+        connection = await UserConnection.from_id(project.connection.connection_id)
+        if not connection or connection.type != "github":
+            continue
+
+        if payload["action"] in REMOVED_ACTIONS:
+            await remove_items(project, [item.id], context)
+        else:
+            await apply_items(project, connection, [item], context)
@@ -2,3 +2,7 @@ from .user import UserAuthenticationController, UserSelfController
 from .connection import ConnectionController, ConnectionOperationController
 from .files import get_file_content
 from .project import ProjectMetaController, SingleProjectController
+from .task import TaskController
+from .feed import ProjectFeedController
+from .health import HealthController, get_metrics
+from .webhooks import WebhookController
@@ -1,6 +1,9 @@
-from typing import Any
-from litestar import get, post, Controller, delete
+import json
+from typing import Any, AsyncIterator
+from litestar import get, post, Controller, delete, Response
+from litestar.response import Stream
 from ..models import (
+    Session,
     User,
     provide_user,
     guard_logged_in,
@@ -15,7 +18,7 @@ from litestar.exceptions import *
 
 
 async def provide_connection(user: User, connection_id: str) -> UserConnection:
-    result = await UserConnection.get(connection_id)
+    result = await UserConnection.from_id(connection_id)
     if not result:
         raise NotFoundException("Connection does not exist/is not owned by user")
 
@@ -31,8 +34,25 @@ class ConnectionController(Controller):
     dependencies = {"user": Provide(provide_user)}
 
     @get("/")
-    async def get_all_connections(self, user: User) -> list[RedactedUserConnection]:
-        return [i.redact() for i in await user.get_connections()]
+    async def get_all_connections(
+        self, session: Session, limit: int | None = None, after: str | None = None
+    ) -> Response[list[RedactedUserConnection]]:
+        """Lists the user's connections, optionally a page of `limit` at a time (`X-Next-Cursor` resumes)
+
+        Connections are ordered by ID, which is stable across pages but unrelated to when
+        they were created (IDs are random).
+        """
+        results = await UserConnection.redacted_for_user(
+            session.user_id, after=after, limit=limit
+        )
+        return Response(
+            results,
+            headers=(
+                {"X-Next-Cursor": results[-1].id}
+                if limit and len(results) == limit
+                else None
+            ),
+        )
 
     @get("/{connection_type:str}/authentication/redirect")
     async def get_redirect_url(
@@ -58,13 +78,11 @@ class ConnectionController(Controller):
             context.config.oauth, connection_type
         ):
             connection = await CONNECTION_PROVIDERS[connection_type].get_connection(
-                getattr(context.config.oauth, connection_type), **data
+                getattr(context.config.oauth, connection_type), context.http, **data
             )
 
             if connection:
-                instance = await CONNECTION_PROVIDERS[connection_type].create(
-                    getattr(context.config.oauth, connection_type), connection
-                )
+                instance = await get_provider(connection, context)
                 profile_data = await instance.get_profile_info()
                 connection.account_name = profile_data.account_name
                 connection.account_image = profile_data.account_image
@@ -90,12 +108,77 @@ class ConnectionOperationController(Controller):
         return conn.redact()
 
     @delete("/")
-    async def delete_connection(self, conn: UserConnection) -> None:
+    async def delete_connection(
+        self, conn: UserConnection, context: ServerContext
+    ) -> None:
+        await context.response_cache(conn.id).delete_all()
+        context.rate_limits.pop(conn.id)
         await conn.delete()
 
     @get("/locations")
     async def get_possible_locations(
-        self, conn: UserConnection, context: ServerContext
-    ) -> list[ConnectionLocation]:
+        self,
+        conn: UserConnection,
+        context: ServerContext,
+        cursor: str | None = None,
+        limit: int | None = None,
+        search: str | None = None,
+        stream: bool = False,
+    ) -> Response:
+        """Lists possible project locations, optionally paginated, filtered & streamed
+
+        A page of at most `limit` locations is returned, with `X-Next-Cursor` set if more may
+        follow. With `stream`, locations are sent as NDJSON (each with its `cursor`) as they
+        are fetched.
+        """
+        if cursor is not None and not CONNECTION_PROVIDERS[conn.type].valid_cursor(
+            cursor
+        ):
+            raise ClientException("Invalid cursor")
+
         provider = await get_provider(conn, context)
-        return await provider.get_locations()
+        locations = search_locations(
+            provider.iter_locations(cursor), search
+        )
+
+        if stream:
+
+            async def generate_lines() -> AsyncIterator[bytes]:
+                count = 0
+                async for position, location in locations:
+                    yield (
+                        json.dumps(
+                            {**location.model_dump(mode="json"), "cursor": position}
+                        )
+                        + "\n"
+                    ).encode()
+                    count += 1
+                    if limit and count >= limit:
+                        break
+
+            return Stream(generate_lines(), media_type="application/x-ndjson")
+
+        results: list[ConnectionLocation] = []
+        next_cursor = None
+        async for position, location in locations:
+            results.append(location)
+            if limit and len(results) >= limit:
+                next_cursor = position
+                break
+
+        return Response(
+            results, headers={"X-Next-Cursor": next_cursor} if next_cursor else None
+        )
+
+
+async def search_locations(
+    locations: AsyncIterator[tuple[str, ConnectionLocation]], search: str | None
+) -> AsyncIterator[tuple[str, ConnectionLocation]]:
+    needle = search.casefold() if search else None
+    async for position, location in locations:
+        if (
+            not needle
+            or needle in location.display_name.casefold()
+            or (location.description and needle in location.description.casefold())
+        ):
+            yield position, location
@@ -0,0 +1,79 @@
+from litestar import Controller, WebSocket, get, websocket
+from litestar.di import Provide
+from litestar.exceptions import NotAuthorizedException, WebSocketDisconnect
+from litestar.response import ServerSentEvent, ServerSentEventMessage
+from litestar.status_codes import WS_1008_POLICY_VIOLATION
+from ..models import (
+    ProjectPermission,
+    ProjectSummary,
+    User,
+    get_active_user,
+    guard_logged_in,
+    provide_user,
+)
+from .project import (
+    provide_permission,
+    provide_project_summary,
+    requires_permission,
+)
+from ..utils import ServerContext
+
+
+class ProjectFeedController(Controller):
+    """Pushes compact change events for a project's tasks & attributes as they are written.
+
+    Events are batched & coalesced per object while a consumer is busy; a consumer that
+    falls too far behind receives a single "resync" event and should re-fetch.
+    """
+
+    path = "/projects/{id:str}/feed"
+    guards = [guard_logged_in, requires_permission(ProjectPermission.VIEW)]
+
+    @get(
+        "/",
+        dependencies={
+            "user": Provide(provide_user),
+            "permission": Provide(provide_permission),
+            "project": Provide(provide_project_summary),
+        },
+    )
+    async def get_feed_events(
+        self, user: User, project: ProjectSummary, context: ServerContext
+    ) -> ServerSentEvent:
+        """Streams change events as Server-Sent Events, until the user leaves the project"""
+
+        async def generate():
+            async for batch in context.feed.member_events(project.id, user.id):
+                if len(batch) == 0:
+                    yield ServerSentEventMessage(comment="keepalive")
+                for event in batch:
+                    yield ServerSentEventMessage(
+                        data=event.model_dump_json(), event=event.action
+                    )
+
+        return ServerSentEvent(generate())
+
+    @websocket("/socket")
+    async def feed_socket(self, socket: WebSocket, id: str) -> None:
+        """Streams change events over a WebSocket, as a JSON list per batch ([] is a keepalive)
+
+        The socket is closed (with a policy violation) once the user leaves the project.
+        """
+        context: ServerContext = socket.app.state.context
+        user = await get_active_user(socket)
+        if not user:
+            raise NotAuthorizedException(
+                "You must be logged in to access this endpoint."
+            )
+        project = await provide_project_summary(
+            id, await provide_permission(user, id, context, socket.scope)
+        )
+        await socket.accept()
+        try:
+            async for batch in context.feed.member_events(project.id, user.id):
+                await socket.send_json([i.model_dump(mode="json") for i in batch])
+            await socket.close(
+                code=WS_1008_POLICY_VIOLATION, reason="No longer a project member"
+            )
+        except WebSocketDisconnect:
+            pass
@@ -1,17 +1,130 @@
-from litestar import get
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from litestar import get, Request, Response
 from ..models import GridFile
+from ..utils import ServerContext
 from litestar.response import Stream
 from litestar.exceptions import NotFoundException
 
 
-@get("/files/{file_id:str}")
-async def get_file_content(file_id: str) -> Stream:
-    file_info = await GridFile.get(file_id)
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """Parses a single-range `Range` header
+
+    Args:
+        header (str | None): Header value
+        size (int): Size of the file
+
+    Raises:
+        ValueError: If the range cannot be satisfied
+
+    Returns:
+        tuple[int, int] | None: [start, end) to send, or None to send the whole file
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+
+    first, _, last = header.removeprefix("bytes=").strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last) + 1, size) if last else size
+        else:
+            start, end = max(size - int(last), 0), size
+    except ValueError:
+        return None
+
+    if start >= end:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+def is_not_modified(request: Request, etag: str, uploaded: datetime) -> bool:
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        return if_none_match.strip() == "*" or etag in [
+            i.strip().removeprefix("W/") for i in if_none_match.split(",")
+        ]
+
+    if_modified_since = request.headers.get("If-Modified-Since")
+    if if_modified_since:
+        try:
+            return uploaded.replace(microsecond=0) <= parsedate_to_datetime(
+                if_modified_since
+            )
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+async def load_file_info(context: ServerContext, file_id: str) -> GridFile:
+    file_info = context.file_info.get(file_id)
     if not file_info:
-        raise NotFoundException("File not found.")
+        file_info = await GridFile.from_id(file_id)
+        if not file_info:
+            raise NotFoundException("File not found.")
+        await file_info.load_stats()
+        context.file_info.set(file_id, file_info)
+    return file_info
+
+
+@get("/files/{file_id:str}")
+async def get_file_content(
+    file_id: str, request: Request, context: ServerContext, size: int | None = None
+) -> Response:
+    file_info = await load_file_info(context, file_id)
+    variant_size = context.images.pick_size(size) if size else None
+    if variant_size:
+        variant = await context.images.get_variant(file_info, variant_size)
+        if variant.id != file_info.id:
+            file_info = await load_file_info(context, variant.id)
+
+    etag = f'"{file_info.id}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(file_info.uploaded, usegmt=True),
+        "Cache-Control": f"public, max-age={context.config.files.max_age}, immutable",
+        "Accept-Ranges": "bytes",
+    }
+    if is_not_modified(request, etag, file_info.uploaded):
+        return Response(None, status_code=304, headers=headers)
+
+    headers["Content-Disposition"] = f"filename={file_info.file_name}"
+    if_range = request.headers.get("If-Range")
+    try:
+        byte_range = (
+            parse_range(request.headers.get("Range"), file_info.size)
+            if not if_range or if_range.strip() == etag
+            else None
+        )
+    except ValueError:
+        return Response(
+            None,
+            status_code=416,
+            headers={**headers, "Content-Range": f"bytes */{file_info.size}"},
+        )
+
+    start, end = byte_range if byte_range else (0, file_info.size)
+    status_code = 206 if byte_range else 200
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{file_info.size}"
+
+    if file_info.size <= context.config.files.max_cached_file:
+        content = context.file_content.get(file_info.id)
+        if content is None:
+            content = await file_info.read()
+            context.file_content.set(file_info.id, content)
+
+        return Response(
+            content[start:end],
+            media_type=file_info.file_type,
+            status_code=status_code,
+            headers=headers,
+        )
 
+    headers["Content-Length"] = str(end - start)
     return Stream(
-        file_info.get_content(),
+        file_info.get_content(start, end),
         media_type=file_info.file_type,
-        headers={"Content-Disposition": f"filename={file_info.file_name}"},
+        status_code=status_code,
+        headers=headers,
     )
@@ -0,0 +1,45 @@
+from litestar import Controller, Response, get
+from litestar.enums import MediaType
+from litestar.exceptions import NotFoundException
+from litestar.status_codes import HTTP_200_OK, HTTP_503_SERVICE_UNAVAILABLE
+from pydantic import BaseModel
+from ..utils import PoolStats, ServerContext
+
+
+class HealthReport(BaseModel):
+    ready: bool
+    pools: dict[str, PoolStats]
+    hashing: dict[str, int]
+
+
+class HealthController(Controller):
+    path = "/health"
+
+    @get("/live")
+    async def get_live(self) -> dict[str, str]:
+        """Reports that the worker is running"""
+        return {"status": "ok"}
+
+    @get("/ready")
+    async def get_ready(self, context: ServerContext) -> Response[HealthReport]:
+        """Reports whether the worker is warmed up & has spare connections (503 if not)"""
+        pools = context.pool_stats()
+        ready = context.ready and all(
+            i.saturation < context.config.health.max_saturation
+            for i in pools.values()
+        )
+        return Response(
+            HealthReport(ready=ready, pools=pools, hashing=context.hasher.stats()),
+            status_code=HTTP_200_OK if ready else HTTP_503_SERVICE_UNAVAILABLE,
+        )
+
+
+@get("/metrics", media_type=MediaType.TEXT)
+async def get_metrics(context: ServerContext) -> Response[str]:
+    """Exposes request latency histograms & resource gauges in the Prometheus text format"""
+    if not context.config.health.metrics:
+        raise NotFoundException()
+    return Response(
+        context.metrics.render(context.gauges()),
+        media_type="text/plain; version=0.0.4",
+    )
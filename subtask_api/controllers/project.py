@@ -1,5 +1,5 @@
 from secrets import token_urlsafe
-from litestar import Controller, get, post
+from litestar import Controller, Response, get, post
 from litestar.di import Provide
 from ..models import (
     Project,
@@ -10,10 +10,21 @@ from ..models import (
     ProjectMember,
     ProjectGrant,
     ProjectPermission,
+    ProjectSummary,
     GridFile,
+    FileTooLargeError,
 )
+from ..utils import ServerContext, get_session_from_connection
+from ..connections import SyncInProgressError, SyncResult, sync_project
 from pydantic import BaseModel
+from litestar.connection import ASGIConnection
 from litestar.exceptions import *
+from litestar.handlers.base import BaseRouteHandler
+from litestar.types import Guard, Scope
+from litestar.status_codes import HTTP_409_CONFLICT, HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+
+PERMISSIONS_STATE = "subtask_project_permissions"
 
 
 class ProjectCreationModel(BaseModel):
@@ -23,32 +34,107 @@ class ProjectCreationModel(BaseModel):
     connection: ProjectConnection | None = None
 
 
-async def provide_project(user: User, id: str) -> Project:
+async def resolve_permission(
+    scope: Scope, context: ServerContext, project_id: str, user_id: str
+) -> ProjectPermission | None:
+    """Gets a user's permission level in a project, once per request
+
+    The level is kept in the connection's scope, so guards & dependencies share it.
+    """
+    resolved: dict = scope.setdefault("state", {}).setdefault(PERMISSIONS_STATE, {})
+    if (project_id, user_id) not in resolved:
+        resolved[(project_id, user_id)] = await context.permissions.get(
+            project_id, user_id
+        )
+    return resolved[(project_id, user_id)]
+
+
+async def provide_permission(
+    user: User, id: str, context: ServerContext, scope: Scope
+) -> ProjectPermission:
+    permission = await resolve_permission(scope, context, id, user.id)
+    if permission is None:
+        raise NotFoundException(f"Project `{id}` not found or not accessible.")
+    return permission
+
+
+async def provide_project(id: str, permission: ProjectPermission) -> Project:
     result = await Project.from_id(id)
-    if result and user.id in [i.user_id for i in result.members]:
+    if result:
+        return result
+    raise NotFoundException(f"Project `{id}` not found or not accessible.")
+
+
+async def provide_project_summary(
+    id: str, permission: ProjectPermission
+) -> ProjectSummary:
+    """Provides the project without its members, for routes that don't use them"""
+    result = await Project.summarized(id)
+    if result:
         return result
     raise NotFoundException(f"Project `{id}` not found or not accessible.")
 
 
+def requires_permission(permission: ProjectPermission) -> Guard:
+    """Builds a guard requiring (at least) a permission level in the `id` project
+
+    Args:
+        permission (ProjectPermission): Required level
+
+    Returns:
+        Guard: The guard, to place after guard_logged_in
+    """
+
+    async def guard_permission(connection: ASGIConnection, _: BaseRouteHandler) -> None:
+        context: ServerContext = connection.app.state.context
+        session = await get_session_from_connection(connection)
+        project_id = connection.path_params["id"]
+        granted = await resolve_permission(
+            connection.scope, context, project_id, session.user_id
+        )
+        if granted is None:
+            raise NotFoundException(
+                f"Project `{project_id}` not found or not accessible."
+            )
+        if granted > permission:
+            raise NotAuthorizedException(
+                f"This endpoint requires the {permission.name} permission."
+            )
+
+    return guard_permission
+
+
 class ProjectMetaController(Controller):
     path = "/projects"
     guards = [guard_logged_in]
     dependencies = {"user": Provide(provide_user)}
 
     @post("/")
-    async def create_project(self, user: User, data: ProjectCreationModel) -> Project:
+    async def create_project(
+        self, user: User, data: ProjectCreationModel, context: ServerContext
+    ) -> Project:
         project_id = token_urlsafe(32)
         if data.image:
             try:
                 project_img = await GridFile.create_from_data_url(
-                    data.image, "projects", project_id
+                    data.image,
+                    "projects",
+                    project_id,
+                    max_size=context.config.uploads.limit_for("projects"),
+                    chunk_size=context.config.uploads.chunk_size,
+                )
+            except FileTooLargeError as e:
+                raise ClientException(
+                    str(e), status_code=HTTP_413_REQUEST_ENTITY_TOO_LARGE
                 )
             except ValueError:
                 raise ClientException("Invalid data URI")
+            context.images.schedule(project_img)
         else:
             project_img = None
 
         new_project = Project(
+            id=project_id,
             name=data.name,
             summary=data.summary,
             image=f"/files/{project_img.id}" if project_img else None,
@@ -65,15 +151,51 @@ class ProjectMetaController(Controller):
         return new_project
 
     @get("/")
-    async def get_projects(self, user: User) -> list[Project]:
-        return await Project.from_query(query={"members.user_id": user.id})
+    async def get_projects(
+        self, user: User, limit: int | None = None, after: str | None = None
+    ) -> Response[list[Project]]:
+        """Lists the user's projects, optionally a page of `limit` at a time (`X-Next-Cursor` resumes)
+
+        Projects are ordered by ID, which is stable across pages but unrelated to when
+        they were created (IDs are random).
+        """
+        results = [
+            i
+            async for i in Project.iter_query(
+                {"members.user_id": user.id}, after=after, limit=limit
+            )
+        ]
+        return Response(
+            results,
+            headers=(
+                {"X-Next-Cursor": results[-1].id}
+                if limit and len(results) == limit
+                else None
+            ),
+        )
 
 
 class SingleProjectController(Controller):
     path = "/projects/{id:str}"
-    guards = [guard_logged_in]
-    dependencies = {"user": Provide(provide_user), "project": Provide(provide_project)}
+    guards = [guard_logged_in, requires_permission(ProjectPermission.VIEW)]
+    dependencies = {
+        "user": Provide(provide_user),
+        "permission": Provide(provide_permission),
+        "project": Provide(provide_project),
+    }
 
     @get("/")
     async def get_project(self, project: Project) -> Project:
         return project
+
+    @post("/sync", guards=[requires_permission(ProjectPermission.MANAGE)])
+    async def sync_project_tasks(
+        self, project: Project, context: ServerContext
+    ) -> SyncResult:
+        """Mirrors the items changed in the connected location since the last sync as tasks"""
+        try:
+            return await sync_project(project, context)
+        except SyncInProgressError as e:
+            raise ClientException(str(e), status_code=HTTP_409_CONFLICT)
+        except ValueError as e:
+            raise ClientException(str(e))
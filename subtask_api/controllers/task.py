@@ -0,0 +1,532 @@
+from collections import Counter
+from typing import Any, Literal, get_args
+from beanie.odm.utils.dump import get_dict
+from bson import json_util
+import json
+from litestar import Controller, get, post
+from litestar.di import Provide
+from pydantic import BaseModel
+from pymongo import DeleteMany, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from ..models import (
+    ProjectSummary,
+    ProjectPermission,
+    Task,
+    TaskFieldEntry,
+    TaskQuery,
+    User,
+    rank_between,
+    ranks_after,
+    path_range,
+    guard_logged_in,
+    provide_user,
+)
+from .project import (
+    provide_permission,
+    provide_project_summary,
+    requires_permission,
+)
+from ..utils import ChangeEvent, ServerContext
+from litestar.exceptions import *
+
+MAX_BATCH_SIZE = 1000
+
+
+class TaskCreationModel(BaseModel):
+    name: str
+    parent: str | None = None  # Existing task, or one created earlier in the same batch
+    status: str | None = None
+    tags: list[str] = []
+    fields: list[TaskFieldEntry] = []
+    assigned: list[str] = []
+
+
+class TaskPatchModel(BaseModel):
+    id: str
+    name: str | None = None
+    status: str | None = None
+    tags: list[str] | None = None
+    fields: list[TaskFieldEntry] | None = None
+    assigned: list[str] | None = None
+
+
+class TaskStatusModel(BaseModel):
+    id: str
+    status: str | None
+
+
+class TaskBatchModel(BaseModel):
+    # Reject the batch if any task is unknown & stop at the first failed write,
+    # instead of attempting every item
+    ordered: bool = True
+    create: list[TaskCreationModel] = []
+    update: list[TaskPatchModel] = []
+    status: list[TaskStatusModel] = []
+    delete: list[str] = []
+
+
+class TaskBatchItemResult(BaseModel):
+    operation: Literal["create", "update", "status", "delete"]
+    index: int  # Index of the item within its operation list
+    id: str | None = None
+    success: bool
+    error: str | None = None
+
+
+class TaskBatchResult(BaseModel):
+    created: int
+    updated: int
+    deleted: int
+    results: list[TaskBatchItemResult]
+
+
+class TaskQueryResult(BaseModel):
+    total: int
+    tasks: list[Task]
+    explain: dict[str, Any] | None = None  # Query planner output (debug mode only)
+
+
+class TaskMoveModel(BaseModel):
+    parent: str | None = None  # New parent, or None to move to the root
+    after: str | None = None  # Sibling to place the task after
+    before: str | None = None  # Sibling to place the task before
+
+
+class TaskNode(BaseModel):
+    task: Task
+    children: list["TaskNode"] = []
+    has_children: bool = False
+
+
+def build_tree(tasks: list[Task], parent: str | None) -> list[TaskNode]:
+    """Assembles a flat list of tasks into nodes beneath `parent`, ordered by rank"""
+    nodes = {i.id: TaskNode(task=i) for i in tasks}
+    roots: list[TaskNode] = []
+    for node in sorted(nodes.values(), key=lambda i: i.task.rank):
+        if node.task.parent == parent:
+            roots.append(node)
+        elif node.task.parent in nodes:
+            nodes[node.task.parent].children.append(node)
+            nodes[node.task.parent].has_children = True
+    return roots
+
+
+async def provide_task(project: ProjectSummary, task_id: str) -> Task:
+    result = await Task.from_id(task_id)
+    if result and result.project == project.id:
+        return result
+    raise NotFoundException(f"Task `{task_id}` not found.")
+
+
+class TaskController(Controller):
+    path = "/projects/{id:str}/tasks"
+    guards = [guard_logged_in, requires_permission(ProjectPermission.VIEW)]
+    dependencies = {
+        "user": Provide(provide_user),
+        "permission": Provide(provide_permission),
+        "project": Provide(provide_project_summary),
+    }
+
+    @post("/batch", guards=[requires_permission(ProjectPermission.EDIT)])
+    async def run_batch(
+        self,
+        user: User,
+        project: ProjectSummary,
+        permission: ProjectPermission,
+        context: ServerContext,
+        data: TaskBatchModel,
+    ) -> TaskBatchResult:
+        """Applies many task creates, patches, status changes & deletes in one bulk write"""
+        items = [data.create, data.update, data.status, data.delete]
+        if sum(len(i) for i in items) > MAX_BATCH_SIZE:
+            raise ClientException(f"Batches are limited to {MAX_BATCH_SIZE} items.")
+
+        if (
+            len(data.create) > 0 or len(data.delete) > 0
+        ) and permission > ProjectPermission.MANAGE:
+            raise NotAuthorizedException(
+                "Creating or deleting tasks requires the MANAGE permission."
+            )
+
+        targets = {i.id for i in data.update} | {i.id for i in data.status}
+        targets |= set(data.delete)
+        existing: dict[str, str] = {
+            i["_id"]: i["path"]
+            async for i in Task.get_motor_collection().find(
+                {"_id": {"$in": list(targets)}, "project": project.id},
+                {"_id": True, "path": True},
+            )
+        }
+        # Deleting a task deletes its subtree, so find the descendants to report
+        subtrees = {f"{existing[i]}{i}/": i for i in data.delete if i in existing}
+        descendants: dict[str, list[str]] = {i: [] for i in subtrees.values()}
+        if len(subtrees) > 0:
+            async for i in Task.get_motor_collection().find(
+                {
+                    "project": project.id,
+                    "$or": [{"path": path_range(i)} for i in subtrees],
+                },
+                {"_id": True, "path": True},
+            ):
+                for prefix, ancestor in subtrees.items():
+                    if i["path"].startswith(prefix):
+                        descendants[ancestor].append(i["_id"])
+
+        attributes = await context.attributes.get(project.id)
+        operations: list[Any] = []
+        op_results: list[TaskBatchItemResult] = []
+        op_events: list[list[ChangeEvent]] = []
+        skipped: list[TaskBatchItemResult] = []
+        unchanged: list[TaskBatchItemResult] = []  # Patches setting nothing
+
+        def validation_error(**values) -> str | None:
+            try:
+                attributes.validate_task(**values)
+            except ValueError as e:
+                return str(e)
+            return None
+
+        def queue(
+            result: TaskBatchItemResult,
+            operation: Any | None,
+            error: str = "Task not found",
+            event: ChangeEvent | None = None,
+            cascaded: list[ChangeEvent] | None = None,
+        ):
+            if operation is None or event is None:
+                result.success = False
+                result.error = error
+                skipped.append(result)
+            else:
+                operations.append(operation)
+                op_results.append(result)
+                op_events.append([event, *(cascaded or [])])
+
+        parent_ids = list({i.parent for i in data.create if i.parent})
+        parents: dict[str, Task] = {
+            i.id: i
+            async for i in Task.iter_query(
+                {"_id": {"$in": parent_ids}, "project": project.id}
+            )
+        }
+        last_ranks: dict[str | None, str] = {
+            i["_id"]: i["rank"]
+            async for i in Task.get_motor_collection().aggregate(
+                [
+                    {
+                        "$match": {
+                            "project": project.id,
+                            "parent": {"$in": [None, *parent_ids]},
+                        }
+                    },
+                    {"$group": {"_id": "$parent", "rank": {"$max": "$rank"}}},
+                ]
+            )
+        }
+        # New tasks are appended to their parent, spaced under one short prefix
+        new_ranks = {
+            parent: iter(ranks_after(last_ranks.get(parent), count))
+            for parent, count in Counter(i.parent for i in data.create).items()
+        }
+        stored_parents = set(parents.keys())
+        # A child of a task created in this batch mustn't be inserted if its parent isn't
+        ordered = data.ordered or any(
+            i.parent and i.parent not in stored_parents for i in data.create
+        )
+
+        for index, item in enumerate(data.create):
+            task = Task(
+                project=project.id,
+                creator=user.id,
+                **item.model_dump(exclude={"parent"}),
+            )
+            parent = parents.get(item.parent) if item.parent else None
+            error = validation_error(
+                status=item.status, tags=item.tags, fields=item.fields
+            )
+            if (item.parent and not parent) or error:
+                queue(
+                    TaskBatchItemResult(
+                        operation="create", index=index, id=task.id, success=True
+                    ),
+                    None,
+                    error=error or "Parent task not found",
+                )
+                continue
+
+            task.place(parent, next(new_ranks[item.parent]))
+            parents[task.id] = task
+            queue(
+                TaskBatchItemResult(
+                    operation="create", index=index, id=task.id, success=True
+                ),
+                InsertOne(get_dict(task, to_db=True)),
+                event=ChangeEvent(
+                    kind="task",
+                    action="created",
+                    id=task.id,
+                    fields=task.model_dump(mode="json"),
+                ),
+            )
+
+        for index, item in enumerate(data.update):
+            changes = item.model_dump(mode="json", exclude_unset=True, exclude={"id"})
+            nulled = [
+                k
+                for k, v in changes.items()
+                if v is None
+                and type(None) not in get_args(Task.model_fields[k].annotation)
+            ]
+            error = (
+                f"`{nulled[0]}` can't be null"
+                if len(nulled) > 0
+                else validation_error(
+                    status=item.status, tags=item.tags, fields=item.fields
+                )
+            )
+            result = TaskBatchItemResult(
+                operation="update", index=index, id=item.id, success=True
+            )
+            if item.id in existing and len(changes) == 0 and not error:
+                unchanged.append(result)
+                continue
+            queue(
+                result,
+                (
+                    UpdateOne(
+                        {"_id": item.id, "project": project.id}, {"$set": changes}
+                    )
+                    if item.id in existing and not error
+                    else None
+                ),
+                error=error or "Task not found",
+                event=ChangeEvent(
+                    kind="task", action="updated", id=item.id, fields=changes
+                ),
+            )
+
+        for index, item in enumerate(data.status):
+            error = validation_error(status=item.status)
+            queue(
+                TaskBatchItemResult(
+                    operation="status", index=index, id=item.id, success=True
+                ),
+                (
+                    UpdateOne(
+                        {"_id": item.id, "project": project.id},
+                        {"$set": {"status": item.status}},
+                    )
+                    if item.id in existing and not error
+                    else None
+                ),
+                error=error or "Task not found",
+                event=ChangeEvent(
+                    kind="task",
+                    action="updated",
+                    id=item.id,
+                    fields={"status": item.status},
+                ),
+            )
+
+        deleting: set[str] = set()
+        for index, item in enumerate(data.delete):
+            repeated = item in deleting
+            deleting.add(item)
+            queue(
+                TaskBatchItemResult(
+                    operation="delete", index=index, id=item, success=True
+                ),
+                (
+                    DeleteMany(
+                        {
+                            "project": project.id,
+                            "$or": [
+                                {"_id": item},
+                                {"path": path_range(f"{existing[item]}{item}/")},
+                            ],
+                        }
+                    )
+                    if item in existing and not repeated
+                    else None
+                ),
+                error=(
+                    "Task is already deleted by this batch"
+                    if repeated
+                    else "Task not found"
+                ),
+                event=ChangeEvent(kind="task", action="deleted", id=item),
+                cascaded=[
+                    ChangeEvent(kind="task", action="deleted", id=i)
+                    for i in descendants.get(item, [])
+                ],
+            )
+
+        if data.ordered and len(skipped) > 0:
+            raise ClientException(
+                "Batch contains invalid items: "
+                + ", ".join(f"{i.operation} #{i.index} ({i.error})" for i in skipped)
+            )
+
+        if len(operations) > 0:
+            try:
+                await Task.get_motor_collection().bulk_write(
+                    operations, ordered=ordered
+                )
+                failed_from = len(operations)
+            except BulkWriteError as e:
+                errors = {i["index"]: i["errmsg"] for i in e.details["writeErrors"]}
+                for index, error in errors.items():
+                    op_results[index].success = False
+                    op_results[index].error = error
+                failed_from = (
+                    min(errors.keys(), default=len(operations))
+                    if ordered
+                    else len(operations)
+                )
+
+            for result in op_results[failed_from + 1 :]:
+                result.success = False
+                result.error = "Not attempted"
+
+            await context.after_bulk_write(
+                Task,
+                project.id,
+                [e for r, i in zip(op_results, op_events) if r.success for e in i],
+            )
+
+        results = op_results + unchanged + skipped
+        succeeded = [i.operation for i in results if i.success]
+        return TaskBatchResult(
+            created=succeeded.count("create"),
+            updated=succeeded.count("update") + succeeded.count("status"),
+            deleted=succeeded.count("delete"),
+            results=results,
+        )
+
+    @get("/tree")
+    async def get_tree(
+        self,
+        project: ProjectSummary,
+        root: str | None = None,
+        depth: int | None = None,
+    ) -> list[TaskNode]:
+        """Gets the whole task tree, or `depth` levels beneath the `root` task"""
+        if root:
+            root_task = await provide_task(project, root)
+            tasks = await root_task.subtree(max_depth=depth)
+        else:
+            query: dict[str, Any] = {"project": project.id}
+            if depth is not None:
+                query["depth"] = {"$lt": depth}
+            tasks = [i async for i in Task.iter_query(query, sort="path")]
+
+        nodes = build_tree(tasks, root)
+        if depth is not None:
+            leaves: list[TaskNode] = []
+            pending = list(nodes)
+            while len(pending) > 0:
+                node = pending.pop()
+                pending.extend(node.children)
+                if len(node.children) == 0:
+                    leaves.append(node)
+
+            expandable = set(
+                await Task.get_motor_collection().distinct(
+                    "parent",
+                    {
+                        "project": project.id,
+                        "parent": {"$in": [i.task.id for i in leaves]},
+                    },
+                )
+            )
+            for leaf in leaves:
+                leaf.has_children = leaf.task.id in expandable
+        return nodes
+
+    @post(
+        "/{task_id:str}/move",
+        dependencies={"task": Provide(provide_task)},
+        guards=[requires_permission(ProjectPermission.EDIT)],
+    )
+    async def move_task(
+        self,
+        project: ProjectSummary,
+        context: ServerContext,
+        task: Task,
+        data: TaskMoveModel,
+    ) -> Task:
+        """Moves a task to a new parent and/or between two siblings"""
+        parent = await provide_task(project, data.parent) if data.parent else None
+        siblings = {
+            i: await provide_task(project, i) for i in (data.after, data.before) if i
+        }
+        if any(i.parent != data.parent for i in siblings.values()):
+            raise ClientException("Siblings must share the new parent.")
+
+        lower = siblings[data.after].rank if data.after else None
+        upper = siblings[data.before].rank if data.before else None
+        if data.after and not data.before:
+            upper = await Task.sibling_rank(
+                project.id, data.parent, lower, exclude=task.id
+            )
+        elif data.before and not data.after:
+            lower = await Task.sibling_rank(
+                project.id, data.parent, upper, below=True, exclude=task.id
+            )
+        elif not data.before and not data.after:
+            lower = await Task.sibling_rank(project.id, data.parent, exclude=task.id)
+
+        try:
+            moved = await task.move(parent, rank_between(lower, upper))
+        except ValueError as e:
+            raise ClientException(str(e))
+
+        if len(moved) > 0:
+            await context.after_bulk_write(
+                Task,
+                project.id,
+                [
+                    ChangeEvent(
+                        kind="task",
+                        action="updated",
+                        id=i.id,
+                        fields={"path": i.path, "depth": i.depth},
+                    )
+                    for i in moved
+                ],
+            )
+        return task
+
+    @post("/query")
+    async def query_tasks(
+        self,
+        project: ProjectSummary,
+        context: ServerContext,
+        data: TaskQuery,
+        explain: bool = False,
+    ) -> TaskQueryResult:
+        """Filters & sorts the project's tasks server-side, returning one page of results"""
+        if explain and not context.config.debug:
+            raise ClientException("Query explain is only available in debug mode.")
+
+        fields = (await context.attributes.get(project.id)).fields
+        try:
+            tasks, total = await data.run(project.id, fields)
+            if explain:
+                explained = await Task.get_motor_collection().database.command(
+                    "explain",
+                    {
+                        "aggregate": Task.get_settings().name,
+                        "pipeline": data.compile(project.id, fields),
+                        "cursor": {},
+                    },
+                    verbosity="queryPlanner",
+                )
+        except ValueError as e:
+            raise ClientException(str(e))
+
+        return TaskQueryResult(
+            total=total,
+            tasks=tasks,
+            explain=json.loads(json_util.dumps(explained)) if explain else None,
+        )
@@ -1,11 +1,13 @@
-from typing import Annotated
-from litestar import Controller, get, post, delete
+from typing import Annotated, AsyncIterator
+from litestar import Controller, Request, get, post, put, delete
 from litestar.exceptions import *
 from litestar.di import Provide
 from litestar.datastructures import UploadFile
 from litestar.params import Body
 from litestar.enums import RequestEncodingType
+from litestar.status_codes import HTTP_413_REQUEST_ENTITY_TOO_LARGE
 from pydantic import BaseModel
+from pymongo.errors import DuplicateKeyError
 
 from ..models import (
     User,
@@ -14,6 +16,7 @@ from ..models import (
     provide_user,
     RedactedUser,
     GridFile,
+    FileTooLargeError,
 )
 from ..utils import ServerContext
 
@@ -36,35 +39,40 @@ class UserAuthenticationController(Controller):
     async def create_user(
         self, context: ServerContext, session: Session, data: UserCreationModel
     ) -> User:
-        existing = await User.from_query({"username": data.username})
-        if len(existing) > 0:
+        if await User.by_username(data.username):
             raise MethodNotAllowedException("The desired username already exists")
 
-        created = User.create(data.username, data.displayName, data.password)
-        await created.save()
+        created = await User.create(
+            context.hasher, data.username, data.displayName, data.password
+        )
+        try:
+            await created.save()
+        except DuplicateKeyError:
+            raise MethodNotAllowedException("The desired username already exists")
         session.user_id = created.id
-        await session.to_storage(context.store)
         return created
 
     @post("/login")
     async def login_user(
         self, context: ServerContext, session: Session, data: UserLoginModel
     ) -> User:
-        results = await User.from_query({"username": data.username}, limit=1)
-        if len(results) == 0:
+        result = await User.by_username(data.username)
+        if not result:
             raise NotFoundException("Username or password is incorrect")
 
-        if not results[0].verify(data.password):
+        if not await result.verify(context.hasher, data.password):
             raise NotFoundException("Username or password is incorrect")
 
-        session.user_id = results[0].id
-        await session.to_storage(context.store)
-        return results[0]
+        if result.needs_rehash(context.hasher):
+            await result.set_password(context.hasher, data.password)
+            await result.save()
+
+        session.user_id = result.id
+        return result
 
     @post("/logout")
-    async def logout_user(self, context: ServerContext, session: Session) -> None:
+    async def logout_user(self, session: Session) -> None:
         session.user_id = None
-        await session.to_storage(context.store)
 
 
 class UserSelfController(Controller):
@@ -73,17 +81,25 @@ class UserSelfController(Controller):
     dependencies = {"user": Provide(provide_user)}
 
     @get("/")
-    async def get_self(self, user: User) -> RedactedUser:
-        return user.redact()
+    async def get_self(self, session: Session) -> RedactedUser:
+        user = await User.redacted(session.user_id)
+        if not user:
+            raise NotAuthorizedException(
+                "You must be logged in to access this endpoint."
+            )
+        return user
 
     @post("/settings/username")
     async def update_settings_username(self, user: User, username: str) -> RedactedUser:
-        check = await User.from_query(query={"username": username})
-        if len(check) > 0:
+        check = await User.by_username(username)
+        if check and check.id != user.id:
             raise MethodNotAllowedException("A user with that username already exists.")
 
         user.username = username
-        await user.save()
+        try:
+            await user.save()
+        except DuplicateKeyError:
+            raise MethodNotAllowedException("A user with that username already exists.")
         return user.redact()
 
     @post("/settings/display_name")
@@ -98,27 +114,81 @@ class UserSelfController(Controller):
     async def update_settings_avatar(
         self,
         user: User,
+        context: ServerContext,
         data: Annotated[UploadFile, Body(media_type=RequestEncodingType.MULTI_PART)],
     ) -> RedactedUser:
-        contents = await data.read()
-        generated_file = await GridFile.create(
-            contents,
-            "users",
-            user.id,
-            file_name=data.filename,
-            file_type=data.content_type,
+        async def read_chunks() -> AsyncIterator[bytes]:
+            while chunk := await data.read(context.config.uploads.chunk_size):
+                yield chunk
+
+        return await self.replace_avatar(
+            user, context, read_chunks(), data.filename, data.content_type
         )
+
+    @put("/settings/avatar")
+    async def update_settings_avatar_raw(
+        self,
+        user: User,
+        context: ServerContext,
+        request: Request,
+        filename: str | None = None,
+    ) -> RedactedUser:
+        """Streams a raw (non-multipart) request body straight into the avatar file"""
+        limit = context.config.uploads.limit_for("users")
+        try:
+            length = int(request.headers.get("Content-Length", 0))
+        except ValueError:
+            raise ClientException("Invalid Content-Length header")
+        if length > limit:
+            raise ClientException(
+                str(FileTooLargeError(limit)),
+                status_code=HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+
+        return await self.replace_avatar(
+            user,
+            context,
+            request.stream(),
+            filename,
+            request.headers.get("Content-Type", "application/octet-stream"),
+        )
+
+    async def replace_avatar(
+        self,
+        user: User,
+        context: ServerContext,
+        chunks: AsyncIterator[bytes],
+        file_name: str | None,
+        file_type: str,
+    ) -> RedactedUser:
+        try:
+            generated_file = await GridFile.create_from_stream(
+                chunks,
+                "users",
+                user.id,
+                file_name=file_name,
+                file_type=file_type,
+                max_size=context.config.uploads.limit_for("users"),
+            )
+        except FileTooLargeError as e:
+            raise ClientException(
+                str(e), status_code=HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        context.images.schedule(generated_file)
         user.avatar = f"/files/{generated_file.id}"
         await user.save()
         return user.redact()
 
     @delete("/settings/avatar")
-    async def update_settings_clear_avatar(self, user: User) -> None:
+    async def update_settings_clear_avatar(
+        self, user: User, context: ServerContext
+    ) -> None:
         if user.avatar:
             file_id = user.avatar.split("/")[-1]
             result = await GridFile.from_id(file_id)
             if result:
                 await result.delete()
+            context.evict_file(file_id)
 
             user.avatar = None
             await user.save()
@@ -0,0 +1,51 @@
+import json
+from litestar import Controller, Request, post
+from litestar.exceptions import *
+from litestar.status_codes import HTTP_202_ACCEPTED
+from ..connections import GITHUB_EVENT_JOB, github_event_job, verify_github_signature
+from ..utils import ServerContext
+
+DELIVERY_TTL = 7 * 86400  # Seconds a delivery ID is remembered (redeliveries come later)
+
+
+class WebhookController(Controller):
+    path = "/webhooks"
+
+    @post("/github", status_code=HTTP_202_ACCEPTED)
+    async def receive_github_event(
+        self, request: Request, context: ServerContext
+    ) -> None:
+        """Verifies a GitHub webhook delivery & queues it, returning before it's processed"""
+        secret = context.config.oauth.github.webhook_secret
+        if not secret:
+            raise NotFoundException("Webhooks are not configured")
+
+        body = await request.body()
+        if not verify_github_signature(
+            secret, body, request.headers.get("X-Hub-Signature-256")
+        ):
+            raise NotAuthorizedException("Invalid webhook signature")
+
+        try:
+            payload = github_event_job(
+                request.headers.get("X-GitHub-Event", ""), json.loads(body)
+            )
+        except (ValueError, KeyError, TypeError):
+            raise ClientException("Malformed webhook delivery")
+        if payload is None:
+            return
+
+        delivery = request.headers.get("X-GitHub-Delivery")
+        delivery_key = f"SUBTASK_WEBHOOK_DELIVERY:{delivery}"
+        if delivery and not await context.redis.set(
+            delivery_key, 1, nx=True, ex=DELIVERY_TTL
+        ):
+            return  # Already queued
+
+        try:
+            await context.jobs.enqueue(GITHUB_EVENT_JOB, payload)
+        except Exception:
+            # Let GitHub's redelivery through
+            if delivery:
+                await context.redis.delete(delivery_key)
+            raise
@@ -1,4 +1,4 @@
-from .base import BaseObject, BaseStoredObject
+from .base import BaseObject, BaseStoredObject, identity_scope
 from .session import Session, ExpandedSession
 from .user import (
     User,
@@ -8,5 +8,5 @@ from .user import (
     guard_logged_in,
 )
 from .connection import RedactedUserConnection, UserConnection, ConnectionLocation
-from .grid_file import GridFile
+from .grid_file import GridFile, FileTooLargeError
 from .project_types import *
@@ -1,23 +1,217 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import timedelta
 import json
-from typing import Type, TypeVar
+import logging
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    ClassVar,
+    Iterable,
+    Iterator,
+    Literal,
+    Protocol,
+    Type,
+    TypeVar,
+)
 from pydantic import BaseModel, Field
 from secrets import token_urlsafe
 from litestar.stores.base import Store
-from beanie import Document
+from pymongo import ASCENDING, DESCENDING
+from beanie import (
+    Document,
+    after_event,
+    Insert,
+    Replace,
+    Save,
+    SaveChanges,
+    Update,
+    Delete,
+)
+
+logger = logging.getLogger("subtask.queries")
+TProjection = TypeVar("TProjection", bound=BaseModel)
+
+WriteListener = Callable[["BaseObject", Literal["save", "delete"]], Awaitable[None]]
+IdentityMap = dict[tuple[str, str], BaseModel]
+IDENTITY_MAP: ContextVar[IdentityMap | None] = ContextVar("identity_map", default=None)
+
+
+class DocumentCache(Protocol):
+    """Read-through cache consulted by from_id for models with a `cache_ttl`"""
+
+    async def get(
+        self,
+        model: type["BaseObject"],
+        id: str,
+        load: Callable[[], Awaitable["BaseObject | None"]],
+    ) -> "BaseObject | None": ...
+
+
+@contextmanager
+def identity_scope() -> Iterator[IdentityMap]:
+    """Opens a scope (usually one request) in which each document is fetched at most once
+
+    Yields:
+        IdentityMap: The map of (collection, id) -> loaded document for this scope
+    """
+    identities: IdentityMap = {}
+    token = IDENTITY_MAP.set(identities)
+    try:
+        yield identities
+    finally:
+        IDENTITY_MAP.reset(token)
+
+
+def query_shape(query: Any) -> Any:
+    """Replaces the values in a query with placeholders, keeping only its structure"""
+    if isinstance(query, dict):
+        return {k: query_shape(v) for k, v in query.items()}
+    if isinstance(query, list):
+        return [query_shape(i) for i in query]
+    return 1
+
+
+def plan_stages(plan: Any) -> set[str]:
+    """Collects every stage name in an explain() plan tree"""
+    stages = set()
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.add(plan["stage"])
+        for value in plan.values():
+            stages |= plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            stages |= plan_stages(item)
+    return stages
 
 
 class BaseObject(Document):
     """Base type for all objects stored in MongoDB"""
 
     id: str = Field(default_factory=lambda: token_urlsafe(32))
+    # Explain every new query shape issued via from_query (debug only)
+    explain_queries: ClassVar[bool] = False
+    # (collection, query shape) -> stages of the winning plan, for every explained query
+    query_plans: ClassVar[dict[tuple[str, str], set[str]]] = {}
+    # Representative queries explained at startup, to verify indexes cover hot paths
+    hot_queries: ClassVar[list[dict]] = []
+    # Collation the hot queries are explained with
+    hot_query_collation: ClassVar[dict | None] = None
+    # Coroutines notified after any document is written, see add_write_listener
+    write_listeners: ClassVar[list[WriteListener]] = []
+    # Seconds from_id results are cached for (opt-in per model), None to always query
+    cache_ttl: ClassVar[int | None] = None
+    # Cache from_id reads through, set by the server context
+    document_cache: ClassVar[DocumentCache | None] = None
+
+    @classmethod
+    async def explain_query(
+        cls, query: dict, collation: dict | None = None
+    ) -> set[str]:
+        """Explains a query and records the stages of its winning plan
+
+        Args:
+            query (dict): Query to explain
+            collation (dict | None, optional): Collation the query runs with. Defaults to None.
+
+        Returns:
+            set[str]: Stages of the winning plan (e.g. IXSCAN, COLLSCAN)
+        """
+        filter_query = cls.find(query, with_children=True).get_filter_query()
+        cursor = cls.get_motor_collection().find(filter_query)
+        if collation:
+            cursor = cursor.collation(collation)
+        explained = await cursor.explain()
+        stages = plan_stages(explained.get("queryPlanner", {}).get("winningPlan", {}))
+
+        key = (
+            cls.get_settings().name,
+            json.dumps(query_shape(query), sort_keys=True, default=str),
+        )
+        cls.query_plans[key] = stages
+        if "COLLSCAN" in stages:
+            logger.warning("Query on `%s` fell back to a COLLSCAN: %s", *key)
+        return stages
+
+    @classmethod
+    def identity_key(cls, id: str) -> tuple[str, str]:
+        return (cls.get_settings().name, id)
+
+    @after_event(Insert, Replace, Save, SaveChanges, Update)
+    def remember_identity(self) -> None:
+        identities = IDENTITY_MAP.get()
+        if identities is not None:
+            self.forget_identities([self.id])  # Projections loaded earlier are now stale
+            identities[self.identity_key(self.id)] = self
+
+    @after_event(Delete)
+    def forget_identity(self) -> None:
+        self.forget_identities([self.id])
+
+    @classmethod
+    def forget_identities(cls, ids: Iterable[str]) -> None:
+        """Drops documents (and their projections) from the current identity scope
+
+        Args:
+            ids (Iterable[str]): IDs of the written documents
+        """
+        identities = IDENTITY_MAP.get()
+        if identities is None:
+            return
+        name = cls.get_settings().name
+        forgotten = set(ids)
+        for key in [
+            i
+            for i in identities
+            if i[1] in forgotten and i[0].split(":")[0] == name
+        ]:
+            identities.pop(key, None)
+
+    @classmethod
+    def add_write_listener(cls, listener: WriteListener) -> None:
+        """Registers a coroutine to run after any document is saved or deleted
+
+        Args:
+            listener (WriteListener): Called with the document and "save"/"delete"
+        """
+        BaseObject.write_listeners.append(listener)
+
+    @classmethod
+    def remove_write_listener(cls, listener: WriteListener) -> None:
+        if listener in BaseObject.write_listeners:
+            BaseObject.write_listeners.remove(listener)
+
+    @after_event(Insert, Replace, Save, SaveChanges, Update)
+    async def notify_saved(self) -> None:
+        for listener in BaseObject.write_listeners:
+            await listener(self, "save")
+
+    @after_event(Delete)
+    async def notify_deleted(self) -> None:
+        for listener in BaseObject.write_listeners:
+            await listener(self, "delete")
+
+    @classmethod
+    async def check_query_plan(cls, query: dict, collation: dict | None = None):
+        """Explains the query if its shape hasn't been seen yet (when `explain_queries` is on)"""
+        if cls.explain_queries:
+            key = (
+                cls.get_settings().name,
+                json.dumps(query_shape(query), sort_keys=True, default=str),
+            )
+            if key not in cls.query_plans:
+                await cls.explain_query(query, collation=collation)
 
     @classmethod
     async def from_query(
         cls: Type["TBase"],
-        query: dict = {},
+        query: dict | None = None,
         limit: int | None = None,
         sorting: list[str] | None = None,
+        collation: dict | None = None,
     ) -> list["TBase"]:
         """Fetches a list of Objects from a query
 
@@ -25,20 +219,120 @@ class BaseObject(Document):
             query (dict, optional): A MongoDB query dictionary to filter by. Defaults to {}.
             limit (int | None): The max number of results to return, or None for no maximum. Defaults to None.
             sorting (list[str] | None): A list of sorting criteria ("+/-<field>" format). Defaults to None.
+            collation (dict | None): Collation to query with, matching any collated index. Defaults to None.
 
         Returns:
             list[BaseObject]: List of results
         """
-        assembled = cls.find(query, limit=limit, with_children=True)
+        query = query or {}
+        await cls.check_query_plan(query, collation=collation)
+        extra = {"collation": collation} if collation else {}
+        assembled = cls.find(query, limit=limit, with_children=True, **extra)
         if sorting:
             assembled = assembled.sort(*sorting)
 
         results = [i async for i in assembled]
         return results
 
+    @classmethod
+    async def iter_query(
+        cls: Type["TBase"],
+        query: dict | None = None,
+        projection: Type[TProjection] | None = None,
+        sort: str = "_id",
+        descending: bool = False,
+        after: Any = None,
+        limit: int | None = None,
+        batch_size: int = 100,
+        collation: dict | None = None,
+    ) -> AsyncIterator["TBase | TProjection"]:
+        """Iterates over the results of a query in batches, without holding them all in memory
+
+        Arguments:
+            query (dict | None, optional): A MongoDB query dictionary to filter by. Defaults to None.
+            projection (Type[BaseModel] | None, optional): A lightweight model to fetch only the fields of. Defaults to None.
+            sort (str, optional): Field to order (and paginate) by. Defaults to "_id".
+            descending (bool, optional): Whether to order descending. Defaults to False.
+            after (Any, optional): Keyset to resume after: the last ID when sorting by "_id", otherwise the last (value, ID). Defaults to None.
+            limit (int | None, optional): The max number of results to return. Defaults to None.
+            batch_size (int, optional): Documents fetched per round trip. Defaults to 100.
+            collation (dict | None, optional): Collation to query with. Defaults to None.
+
+        Yields:
+            TBase | TProjection: Each result, as the document type or the projection
+        """
+        query = query or {}
+        await cls.check_query_plan(query, collation=collation)
+        direction = DESCENDING if descending else ASCENDING
+        compare = "$lt" if descending else "$gt"
+        if after is not None:
+            if sort == "_id":
+                keyset = {"_id": {compare: after}}
+            else:
+                value, last_id = after
+                keyset = {
+                    "$or": [
+                        {sort: {compare: value}},
+                        {sort: value, "_id": {compare: last_id}},
+                    ]
+                }
+            query = {"$and": [query, keyset]} if query else keyset
+
+        ordering = [(sort, direction)]
+        if sort != "_id":
+            ordering.append(("_id", direction))
+        extra = {"collation": collation} if collation else {}
+        if projection:
+            fields = {
+                ("_id" if name == "id" else name): True
+                for name in projection.model_fields.keys()
+            }
+            cursor = cls.get_motor_collection().find(
+                cls.find(query, with_children=True).get_filter_query(),
+                fields,
+                sort=ordering,
+                limit=limit or 0,
+                batch_size=batch_size,
+                **extra,
+            )
+            async for document in cursor:
+                if "_id" in document:
+                    document["id"] = document.pop("_id")
+                yield projection.model_validate(document)
+        else:
+            assembled = cls.find(
+                query,
+                limit=limit,
+                with_children=True,
+                batch_size=batch_size,
+                **extra,
+            ).sort(ordering)
+            async for result in assembled:
+                yield result
+
+    @classmethod
+    async def count_query(cls, query: dict | None = None) -> int:
+        """Counts the documents matching a query, without fetching them"""
+        return await cls.get_motor_collection().count_documents(
+            cls.find(query or {}, with_children=True).get_filter_query()
+        )
+
+    @classmethod
+    async def query_exists(cls, query: dict | None = None) -> bool:
+        """Checks whether any document matches a query, fetching only its ID"""
+        return (
+            await cls.get_motor_collection().find_one(
+                cls.find(query or {}, with_children=True).get_filter_query(),
+                {"_id": True},
+            )
+            is not None
+        )
+
     @classmethod
     async def from_id(cls: Type["TBase"], id: str) -> "TBase | None":
-        """Gets a single result by ID
+        """Gets a single result by ID, reusing any copy already loaded in the current identity scope
+
+        Models with a `cache_ttl` are read through the `document_cache`, when one is set.
 
         Args:
             id (str): ID to search for
@@ -46,7 +340,53 @@ class BaseObject(Document):
         Returns:
             TBase | None: The located Object, or None if not found.
         """
-        result = await cls.get(id, with_children=True)
+        identities = IDENTITY_MAP.get()
+        if identities is not None:
+            existing = identities.get(cls.identity_key(id))
+            if isinstance(existing, cls):
+                return existing
+
+        if cls.cache_ttl and BaseObject.document_cache:
+            result = await BaseObject.document_cache.get(
+                cls, id, lambda: cls.get(id, with_children=True)
+            )
+        else:
+            result = await cls.get(id, with_children=True)
+        if result and identities is not None:
+            identities[result.identity_key(result.id)] = result
+        return result
+
+    @classmethod
+    async def from_id_projected(
+        cls, id: str, projection: Type[TProjection]
+    ) -> TProjection | None:
+        """Gets a single result by ID as a lightweight model, fetching only its fields
+
+        Reuses the full document if it's already loaded in the current identity scope,
+        and remembers the projection there otherwise.
+
+        Args:
+            id (str): ID to search for
+            projection (Type[TProjection]): Lightweight model to fetch the fields of
+
+        Returns:
+            TProjection | None: The located projection, or None if not found.
+        """
+        identities = IDENTITY_MAP.get()
+        projected_key = (f"{cls.get_settings().name}:{projection.__name__}", id)
+        if identities is not None:
+            existing = identities.get(cls.identity_key(id))
+            if isinstance(existing, cls):
+                return projection.model_validate(existing.model_dump())
+            existing = identities.get(projected_key)
+            if isinstance(existing, projection):
+                return existing
+
+        result = None
+        async for i in cls.iter_query({"_id": id}, projection=projection, limit=1):
+            result = i
+        if result and identities is not None:
+            identities[projected_key] = result
         return result
 
 
@@ -1,8 +1,9 @@
 from datetime import datetime
 from secrets import token_urlsafe
-from typing import TYPE_CHECKING, Any, Literal
+from typing import TYPE_CHECKING, Any, ClassVar, Literal
 from .base import BaseObject
 from pydantic import BaseModel, Field
+from pymongo import ASCENDING, IndexModel
 
 
 class RedactedUserConnection(BaseModel):
@@ -30,8 +31,31 @@ class UserConnection(BaseObject):
     account_name: str | None = None
     account_image: str | None = None
 
+    hot_queries: ClassVar[list[dict]] = [{"user_id": ""}, {"access_expire": ""}]
+    cache_ttl: ClassVar[int | None] = 300
+
     class Settings:
         name = "users_connections"
+        indexes = [
+            IndexModel([("user_id", ASCENDING)], name="user_id"),
+            # Scanned for tokens to refresh before they expire
+            IndexModel([("access_expire", ASCENDING)], name="access_expire"),
+        ]
+
+    @classmethod
+    async def redacted_for_user(
+        cls, user_id: str, after: str | None = None, limit: int | None = None
+    ) -> list[RedactedUserConnection]:
+        """Lists a user's connections by their public fields, without fetching any tokens"""
+        return [
+            i
+            async for i in cls.iter_query(
+                {"user_id": user_id},
+                projection=RedactedUserConnection,
+                after=after,
+                limit=limit,
+            )
+        ]
 
     def redact(self) -> RedactedUserConnection:
         return RedactedUserConnection(
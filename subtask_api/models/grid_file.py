@@ -1,22 +1,44 @@
 import base64
+import binascii
+from datetime import UTC, datetime
 import mimetypes
 import re
 from secrets import token_urlsafe
-from typing import AsyncIterator
+from typing import AsyncIterable, AsyncIterator, ClassVar
 from pydantic import Field
+from pymongo import ASCENDING, IndexModel
 from .base import BaseObject
 from motor.motor_asyncio import AsyncIOMotorGridFSBucket
 
 
+class FileTooLargeError(ValueError):
+    def __init__(self, max_size: int) -> None:
+        super().__init__(f"File exceeds the maximum size of {max_size} bytes")
+        self.max_size = max_size
+
+
 class GridFile(BaseObject):
     id: str = Field(default_factory=lambda: token_urlsafe(32))
     file_name: str
     file_type: str
     owner_collection: str
     owner_id: str
+    size: int | None = None
+    uploaded: datetime | None = None
+    variant_of: str | None = None  # ID of the original, if this is a derivative
+    variant: int | None = None  # Bounding size of this derivative
+    variants: dict[str, str] = {}  # Bounding size -> ID of the file to serve for it
+
+    hot_queries: ClassVar[list[dict]] = [{"owner_collection": "", "owner_id": ""}]
 
     class Settings:
         name = "grid_file_data"
+        indexes = [
+            IndexModel(
+                [("owner_collection", ASCENDING), ("owner_id", ASCENDING)],
+                name="owner",
+            )
+        ]
 
     @classmethod
     async def create(
@@ -26,40 +48,125 @@ class GridFile(BaseObject):
         owner_id: str,
         file_name: str | None = None,
         file_type: str = "application/octet-stream",
+        max_size: int | None = None,
+        variant_of: str | None = None,
+        variant: int | None = None,
+    ) -> "GridFile":
+        async def single_chunk() -> AsyncIterator[bytes]:
+            yield content
+
+        return await cls.create_from_stream(
+            single_chunk(),
+            owner_collection,
+            owner_id,
+            file_name=file_name,
+            file_type=file_type,
+            max_size=max_size,
+            variant_of=variant_of,
+            variant=variant,
+        )
+
+    @classmethod
+    async def create_from_stream(
+        cls,
+        chunks: AsyncIterable[bytes],
+        owner_collection: str,
+        owner_id: str,
+        file_name: str | None = None,
+        file_type: str = "application/octet-stream",
+        max_size: int | None = None,
+        variant_of: str | None = None,
+        variant: int | None = None,
     ) -> "GridFile":
+        """Pipes chunks straight into a GridFS upload stream
+
+        Args:
+            chunks (AsyncIterable[bytes]): File content
+            owner_collection (str): Collection of the owning object
+            owner_id (str): ID of the owning object
+            file_name (str | None, optional): File name, or None to generate one. Defaults to None.
+            file_type (str, optional): MIME type. Defaults to "application/octet-stream".
+            max_size (int | None, optional): Max size in bytes, or None for no limit. Defaults to None.
+            variant_of (str | None, optional): ID of the original, if this is a derivative. Defaults to None.
+            variant (int | None, optional): Bounding size, if this is a derivative. Defaults to None.
+
+        Raises:
+            FileTooLargeError: If the content exceeds `max_size`. The partial upload is discarded.
+
+        Returns:
+            GridFile: The created file
+        """
         file_id = token_urlsafe(32)
         if not file_name:
             guessed_type = mimetypes.guess_extension(file_type)
             file_name = f"file_{file_id}{guessed_type if guessed_type else '.bin'}"
 
         bucket = AsyncIOMotorGridFSBucket(cls.get_settings().motor_db)
-        await bucket.upload_from_stream_with_id(
+        upload = bucket.open_upload_stream_with_id(
             file_id,
             file_name,
-            content,
             metadata={
                 "contentType": file_type,
                 "owner": f"{owner_collection}:{owner_id}",
             },
         )
+        size = 0
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise FileTooLargeError(max_size)
+                await upload.write(chunk)
+        except BaseException:
+            await upload.abort()
+            raise
+        await upload.close()
+
         new_file = GridFile(
             id=file_id,
             file_name=file_name,
             file_type=file_type,
             owner_collection=owner_collection,
             owner_id=owner_id,
+            size=size,
+            uploaded=datetime.now(UTC),
+            variant_of=variant_of,
+            variant=variant,
         )
         await new_file.save()
         return new_file
 
     @classmethod
     async def create_from_data_url(
-        cls, content: str, owner_collection: str, owner_id: str
+        cls,
+        content: str,
+        owner_collection: str,
+        owner_id: str,
+        max_size: int | None = None,
+        chunk_size: int = 256 * 1024,
     ) -> "GridFile":
-        if not re.fullmatch("^data:(.*/.*;base64|.*/.*|;base64)?,.*", content):
-            raise ValueError(f"Invalid data URI `{content}`")
-        file_id = token_urlsafe(32)
-        header, data = content.split(",", maxsplit=1)
+        """Stores the content of a data URI, decoding it incrementally
+
+        Args:
+            content (str): Data URI
+            owner_collection (str): Collection of the owning object
+            owner_id (str): ID of the owning object
+            max_size (int | None, optional): Max decoded size in bytes. Defaults to None.
+            chunk_size (int, optional): Approximate bytes decoded per chunk. Defaults to 256KiB.
+
+        Raises:
+            ValueError: If the data URI is invalid
+            FileTooLargeError: If the decoded content exceeds `max_size`
+
+        Returns:
+            GridFile: The created file
+        """
+        separator = content.find(",")
+        header = content[:separator]
+        if separator < 0 or not re.fullmatch(
+            "^data:(.*/.*;base64|.*/.*|;base64)?", header
+        ):
+            raise ValueError(f"Invalid data URI `{content[:64]}`")
         info = header.split(":", maxsplit=1)[1]
         parts = info.split(";")
         if len(parts) == 1:
@@ -75,40 +182,123 @@ class GridFile(BaseObject):
                 mime = "text/plain"
             encoding = "base64" if parts[1] == "base64" else None
 
-        guessed_type = mimetypes.guess_extension(mime)
-        file_name = f"file_{file_id}{guessed_type if guessed_type else '.bin'}"
+        if encoding == "base64":
+            if max_size is not None and (len(content) - separator - 1) // 4 * 3 > (
+                max_size + 2
+            ):
+                raise FileTooLargeError(max_size)
+            step = max(chunk_size // 3 * 4, 4)
+        else:
+            step = max(chunk_size, 1)
 
-        bucket = AsyncIOMotorGridFSBucket(cls.get_settings().motor_db)
-        await bucket.upload_from_stream_with_id(
-            file_id,
-            file_name,
-            (base64.b64decode(data) if encoding == "base64" else data.encode()),
-            metadata={
-                "contentType": mime,
-                "owner": f"{owner_collection}:{owner_id}",
-            },
-        )
-        new_file = GridFile(
-            id=file_id,
-            file_name=file_name,
+        def decode_base64(data: str) -> bytes:
+            try:
+                return base64.b64decode(data, validate=True)
+            except binascii.Error:
+                raise ValueError("Invalid base64 data in data URI")
+
+        async def decode_chunks() -> AsyncIterator[bytes]:
+            pending = ""  # Base64 characters after the last whole 4-character group
+            for offset in range(separator + 1, len(content), step):
+                chunk = content[offset : offset + step]
+                if encoding != "base64":
+                    yield chunk.encode()
+                    continue
+
+                # Whitespace (e.g. line breaks) shifts slices off group boundaries, so
+                # decode whole groups only and carry the rest into the next slice
+                chunk = pending + "".join(chunk.split())
+                whole = len(chunk) - len(chunk) % 4
+                pending = chunk[whole:]
+                if whole > 0:
+                    yield decode_base64(chunk[:whole])
+            if pending:
+                yield decode_base64(pending)
+
+        return await cls.create_from_stream(
+            decode_chunks(),
+            owner_collection,
+            owner_id,
             file_type=mime,
-            owner_collection=owner_collection,
-            owner_id=owner_id,
+            max_size=max_size,
         )
-        await new_file.save()
-        return new_file
 
-    async def get_content(self) -> AsyncIterator[bytes]:
+    async def load_stats(self) -> "GridFile":
+        """Fills in `size` & `uploaded` from GridFS for files stored before they were tracked
+
+        Returns:
+            GridFile: This file
+        """
+        if self.size is None or self.uploaded is None:
+            bucket = AsyncIOMotorGridFSBucket(self.get_settings().motor_db)
+            stream = await bucket.open_download_stream(self.id)
+            self.size = stream.length
+            self.uploaded = stream.upload_date
+        if self.uploaded.tzinfo is None:
+            self.uploaded = self.uploaded.replace(tzinfo=UTC)
+        return self
+
+    async def get_content(
+        self, start: int = 0, end: int | None = None
+    ) -> AsyncIterator[bytes]:
+        """Streams the file's content, optionally only the byte range [start, end)
+
+        Args:
+            start (int, optional): First byte to send. Defaults to 0.
+            end (int | None, optional): Byte to stop before, or None for EOF. Defaults to None.
+
+        Yields:
+            bytes: Chunks of content
+        """
         bucket = AsyncIOMotorGridFSBucket(self.get_settings().motor_db)
         stream = await bucket.open_download_stream(self.id)
-        while True:
+        if start:
+            stream.seek(start)
+        remaining = None if end is None else end - start
+        while remaining is None or remaining > 0:
             data = await stream.readchunk()
             if not data:
                 break
 
+            if remaining is not None:
+                data = data[:remaining]
+                remaining -= len(data)
             yield data
 
+    async def read(self) -> bytes:
+        bucket = AsyncIOMotorGridFSBucket(self.get_settings().motor_db)
+        stream = await bucket.open_download_stream(self.id)
+        return await stream.read()
+
+    async def link_variant(self, size: int, variant_id: str) -> str:
+        """Records the file to serve for a bounding size, unless another worker already did
+
+        Args:
+            size (int): Bounding size
+            variant_id (str): ID of the derivative (or of this file, to serve the original)
+
+        Returns:
+            str: The ID now linked for that size
+        """
+        result = await self.get_motor_collection().find_one_and_update(
+            {"_id": self.id, f"variants.{size}": {"$exists": False}},
+            {"$set": {f"variants.{size}": variant_id}},
+        )
+        if result is None:
+            current = await self.get_motor_collection().find_one(
+                {"_id": self.id}, projection={f"variants.{size}": True}
+            )
+            variant_id = (current or {}).get("variants", {}).get(str(size), variant_id)
+
+        self.variants[str(size)] = variant_id
+        return variant_id
+
     async def delete(self) -> None:
+        for variant_id in set(self.variants.values()) - {self.id}:
+            variant = await GridFile.get(variant_id)
+            if variant:
+                await variant.delete()
+
         bucket = AsyncIOMotorGridFSBucket(self.get_settings().motor_db)
         await bucket.delete(self.id)
         await super().delete()
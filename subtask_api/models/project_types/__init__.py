@@ -4,6 +4,10 @@ from .project import (
     ProjectMember,
     ProjectPermission,
     ProjectConnection,
+    ProjectSummary,
 )
 
 from .task import *
+from .rank import rank_between, ranks_after
+from .task_query import TaskQuery, TaskFieldFilter, TaskSort
+from .attributes import ProjectAttributes, compile_field_validator
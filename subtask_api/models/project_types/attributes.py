@@ -0,0 +1,91 @@
+from datetime import datetime
+from typing import Any, Callable
+from .task import TaskAttribute, TaskField, TaskFieldEntry, TaskStatus, TaskTag
+
+FieldValidator = Callable[[Any], None]
+
+
+def compile_field_validator(field: TaskField) -> FieldValidator:
+    """Builds a function checking a value against a field's data type, choices & multiplicity
+
+    Args:
+        field (TaskField): Field definition
+
+    Returns:
+        FieldValidator: Raises ValueError if a value is invalid for the field
+    """
+    choices = set(field.choices or [])
+
+    def is_date(value: Any) -> bool:
+        datetime.fromisoformat(value)
+        return True
+
+    checks: dict[str, Callable[[Any], bool]] = {
+        "text": lambda value: isinstance(value, str),
+        "rich": lambda value: isinstance(value, str),
+        "number": lambda value: isinstance(value, (int, float))
+        and not isinstance(value, bool),
+        "switch": lambda value: isinstance(value, bool),
+        "date": lambda value: isinstance(value, str) and is_date(value),
+        "choice": lambda value: value in choices,
+    }
+    check_one = checks[field.data_type]
+
+    def validate(value: Any) -> None:
+        values = value if field.multiple else [value]
+        if field.multiple and not isinstance(value, list):
+            raise ValueError(f"Field `{field.name}` expects a list of values")
+        for item in values:
+            try:
+                valid = item is None or check_one(item)
+            except (TypeError, ValueError):
+                valid = False
+            if not valid:
+                raise ValueError(
+                    f"Invalid value for {field.data_type} field `{field.name}`: {item!r}"
+                )
+
+    return validate
+
+
+class ProjectAttributes:
+    """A project's tags, statuses & fields at one version, with precompiled field validators"""
+
+    def __init__(self, version: int, attributes: list[TaskAttribute]) -> None:
+        self.version = version
+        self.tags = {i.id: i for i in attributes if isinstance(i, TaskTag)}
+        self.statuses = {i.id: i for i in attributes if isinstance(i, TaskStatus)}
+        self.fields = {i.id: i for i in attributes if isinstance(i, TaskField)}
+        self.validators = {k: compile_field_validator(v) for k, v in self.fields.items()}
+
+    @classmethod
+    async def load(cls, project: str, version: int) -> "ProjectAttributes":
+        return cls(version, await TaskAttribute.from_query({"project": project}))
+
+    def validate_task(
+        self,
+        status: str | None = None,
+        tags: list[str] | None = None,
+        fields: list[TaskFieldEntry] | None = None,
+    ) -> None:
+        """Checks task values against this project's attributes, without any queries
+
+        Args:
+            status (str | None, optional): Status ID. Defaults to None.
+            tags (list[str] | None, optional): Tag IDs. Defaults to None.
+            fields (list[TaskFieldEntry] | None, optional): Field values. Defaults to None.
+
+        Raises:
+            ValueError: If any value is unknown or invalid
+        """
+        if status is not None and status not in self.statuses:
+            raise ValueError(f"Unknown status `{status}`")
+
+        unknown_tags = set(tags or []) - self.tags.keys()
+        if len(unknown_tags) > 0:
+            raise ValueError(f"Unknown tags: {', '.join(sorted(unknown_tags))}")
+
+        for entry in fields or []:
+            if entry.field not in self.validators:
+                raise ValueError(f"Unknown field `{entry.field}`")
+            self.validators[entry.field](entry.value)
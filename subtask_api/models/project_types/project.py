@@ -1,5 +1,7 @@
-from typing import Any
+from datetime import datetime
+from typing import Any, ClassVar
 from pydantic import BaseModel
+from pymongo import ASCENDING, IndexModel
 from ..base import BaseObject
 from ..user import User
 from enum import IntEnum, StrEnum
@@ -39,6 +41,17 @@ class ProjectMember(BaseModel):
 class ProjectConnection(BaseModel):
     connection_id: str
     location: Any
+    since: datetime | None = None  # Upstream time of the newest item synced, resumes syncs
+
+
+class ProjectSummary(BaseModel):
+    """A project without its members, for routes that only need the project itself"""
+
+    id: str
+    name: str
+    summary: str | None = None
+    image: str | None = None
+    connection: ProjectConnection | None = None
 
 
 class Project(BaseObject):
@@ -48,8 +61,60 @@ class Project(BaseObject):
     connection: ProjectConnection | None = None
     members: list[ProjectMember]
 
+    hot_queries: ClassVar[list[dict]] = [
+        {"members.user_id": ""},
+        {"connection.location": ""},
+    ]
+    cache_ttl: ClassVar[int | None] = 300
+
     class Settings:
         name = "projects"
+        use_state_management = True
+        state_management_save_previous = True
+        indexes = [
+            IndexModel([("members.user_id", ASCENDING)], name="member_ids"),
+            IndexModel(
+                [("connection.location", ASCENDING)],
+                name="connection_location",
+                sparse=True,
+            ),
+        ]
+
+    @classmethod
+    async def member_permission(
+        cls, project_id: str, user_id: str
+    ) -> ProjectPermission | None:
+        """Looks up one member's permission level, fetching only their entry
+
+        Args:
+            project_id (str): Project ID
+            user_id (str): User ID
+
+        Returns:
+            ProjectPermission | None: The member's level, or None if not a member (or no such project)
+        """
+        result = await cls.get_motor_collection().find_one(
+            {"_id": project_id, "members.user_id": user_id},
+            {"members": {"$elemMatch": {"user_id": user_id}}},
+        )
+        if not result:
+            return None
+        return ProjectPermission(result["members"][0]["permission"])
+
+    @classmethod
+    async def summarized(cls, id: str) -> ProjectSummary | None:
+        """Gets a project without fetching its members"""
+        return await cls.from_id_projected(id, ProjectSummary)
+
+    def member(self, user_id: str) -> ProjectMember | None:
+        for member in self.members:
+            if member.user_id == user_id:
+                return member
+        return None
+
+    def has_permission(self, user_id: str, permission: ProjectPermission) -> bool:
+        member = self.member(user_id)
+        return member is not None and member.has_permission(permission)
 
     async def owner(self) -> User | None:
         result = [
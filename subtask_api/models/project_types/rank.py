@@ -0,0 +1,120 @@
+RANK_DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+RANK_SPACING = 8  # Gap between keys generated together, room for a few inserts
+
+
+def rank_midpoint(lower: str, upper: str | None) -> str:
+    """Finds a key strictly between two keys, growing the key only when there is no room
+
+    Args:
+        lower (str): Lower key ("" for no lower bound)
+        upper (str | None): Upper key, or None for no upper bound
+
+    Returns:
+        str: The key between them
+    """
+    if upper is not None:
+        shared = 0
+        while shared < len(upper) and (
+            lower[shared] if shared < len(lower) else RANK_DIGITS[0]
+        ) == upper[shared]:
+            shared += 1
+        if shared > 0:
+            return upper[:shared] + rank_midpoint(lower[shared:], upper[shared:])
+
+    lower_digit = RANK_DIGITS.index(lower[0]) if lower else 0
+    upper_digit = RANK_DIGITS.index(upper[0]) if upper is not None else len(RANK_DIGITS)
+    if upper_digit - lower_digit > 1:
+        return RANK_DIGITS[(lower_digit + upper_digit + 1) // 2]
+    if upper is not None and len(upper) > 1:
+        return upper[:1]
+    return RANK_DIGITS[lower_digit] + rank_midpoint(lower[1:], None)
+
+
+def rank_increment(key: str) -> str:
+    """Counts up from a key by one in its last digit, carrying into earlier digits
+
+    Keeps a key's length while appending, unlike a midpoint towards no upper bound
+    (which grows keys a digit every few appends). Once every digit is the highest, the
+    key is doubled in length, so n appends cost O(log n) digits.
+
+    Args:
+        key (str): Key to count up from
+
+    Returns:
+        str: The next key
+    """
+    digits = [RANK_DIGITS.index(i) for i in key]
+    position = len(digits) - 1
+    while position >= 0 and digits[position] == len(RANK_DIGITS) - 1:
+        digits[position] = 0
+        position -= 1
+    if position < 0:
+        return key + RANK_DIGITS[0] * (len(key) - 1) + RANK_DIGITS[1]
+
+    digits[position] += 1
+    if digits[-1] == 0:  # Keys can't end in the zero digit
+        digits[-1] = 1
+    return "".join(RANK_DIGITS[i] for i in digits)
+
+
+def rank_between(before: str | None = None, after: str | None = None) -> str:
+    """Generates an ordering key that sorts between two sibling keys
+
+    Keys are compared as plain strings, so moving an item only ever rewrites its own key.
+    Appending (with only a preceding key) counts up from it, see rank_increment.
+
+    Args:
+        before (str | None, optional): Key of the preceding sibling, if any. Defaults to None.
+        after (str | None, optional): Key of the following sibling, if any. Defaults to None.
+
+    Raises:
+        ValueError: If `before` does not sort before `after`
+
+    Returns:
+        str: The new key
+    """
+    if before is not None and after is not None and before >= after:
+        raise ValueError(f"Rank `{before}` does not sort before `{after}`")
+    if before and after is None:
+        return rank_increment(before)
+    return rank_midpoint((before or "").rstrip(RANK_DIGITS[0]), after)
+
+
+def ranks_after(before: str | None, count: int) -> list[str]:
+    """Generates `count` ascending keys after a sibling key, a few steps apart
+
+    Keys count up from the last sibling's leading digits, doubling the digits used until
+    the batch fits, so repeated batches lengthen keys logarithmically. The gaps leave
+    room to insert between the new siblings before their keys need to grow.
+
+    Args:
+        before (str | None): Key of the last existing sibling, if any
+        count (int): Number of keys to generate
+
+    Returns:
+        list[str]: The new keys, in order
+    """
+    if count == 0:
+        return []
+    base = len(RANK_DIGITS)
+    width = 1
+    while True:
+        start = 0
+        for digit in (before or "")[:width].ljust(width, RANK_DIGITS[0]):
+            start = start * base + RANK_DIGITS.index(digit)
+        # Keys differ from `before` within its first `width` digits, so sort after it
+        if base**width - 1 - start >= RANK_SPACING * (count + 1):
+            break
+        width *= 2
+
+    keys = []
+    for index in range(count):
+        value = start + (index + 1) * RANK_SPACING
+        if value % base == 0:  # Keys can't end in the zero digit
+            value += 1
+        digits = ""
+        for _ in range(width):
+            value, digit = divmod(value, base)
+            digits = RANK_DIGITS[digit] + digits
+        keys.append(digits)
+    return keys
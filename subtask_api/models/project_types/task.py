@@ -1,6 +1,8 @@
-from typing import Any, Literal
+from datetime import datetime
+from typing import Any, ClassVar, Literal
 
 from pydantic import BaseModel
+from pymongo import ASCENDING, TEXT, IndexModel
 from ..base import BaseObject
 
 
@@ -8,9 +10,23 @@ class TaskAttribute(BaseObject):
     type: Any
     project: str
 
+    hot_queries: ClassVar[list[dict]] = [{"project": ""}]
+
     class Settings:
         name = "task_attribute"
         is_root = True
+        use_state_management = True
+        state_management_save_previous = True
+        indexes = [
+            IndexModel(
+                [("project", ASCENDING), ("_class_id", ASCENDING)], name="project"
+            ),
+            IndexModel(
+                [("project", ASCENDING), ("_class_id", ASCENDING), ("name", ASCENDING)],
+                name="names",
+                unique=True,
+            ),
+        ]
 
 
 class TaskTag(TaskAttribute):
@@ -40,6 +56,29 @@ class TaskFieldEntry(BaseModel):
     value: Any
 
 
+class TaskSource(BaseModel):
+    """The upstream item (e.g. a GitHub issue) a synced task mirrors"""
+
+    connection: str
+    id: str
+    number: int | None = None
+    url: str | None = None
+    updated: datetime  # Upstream modification time when last synced
+
+
+class TaskPosition(BaseModel):
+    """Where a task sits in the tree, as rewritten for descendants by Task.move"""
+
+    id: str
+    path: str
+    depth: int
+
+
+def path_range(prefix: str) -> dict:
+    """Builds a range matching every path that starts with `prefix` (which ends in "/")"""
+    return {"$gte": prefix, "$lt": prefix[:-1] + chr(ord("/") + 1)}
+
+
 class Task(BaseObject):
     project: str
     name: str
@@ -48,6 +87,164 @@ class Task(BaseObject):
     fields: list[TaskFieldEntry] = []
     creator: str
     assigned: list[str] = []
+    parent: str | None = None
+    path: str = "/"  # IDs of every ancestor, root first, as "/<id>/<id>/"
+    depth: int = 0
+    rank: str = "V"  # Ordering key among siblings, see rank_between
+    source: TaskSource | None = None
+
+    hot_queries: ClassVar[list[dict]] = [
+        {"project": ""},
+        {"project": "", "parent": ""},
+        {"project": "", "path": path_range("/")},
+        {"project": "", "fields": {"$elemMatch": {"field": "", "value": ""}}},
+    ]
 
     class Settings:
         name = "task"
+        use_state_management = True
+        state_management_save_previous = True
+        indexes = [
+            IndexModel([("project", ASCENDING)], name="project"),
+            IndexModel(
+                [("project", ASCENDING), ("parent", ASCENDING), ("rank", ASCENDING)],
+                name="siblings",
+            ),
+            IndexModel(
+                [("project", ASCENDING), ("path", ASCENDING), ("depth", ASCENDING)],
+                name="subtree",
+            ),
+            IndexModel(
+                [
+                    ("project", ASCENDING),
+                    ("fields.field", ASCENDING),
+                    ("fields.value", ASCENDING),
+                ],
+                name="field_values",
+            ),
+            IndexModel([("name", TEXT)], name="name_text"),
+            IndexModel(
+                [("project", ASCENDING), ("source.id", ASCENDING)],
+                name="source",
+                unique=True,
+                partialFilterExpression={"source.id": {"$exists": True}},
+            ),
+        ]
+
+    @property
+    def subtree_prefix(self) -> str:
+        """Path prefix shared by every descendant of this task"""
+        return f"{self.path}{self.id}/"
+
+    def place(self, parent: "Task | None", rank: str) -> None:
+        """Sets this task's position in the tree, without saving or touching descendants
+
+        Args:
+            parent (Task | None): New parent, or None for a root task
+            rank (str): Ordering key among the new siblings
+        """
+        self.parent = parent.id if parent else None
+        self.path = parent.subtree_prefix if parent else "/"
+        self.depth = parent.depth + 1 if parent else 0
+        self.rank = rank
+
+    @classmethod
+    async def sibling_rank(
+        cls,
+        project: str,
+        parent: str | None,
+        rank: str | None = None,
+        below: bool = False,
+        exclude: str | None = None,
+    ) -> str | None:
+        """Finds the rank of the sibling next to a rank (or of the last sibling)
+
+        Args:
+            project (str): Project ID
+            parent (str | None): Parent ID, or None for root tasks
+            rank (str | None, optional): Rank to look next to, or None for the last sibling. Defaults to None.
+            below (bool, optional): Look for the preceding instead of the following sibling. Defaults to False.
+            exclude (str | None, optional): Task ID to ignore (e.g. the task being moved). Defaults to None.
+
+        Returns:
+            str | None: The located rank, if any
+        """
+        query: dict[str, Any] = {"project": project, "parent": parent}
+        if rank is not None:
+            query["rank"] = {"$lt" if below else "$gt": rank}
+        if exclude:
+            query["_id"] = {"$ne": exclude}
+
+        result = await cls.get_motor_collection().find_one(
+            query,
+            {"rank": True},
+            sort=[("rank", -1 if below or rank is None else 1)],
+        )
+        return result["rank"] if result else None
+
+    async def move(self, parent: "Task | None", rank: str) -> list[TaskPosition]:
+        """Moves this task, rewriting descendants' paths (in one update) only if the parent changes
+
+        Callers report the returned positions, see ServerContext.after_bulk_write.
+
+        Args:
+            parent (Task | None): New parent, or None for a root task
+            rank (str): Ordering key among the new siblings
+
+        Raises:
+            ValueError: If the new parent is this task or one of its descendants
+
+        Returns:
+            list[TaskPosition]: New positions of the descendants moved along, if any
+        """
+        if parent and (
+            parent.id == self.id or parent.path.startswith(self.subtree_prefix)
+        ):
+            raise ValueError("A task cannot be moved beneath itself")
+
+        old_prefix = self.subtree_prefix
+        old_depth = self.depth
+        self.place(parent, rank)
+        await self.save()
+
+        if old_prefix != self.subtree_prefix:
+            await self.get_motor_collection().update_many(
+                {"project": self.project, "path": path_range(old_prefix)},
+                [
+                    {
+                        "$set": {
+                            "path": {
+                                "$concat": [
+                                    self.subtree_prefix,
+                                    {
+                                        "$substrCP": [
+                                            "$path",
+                                            len(old_prefix),
+                                            {"$strLenCP": "$path"},
+                                        ]
+                                    },
+                                ]
+                            },
+                            "depth": {"$add": ["$depth", self.depth - old_depth]},
+                        }
+                    }
+                ],
+            )
+            return [
+                i
+                async for i in Task.iter_query(
+                    {"project": self.project, "path": path_range(self.subtree_prefix)},
+                    projection=TaskPosition,
+                )
+            ]
+        return []
+
+    async def subtree(self, max_depth: int | None = None) -> list["Task"]:
+        """Fetches every descendant (down to `max_depth` levels) in one indexed range query"""
+        query: dict[str, Any] = {
+            "project": self.project,
+            "path": path_range(self.subtree_prefix),
+        }
+        if max_depth is not None:
+            query["depth"] = {"$lte": self.depth + max_depth}
+        return [i async for i in Task.iter_query(query, sort="path")]
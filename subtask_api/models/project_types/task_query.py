@@ -0,0 +1,179 @@
+from datetime import datetime
+import re
+from typing import Any, Literal
+from pydantic import BaseModel, Field
+from .task import Task, TaskField
+
+FILTER_OPERATORS = {
+    "eq": "$eq",
+    "ne": "$ne",
+    "in": "$in",
+    "nin": "$nin",
+    "gt": "$gt",
+    "gte": "$gte",
+    "lt": "$lt",
+    "lte": "$lte",
+}
+SORT_KEYS = ["name", "status", "rank", "depth", "creator"]
+
+
+class TaskFieldFilter(BaseModel):
+    field: str  # ID of a TaskField
+    op: Literal[
+        "eq", "ne", "in", "nin", "gt", "gte", "lt", "lte", "exists", "contains"
+    ] = "eq"
+    value: Any = None
+
+
+class TaskSort(BaseModel):
+    key: str  # One of SORT_KEYS, or "field:<TaskField ID>"
+    descending: bool = False
+
+
+class TaskQuery(BaseModel):
+    status: list[str] | None = None  # Matches any of these statuses
+    tags_all: list[str] = []  # Matches tasks with every one of these tags
+    tags_any: list[str] = []  # Matches tasks with at least one of these tags
+    assigned: list[str] = []  # Matches tasks assigned to any of these users
+    parent: str | None = None  # Matches direct children of this task
+    text: str | None = None  # Full-text search over task names
+    fields: list[TaskFieldFilter] = []
+    sort: list[TaskSort] = []
+    offset: int = Field(default=0, ge=0)
+    limit: int = Field(default=50, ge=1, le=500)
+
+    @staticmethod
+    def coerce(field: TaskField | None, value: Any) -> Any:
+        """Converts a filter value to the type stored for its field"""
+        if field is None or value is None:
+            return value
+        if isinstance(value, list):
+            return [TaskQuery.coerce(field, i) for i in value]
+        match field.data_type:
+            case "number":
+                return float(value)
+            case "switch":
+                return value if isinstance(value, bool) else str(value) == "true"
+            case "date":
+                datetime.fromisoformat(str(value))  # Stored as ISO strings
+                return str(value)
+            case _:
+                return str(value)
+
+    def compile_match(self, project: str, fields: dict[str, TaskField]) -> dict:
+        """Compiles the filters into a $match stage body
+
+        Args:
+            project (str): Project ID
+            fields (dict[str, TaskField]): The project's field definitions, by ID
+
+        Raises:
+            ValueError: If a filter references an unknown field or has an invalid value
+
+        Returns:
+            dict: The match query
+        """
+        clauses: list[dict] = [{"project": project}]
+        if self.status is not None:
+            clauses.append({"status": {"$in": self.status}})
+        if len(self.tags_all) > 0:
+            clauses.append({"tags": {"$all": self.tags_all}})
+        if len(self.tags_any) > 0:
+            clauses.append({"tags": {"$in": self.tags_any}})
+        if len(self.assigned) > 0:
+            clauses.append({"assigned": {"$in": self.assigned}})
+        if self.parent is not None:
+            clauses.append({"parent": self.parent})
+        if self.text:
+            clauses.append({"$text": {"$search": self.text}})
+
+        for item in self.fields:
+            if item.field not in fields:
+                raise ValueError(f"Unknown field `{item.field}`")
+            if item.op == "exists":
+                condition = {"field": item.field}
+                clauses.append(
+                    {"fields": {"$elemMatch": condition}}
+                    if item.value is not False
+                    else {"fields": {"$not": {"$elemMatch": condition}}}
+                )
+                continue
+
+            value = self.coerce(fields[item.field], item.value)
+            if item.op == "contains":
+                condition = {"$regex": re.escape(str(item.value)), "$options": "i"}
+            else:
+                condition = {FILTER_OPERATORS[item.op]: value}
+            clauses.append(
+                {"fields": {"$elemMatch": {"field": item.field, "value": condition}}}
+            )
+
+        return {"$and": clauses} if len(clauses) > 1 else clauses[0]
+
+    def compile(self, project: str, fields: dict[str, TaskField]) -> list[dict]:
+        """Compiles the query into an aggregation pipeline producing `{tasks, total}`
+
+        Args:
+            project (str): Project ID
+            fields (dict[str, TaskField]): The project's field definitions, by ID
+
+        Raises:
+            ValueError: If the query references unknown fields/sort keys
+
+        Returns:
+            list[dict]: The aggregation pipeline
+        """
+        pipeline: list[dict] = [{"$match": self.compile_match(project, fields)}]
+        sorting: dict[str, int] = {}
+        computed: dict[str, Any] = {}
+        for index, item in enumerate(self.sort):
+            direction = -1 if item.descending else 1
+            if item.key.startswith("field:"):
+                field_id = item.key.removeprefix("field:")
+                if field_id not in fields:
+                    raise ValueError(f"Unknown field `{field_id}`")
+                computed[f"sort_{index}"] = {
+                    "$first": {
+                        "$map": {
+                            "input": {
+                                "$filter": {
+                                    "input": "$fields",
+                                    "cond": {"$eq": ["$$this.field", field_id]},
+                                }
+                            },
+                            "in": "$$this.value",
+                        }
+                    }
+                }
+                sorting[f"sort_{index}"] = direction
+            elif item.key in SORT_KEYS:
+                sorting[item.key] = direction
+            else:
+                raise ValueError(f"Unknown sort key `{item.key}`")
+        sorting["_id"] = 1
+
+        if len(computed) > 0:
+            pipeline.append({"$addFields": computed})
+        pipeline.append({"$sort": sorting})
+        page: list[dict] = [{"$skip": self.offset}, {"$limit": self.limit}]
+        if len(computed) > 0:
+            page.append({"$unset": list(computed.keys())})
+        pipeline.append({"$facet": {"tasks": page, "total": [{"$count": "count"}]}})
+        return pipeline
+
+    async def run(
+        self, project: str, fields: dict[str, TaskField]
+    ) -> tuple[list[Task], int]:
+        """Runs the query
+
+        Returns:
+            tuple[list[Task], int]: The requested page of tasks, and the total number of matches
+        """
+        results = await Task.get_motor_collection().aggregate(
+            self.compile(project, fields)
+        ).to_list(length=1)
+        result = results[0] if len(results) > 0 else {"tasks": [], "total": []}
+        return (
+            [Task.model_validate(i) for i in result["tasks"]],
+            result["total"][0]["count"] if len(result["total"]) > 0 else 0,
+        )
@@ -23,10 +23,9 @@ class Session(BaseStoredObject):
         return Session(creation_time=current_utc, access_time=current_utc)
 
     async def expand(self) -> ExpandedSession:
-        user = await User.from_id(self.user_id) if self.user_id else None
         return ExpandedSession(
             id=self.id,
             creation_time=self.creation_time,
             access_time=self.access_time,
-            user=user.redact() if user else None,
+            user=await User.redacted(self.user_id) if self.user_id else None,
         )
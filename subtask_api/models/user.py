@@ -1,14 +1,21 @@
-from hashlib import pbkdf2_hmac
-import os
-
+from typing import TYPE_CHECKING, ClassVar
 from pydantic import BaseModel
+from pymongo import ASCENDING, IndexModel
 from .base import BaseObject
 from .connection import UserConnection
+from ..utils.hashing import LEGACY_SCHEME
 from litestar.connection import ASGIConnection
 from litestar.handlers.base import BaseRouteHandler
 from litestar.exceptions import *
 from litestar import Request
 
+if TYPE_CHECKING:
+    from ..utils.hashing import PasswordHasher
+
+
+# Case-insensitive comparison, shared by the username index and every username query
+USERNAME_COLLATION = {"locale": "en", "strength": 2}
+
 
 class RedactedUser(BaseModel):
     id: str
@@ -23,35 +30,68 @@ class User(BaseObject):
     avatar: str | None = None
     password_hash: str
     password_salt: str
+    password_scheme: str = LEGACY_SCHEME
+
+    hot_queries: ClassVar[list[dict]] = [{"username": ""}]
+    hot_query_collation: ClassVar[dict | None] = USERNAME_COLLATION
+    cache_ttl: ClassVar[int | None] = 300
 
     class Settings:
         name = "users"
+        indexes = [
+            IndexModel(
+                [("username", ASCENDING)],
+                name="username_ci",
+                unique=True,
+                collation=USERNAME_COLLATION,
+            )
+        ]
 
     @classmethod
-    def create(cls, username: str, display_name: str, password: str) -> "User":
-        salt = os.urandom(32)
-        hashed = pbkdf2_hmac("sha256", password.encode(), salt, 500000).hex()
+    async def by_username(cls, username: str) -> "User | None":
+        results = await cls.from_query(
+            {"username": username}, limit=1, collation=USERNAME_COLLATION
+        )
+        return results[0] if len(results) > 0 else None
+
+    @classmethod
+    async def create(
+        cls, hasher: "PasswordHasher", username: str, display_name: str, password: str
+    ) -> "User":
+        hashed, salt, scheme = await hasher.generate(password)
         return User(
             username=username,
             display_name=display_name,
             password_hash=hashed,
-            password_salt=salt.hex(),
+            password_salt=salt,
+            password_scheme=scheme,
+        )
+
+    async def verify(self, hasher: "PasswordHasher", attempt: str) -> bool:
+        return await hasher.verify(
+            attempt, self.password_hash, self.password_salt, self.password_scheme
         )
 
-    def verify(self, attempt: str) -> bool:
-        hashed_attempt = pbkdf2_hmac(
-            "sha256", attempt.encode(), bytes.fromhex(self.password_salt), 500000
-        ).hex()
-        return hashed_attempt == self.password_hash
+    def needs_rehash(self, hasher: "PasswordHasher") -> bool:
+        return self.password_scheme != hasher.scheme
+
+    async def set_password(self, hasher: "PasswordHasher", password: str):
+        self.password_hash, self.password_salt, self.password_scheme = (
+            await hasher.generate(password)
+        )
 
-    def change_password(self, old_password: str, new_password: str):
-        if not self.verify(old_password):
+    async def change_password(
+        self, hasher: "PasswordHasher", old_password: str, new_password: str
+    ):
+        if not await self.verify(hasher, old_password):
             raise ValueError("Incorrect passphrase supplied")
 
-        salt = os.urandom(32)
-        hashed = pbkdf2_hmac("sha256", new_password.encode(), salt, 500000).hex()
-        self.password_hash = hashed
-        self.password_salt = salt.hex()
+        await self.set_password(hasher, new_password)
+
+    @classmethod
+    async def redacted(cls, id: str) -> RedactedUser | None:
+        """Gets a user's public fields, without fetching their credentials"""
+        return await cls.from_id_projected(id, RedactedUser)
 
     def redact(self) -> RedactedUser:
         return RedactedUser(
@@ -73,10 +113,15 @@ async def get_active_user(connection: ASGIConnection) -> User | None:
 
 
 async def guard_logged_in(connection: ASGIConnection, _: BaseRouteHandler) -> None:
-    user = await get_active_user(connection)
-    if not user:
+    # Sessions only gain a user_id by logging in, so this needs no database lookup;
+    # handlers that need the user load it (or just the fields they use) themselves
+    session = connection.scope.get("token", None)
+    if not session or not session.user_id:
         raise NotAuthorizedException("You must be logged in to access this endpoint.")
 
 
-async def provide_user(request: Request) -> User | None:
-    return await get_active_user(request)
+async def provide_user(request: Request) -> User:
+    user = await get_active_user(request)
+    if not user:
+        raise NotAuthorizedException("You must be logged in to access this endpoint.")
+    return user
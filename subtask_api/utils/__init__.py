@@ -5,3 +5,8 @@ from .cookie_session import (
     get_session_from_connection,
 )
 from .config import *
+from .identity_map import IdentityMapMiddleware
+from .feed import ChangeEvent, ProjectFeed
+from .pools import PoolStats
+from .metrics import Metrics, timed
+from .timing import TimingMiddleware
@@ -0,0 +1,50 @@
+from typing import Literal
+from redis.asyncio import Redis
+from ..models import BaseObject, ProjectAttributes, TaskAttribute
+from .cache import LocalCache
+
+
+class AttributeCache:
+    """In-process cache of each project's task attributes.
+
+    Every attribute write bumps a per-project version counter in Redis, so all workers
+    notice the change on their next lookup and reload that project only.
+    """
+
+    def __init__(self, redis: Redis, max_entries: int = 1024) -> None:
+        self.redis = redis
+        self.local: LocalCache[str, ProjectAttributes] = LocalCache(
+            max_entries=max_entries
+        )
+
+    @staticmethod
+    def version_key(project: str) -> str:
+        return f"SUBTASK_ATTRIBUTES_VERSION:{project}"
+
+    async def get(self, project: str) -> ProjectAttributes:
+        """Gets a project's attributes, reloading them only if their version changed
+
+        Args:
+            project (str): Project ID
+
+        Returns:
+            ProjectAttributes: The project's current attributes
+        """
+        version = int(await self.redis.get(self.version_key(project)) or 0)
+        cached = self.local.get(project)
+        if cached and cached.version == version:
+            return cached
+
+        loaded = await ProjectAttributes.load(project, version)
+        self.local.set(project, loaded)
+        return loaded
+
+    async def invalidate(self, project: str) -> None:
+        await self.redis.incr(self.version_key(project))
+        self.local.pop(project)
+
+    async def on_write(
+        self, document: BaseObject, action: Literal["save", "delete"]
+    ) -> None:
+        if isinstance(document, TaskAttribute):
+            await self.invalidate(document.project)
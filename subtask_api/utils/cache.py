@@ -0,0 +1,92 @@
+from collections import OrderedDict
+import time
+from typing import Callable, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LocalCache(Generic[K, V]):
+    """Small in-process LRU cache with an optional per-entry TTL.
+
+    Entries are evicted least-recently-used first once `max_entries` is exceeded (or
+    once the summed `weigh(value)` exceeds `max_weight`, if given), and are treated as
+    missing once they are older than `ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float | None = None,
+        max_weight: int | None = None,
+        weigh: Callable[[V], int] = lambda _: 1,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self.weigh = weigh
+        self.weight = 0
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def get(self, key: K) -> V | None:
+        """Gets an entry, refreshing its LRU position
+
+        Args:
+            key (K): Key to look up
+
+        Returns:
+            V | None: The cached value, or None if missing/expired.
+        """
+        entry = self._entries.get(key, None)
+        if entry is None:
+            return None
+
+        stored_at, value = entry
+        if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+            self.pop(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        """Stores an entry, evicting the least-recently-used entries if full
+
+        Args:
+            key (K): Key to store under
+            value (V): Value to store
+        """
+        self.pop(key)
+        self._entries[key] = (time.monotonic(), value)
+        self.weight += self.weigh(value)
+        while len(self._entries) > self.max_entries or (
+            self.max_weight is not None and self.weight > self.max_weight
+        ):
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.weight -= self.weigh(evicted)
+
+    def pop(self, key: K) -> V | None:
+        """Removes an entry if present
+
+        Args:
+            key (K): Key to remove
+
+        Returns:
+            V | None: The removed value, if any.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+
+        self.weight -= self.weigh(entry[1])
+        return entry[1]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.weight = 0
+
+    def __contains__(self, key: K) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -7,6 +7,11 @@ class DatabaseConfig(BaseModel):
     username: str
     password: str
     database: str
+    max_pool_size: int = 100  # Max open connections per worker (per server for Mongo)
+    min_pool_size: int = 4  # Connections opened at startup & kept open
+    connect_timeout: float = 5  # Seconds to establish a connection
+    timeout: float = 10  # Seconds an operation (or waiting for a free connection) may take
+    max_idle_time: float = 300  # Seconds before an idle connection is closed (Mongo only)
 
     @property
     def parsed(self) -> str:
@@ -27,6 +32,7 @@ class GithubOAuthConfig(BaseModel):
     client_id: str
     client_secret: str
     private_key: str
+    webhook_secret: str | None = None  # Signs webhook deliveries; webhooks are off without it
 
 
 OAUTH_CONFIGS = GithubOAuthConfig
@@ -36,6 +42,100 @@ class OAuthConfig(BaseModel):
     github: GithubOAuthConfig
 
 
+class SessionConfig(BaseModel):
+    expire: int = 7200  # Seconds of inactivity before a session expires
+    cache_ttl: float = 5  # Seconds a decoded session is served from the local cache
+    cache_size: int = 4096  # Max number of sessions held in the local cache
+    write_interval: int = 600  # Seconds between access_time write-backs (renews expiry)
+    permission_cache_size: int = 16384  # Max (project, user) permissions held in memory
+
+
+class HashingConfig(BaseModel):
+    algorithm: str = "sha256"
+    iterations: int = 500000
+    workers: int = 2  # Size of the hashing process pool
+    max_concurrency: int = 2  # Max hashes running at once
+    max_waiting: int = 64  # Max hashes queued before new logins are rejected
+
+
+class HttpConfig(BaseModel):
+    timeout: float = 15  # Seconds before outbound requests time out
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30  # Seconds an idle pooled connection is kept open
+    provider_cache_size: int = 256  # Max live connection providers kept in memory
+    provider_concurrency: int = 4  # Max upstream API calls in flight per connection
+    rate_limit_reserve: int = 50  # Upstream requests per connection left unspent
+    rate_limit_max_wait: float = 10  # Seconds a call may queue for its rate limit to reset
+    token_refresh_ahead: float = 600  # Seconds before expiry access tokens are refreshed
+    token_refresh_interval: float = 60  # Seconds between scans for expiring access tokens
+    token_refresh_wait: float = 10  # Seconds a request waits on another worker's refresh
+
+
+class FilesConfig(BaseModel):
+    info_cache_size: int = 4096  # Max file records kept in memory
+    info_cache_ttl: float = 600  # Seconds a file record is trusted before re-checking it exists
+    content_cache_bytes: int = 64 * 1024 * 1024  # Total bytes of file content kept in memory
+    max_cached_file: int = 256 * 1024  # Largest file whose content is kept in memory
+    max_age: int = 31536000  # Cache-Control max-age sent with file responses
+
+
+class UploadsConfig(BaseModel):
+    chunk_size: int = 256 * 1024  # Bytes read/decoded at a time while uploading
+    default_limit: int = 16 * 1024 * 1024  # Max upload size for unlisted collections
+    limits: dict[str, int] = {  # Max upload size per owner collection
+        "users": 4 * 1024 * 1024,
+        "projects": 8 * 1024 * 1024,
+    }
+
+    def limit_for(self, collection: str) -> int:
+        return self.limits.get(collection, self.default_limit)
+
+
+class ImagesConfig(BaseModel):
+    sizes: list[int] = [32, 64, 128, 256, 512]  # Bounding sizes derivatives are made for
+    format: str = "WEBP"  # Pillow format derivatives are encoded with
+    quality: int = 80
+    workers: int = 2  # Size of the resizing thread pool
+    eager: bool = True  # Generate all derivatives right after upload
+    max_source_size: int = 20 * 1024 * 1024  # Larger originals are always served as-is
+    types: list[str] = ["image/png", "image/jpeg", "image/gif", "image/webp"]
+
+
+class FeedConfig(BaseModel):
+    max_pending: int = 500  # Objects buffered per slow subscriber before it must resync
+    heartbeat: float = 15  # Seconds between keepalives on idle feeds
+
+
+class HealthConfig(BaseModel):
+    max_saturation: float = 0.9  # Pool usage fraction above which a worker reports not ready
+    metrics: bool = False  # Serve GET /metrics (only enable where scrapers alone can reach it)
+
+
+class JobsConfig(BaseModel):
+    workers: int = 4  # Background jobs run at once per process
+    max_attempts: int = 5  # Tries before a job is moved to the dead letter list
+    retry_delay: float = 5  # Seconds before a failed job's first retry, doubling each time
+    claim_after: float = 300  # Seconds a job's worker may go silent before it's requeued
+
+
+class DocumentsConfig(BaseModel):
+    cache: bool = True  # Cache from_id lookups of the models that opt in (see cache_ttl)
+    local_ttl: float = 2  # Seconds a document is served from memory (others' writes lag this)
+    local_size: int = 4096  # Max documents held in memory
+
+
 class ServerConfig(BaseModel):
     databases: AllDatabasesConfig
     oauth: OAuthConfig
+    debug: bool = False  # Explain queries and report any that fall back to COLLSCAN
+    sessions: SessionConfig = SessionConfig()
+    hashing: HashingConfig = HashingConfig()
+    http: HttpConfig = HttpConfig()
+    files: FilesConfig = FilesConfig()
+    uploads: UploadsConfig = UploadsConfig()
+    images: ImagesConfig = ImagesConfig()
+    feed: FeedConfig = FeedConfig()
+    health: HealthConfig = HealthConfig()
+    jobs: JobsConfig = JobsConfig()
+    documents: DocumentsConfig = DocumentsConfig()
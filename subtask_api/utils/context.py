@@ -1,41 +1,392 @@
+import asyncio
+import os
 from urllib.parse import quote
 from pydantic import BaseModel
 from litestar.stores.redis import RedisStore
 from litestar.datastructures import State
 import tomllib
-from redis.asyncio import Redis
+from typing import Any, Literal
+import httpx
+from redis.asyncio import BlockingConnectionPool, Redis
 from motor.motor_asyncio import AsyncIOMotorClient
+import logging
 from beanie import init_beanie
 from ..models import *
 from .config import *
+from .cache import LocalCache
+from .sessions import SessionCache
+from .hashing import PasswordHasher
+from .images import ImageVariants
+from .attributes import AttributeCache
+from .feed import ChangeEvent, ProjectFeed
+from .permissions import PermissionCache
+from .jobs import JobQueue
+from .documents import RedisDocumentCache
+from .pools import MongoPoolMonitor, PoolStats, redis_pool_stats
+from .metrics import (
+    CommandTimer,
+    Gauges,
+    Metrics,
+    executor_gauges,
+    time_http,
+    time_redis,
+)
+import motor.frameworks.asyncio as motor_framework
+from pymongo import IndexModel
+
+
+logger = logging.getLogger("subtask")
+
+DOCUMENT_MODELS: list[type[BaseObject]] = [
+    User,
+    UserConnection,
+    GridFile,
+    Project,
+    Task,
+    TaskAttribute,
+    TaskField,
+    TaskStatus,
+    TaskTag,
+]
+
+
+class DuplicateKeysError(Exception):
+    """Existing documents collide on a unique index that has yet to be built"""
+
+
+async def find_duplicates(
+    collection: Any, index: IndexModel, limit: int = 20
+) -> list[dict[str, Any]]:
+    """Groups the documents that share a key in a unique index (under its collation)
+
+    Returns:
+        list[dict[str, Any]]: Up to `limit` groups, as {_id: key, ids: [document IDs]}
+    """
+    spec = index.document
+    pipeline: list[dict[str, Any]] = []
+    if "partialFilterExpression" in spec:
+        pipeline.append({"$match": spec["partialFilterExpression"]})
+    pipeline.extend(
+        [
+            {
+                "$group": {
+                    "_id": {k.replace(".", "_"): f"${k}" for k in spec["key"].keys()},
+                    "ids": {"$push": "$_id"},
+                    "count": {"$sum": 1},
+                }
+            },
+            {"$match": {"count": {"$gt": 1}}},
+            {"$limit": limit},
+        ]
+    )
+    extra = {"collation": spec["collation"]} if "collation" in spec else {}
+    return [i async for i in collection.aggregate(pipeline, **extra)]
 
 
 class ServerContext:
-    def __init__(self) -> None:
-        with open("config.toml", "rb") as config_file:
-            self.config = ServerConfig(**tomllib.load(config_file))
+    def __init__(
+        self,
+        config: ServerConfig | None = None,
+        redis: Redis | None = None,
+        mongo: AsyncIOMotorClient | None = None,
+        http: httpx.AsyncClient | None = None,
+    ) -> None:
+        """Builds the server's clients & caches from `config.toml` (or $SUBTASK_CONFIG)
+
+        Args:
+            config (ServerConfig | None, optional): Config to use instead of the file. Defaults to None.
+            redis (Redis | None, optional): Redis client to use instead of a pooled one. Defaults to None.
+            mongo (AsyncIOMotorClient | None, optional): Mongo client to use instead of a pooled one. Defaults to None.
+            http (httpx.AsyncClient | None, optional): Outbound HTTP client to use instead of a pooled one. Defaults to None.
+        """
+        if config:
+            self.config = config
+        else:
+            config_path = os.environ.get("SUBTASK_CONFIG", "config.toml")
+            with open(config_path, "rb") as config_file:
+                self.config = ServerConfig(**tomllib.load(config_file))
 
-        self.store = RedisStore(
-            Redis.from_url(self.config.databases.redis.parsed), namespace="SUBTASK"
+        self.metrics = Metrics()
+        redis_config = self.config.databases.redis
+        self.redis = redis or Redis(
+            connection_pool=BlockingConnectionPool.from_url(
+                redis_config.parsed,
+                max_connections=redis_config.max_pool_size,
+                timeout=redis_config.timeout,
+                socket_connect_timeout=redis_config.connect_timeout,
+                socket_timeout=redis_config.timeout,
+            )
+        )
+        time_redis(self.redis)
+        self.store = RedisStore(self.redis, namespace="SUBTASK")
+
+        mongo_config = self.config.databases.mongo
+        self.mongo_pool = MongoPoolMonitor(mongo_config.max_pool_size)
+        self.mongo = mongo or AsyncIOMotorClient(
+            mongo_config.parsed,
+            maxPoolSize=mongo_config.max_pool_size,
+            minPoolSize=mongo_config.min_pool_size,
+            maxIdleTimeMS=int(mongo_config.max_idle_time * 1000),
+            connectTimeoutMS=int(mongo_config.connect_timeout * 1000),
+            serverSelectionTimeoutMS=int(mongo_config.timeout * 1000),
+            waitQueueTimeoutMS=int(mongo_config.timeout * 1000),
+            event_listeners=[self.mongo_pool, CommandTimer()],
+        )
+        self.ready = False
+        self.sessions = SessionCache(self.redis, self.config.sessions)
+        self.hasher = PasswordHasher(self.config.hashing)
+        self.http = http or httpx.AsyncClient(
+            timeout=self.config.http.timeout,
+            limits=httpx.Limits(
+                max_connections=self.config.http.max_connections,
+                max_keepalive_connections=self.config.http.max_keepalive_connections,
+                keepalive_expiry=self.config.http.keepalive_expiry,
+            ),
         )
-        self.mongo = AsyncIOMotorClient(self.config.databases.mongo.parsed)
+        time_http(self.http)
+        self.providers: LocalCache[tuple[str, str], Any] = LocalCache(
+            max_entries=self.config.http.provider_cache_size
+        )
+        self.rate_limits: LocalCache[str, Any] = LocalCache(
+            max_entries=self.config.http.provider_cache_size
+        )
+        self.file_info: LocalCache[str, GridFile] = LocalCache(
+            max_entries=self.config.files.info_cache_size,
+            ttl=self.config.files.info_cache_ttl,
+        )
+        self.file_content: LocalCache[str, bytes] = LocalCache(
+            max_entries=self.config.files.info_cache_size,
+            ttl=self.config.files.info_cache_ttl,
+            max_weight=self.config.files.content_cache_bytes,
+            weigh=len,
+        )
+        self.images = ImageVariants(self.config.images)
+        self.attributes = AttributeCache(self.redis)
+        self.feed = ProjectFeed(self.redis, self.config.feed)
+        self.permissions = PermissionCache(
+            self.redis, max_entries=self.config.sessions.permission_cache_size
+        )
+        self.jobs = JobQueue(self.redis, self.config.jobs)
+        self.documents = RedisDocumentCache(self.redis, self.config.documents)
+        self.write_listeners = [
+            self.attributes.on_write,
+            self.feed.on_write,
+            self.permissions.on_write,
+            self.documents.on_write,
+            self.on_file_write,
+        ]
 
     async def initialize(self):
-        await init_beanie(
-            database=self.mongo[self.config.databases.mongo.database],
-            document_models=[
-                User,
-                UserConnection,
-                GridFile,
-                Project,
-                Task,
-                TaskAttribute,
-                TaskField,
-                TaskStatus,
-                TaskTag,
-            ],
+        async def prepare_models() -> None:
+            await init_beanie(
+                database=self.mongo[self.config.databases.mongo.database],
+                document_models=DOCUMENT_MODELS,
+                skip_indexes=True,  # Built by verify_indexes, which reports conflicts
+            )
+            await self.verify_indexes()
+
+        await asyncio.gather(self.warmup(), prepare_models())
+        for listener in self.write_listeners:
+            BaseObject.add_write_listener(listener)
+        if self.config.documents.cache:
+            BaseObject.document_cache = self.documents
+        self.sessions.start()
+        self.feed.start()
+        await self.jobs.start()
+        self.metrics.loop_lag.start()
+        if self.config.debug:
+            BaseObject.explain_queries = True
+            await self.report_query_plans()
+        self.ready = True
+
+    async def warmup(self) -> None:
+        """Opens `min_pool_size` connections to Mongo & Redis, so early requests skip connection setup"""
+        databases = self.config.databases
+        await asyncio.gather(
+            *(
+                self.mongo.admin.command("ping")
+                for _ in range(max(databases.mongo.min_pool_size, 1))
+            ),
+            *(self.redis.ping() for _ in range(max(databases.redis.min_pool_size, 1))),
         )
 
+    def pool_stats(self) -> dict[str, PoolStats]:
+        return {
+            "mongo": self.mongo_pool.stats(),
+            "redis": redis_pool_stats(self.redis.connection_pool),
+        }
+
+    async def verify_indexes(self) -> list[str]:
+        """Checks that every index declared on a model exists, creating any that are missing
+
+        Raises:
+            DuplicateKeysError: If a unique index is missing & existing documents break it
+
+        Returns:
+            list[str]: `collection.index` names that could not be created
+        """
+
+        async def verify(model: type[BaseObject]) -> list[str]:
+            # Beanie wraps declared IndexModels in IndexModelFields once initialized
+            declared = [getattr(i, "index", i) for i in model.get_settings().indexes or []]
+            collection = model.get_motor_collection()
+            existing = await collection.index_information()
+            missing = [i for i in declared if i.document["name"] not in existing]
+            if len(missing) == 0:
+                return []
+
+            logger.warning(
+                "Creating missing indexes on `%s`: %s",
+                collection.name,
+                ", ".join(i.document["name"] for i in missing),
+            )
+            try:
+                await collection.create_indexes(missing)
+            except Exception:
+                # Running without a unique index would silently allow more duplicates
+                for index in missing:
+                    if not index.document.get("unique"):
+                        continue
+                    duplicates = await find_duplicates(collection, index)
+                    if len(duplicates) > 0:
+                        name = f"{collection.name}.{index.document['name']}"
+                        raise DuplicateKeysError(
+                            f"Unique index `{name}` can't be built, documents collide:"
+                            + "".join(
+                                f"\n  {i['_id']}: {', '.join(map(str, i['ids']))}"
+                                for i in duplicates
+                            )
+                        )
+                logger.exception("Failed to create indexes on `%s`", collection.name)
+                return [f"{collection.name}.{i.document['name']}" for i in missing]
+            return []
+
+        # Child models share their root's collection, so check each collection once
+        roots = {i.get_settings().name: i for i in reversed(DOCUMENT_MODELS)}
+        results = await asyncio.gather(*(verify(i) for i in roots.values()))
+        return [name for failed in results for name in failed]
+
+    async def report_query_plans(self) -> dict[str, set[str]]:
+        """Explains each model's hot queries, logging any that fall back to a COLLSCAN
+
+        Returns:
+            dict[str, set[str]]: `collection: query` -> stages of its winning plan
+        """
+        report = {}
+        for model in DOCUMENT_MODELS:
+            if "hot_queries" not in model.__dict__:
+                continue
+
+            for query in model.hot_queries:
+                stages = await model.explain_query(
+                    query, collation=model.hot_query_collation
+                )
+                report[f"{model.get_settings().name}: {query}"] = stages
+
+        scans = [k for k, v in report.items() if "COLLSCAN" in v]
+        logger.info(
+            "Explained %s hot queries, %s fell back to COLLSCAN%s",
+            len(report),
+            len(scans),
+            "".join(f"\n  {i}" for i in scans),
+        )
+        return report
+
+    def gauges(self) -> Gauges:
+        """Current pool, hashing & thread pool usage, for the metrics endpoint"""
+        pools = self.pool_stats()
+        executors = {
+            "default": getattr(asyncio.get_running_loop(), "_default_executor", None),
+            "images": self.images.executor,
+            "motor": getattr(motor_framework, "_EXECUTOR", None),
+        }
+        return {
+            "subtask_pool_connections": [
+                ({"pool": name, "state": state}, getattr(stats, state))
+                for name, stats in pools.items()
+                for state in ("open", "in_use", "waiting")
+            ],
+            "subtask_pool_max_connections": [
+                ({"pool": name}, stats.max_size) for name, stats in pools.items()
+            ],
+            "subtask_hashing": [
+                ({"state": state}, value)
+                for state, value in self.hasher.stats().items()
+            ],
+            "subtask_thread_pool_threads": [
+                ({"pool": name}, executor_gauges(executor)[0])
+                for name, executor in executors.items()
+            ],
+            "subtask_thread_pool_queued": [
+                ({"pool": name}, executor_gauges(executor)[1])
+                for name, executor in executors.items()
+            ],
+            "subtask_jobs": [
+                ({"state": state}, value) for state, value in self.jobs.stats.items()
+            ],
+            "subtask_document_cache_lookups": [
+                ({"model": model, "result": result}, value)
+                for model, counts in self.documents.stats.items()
+                for result, value in counts.items()
+            ],
+        }
+
+    def response_cache(self, connection_id: str) -> RedisStore:
+        """Upstream API responses fetched through a connection"""
+        return self.store.with_namespace(f"RESPONSES_{connection_id}")
+
+    async def after_bulk_write(
+        self, model: type[BaseObject], project: str, events: list[ChangeEvent]
+    ) -> None:
+        """Does what the document hooks would have, for documents bulk written without them
+
+        Drops the changed documents from the identity scope & the caches holding them,
+        then publishes the events to the project's feed.
+
+        Args:
+            model (type[BaseObject]): Model written
+            project (str): Project the documents belong to
+            events (list[ChangeEvent]): One per document written successfully
+        """
+        changed = [i.id for i in events if i.action != "created"]
+        model.forget_identities(changed)
+        if issubclass(model, TaskAttribute):
+            await self.attributes.invalidate(project)
+        if issubclass(model, Project):
+            await self.permissions.invalidate(project)
+        if model.cache_ttl:
+            for id in changed:
+                await self.documents.evict(model, id)
+        await self.feed.publish(project, events)
+
+    def evict_file(self, file_id: str) -> None:
+        self.file_info.pop(file_id)
+        self.file_content.pop(file_id)
+
+    async def on_file_write(
+        self, document: BaseObject, action: Literal["save", "delete"]
+    ) -> None:
+        # Covers every deletion, including derivatives removed along with originals
+        if isinstance(document, GridFile) and action == "delete":
+            self.evict_file(document.id)
+
+    async def close(self):
+        for listener in self.write_listeners:
+            BaseObject.remove_write_listener(listener)
+        if BaseObject.document_cache is self.documents:
+            BaseObject.document_cache = None
+        self.hasher.close()
+        self.images.close()
+        self.providers.clear()
+        self.rate_limits.clear()
+        await self.jobs.close()
+        await self.feed.close()
+        await self.sessions.close()
+        await self.metrics.loop_lag.close()
+        await self.http.aclose()
+        await self.redis.aclose()
+        self.mongo.close()
+
 
 async def provide_context(state: State) -> ServerContext:
     return state.context
@@ -10,39 +10,79 @@ from litestar.types import ASGIApp
 
 
 class CookieSessionManager(MiddlewareProtocol):
+    """Attaches a Session to every HTTP request and WebSocket.
+
+    Decoded sessions are served from a short-lived local cache (see SessionCache), and
+    are only written back to Redis when the user changes or `access_time` is older than
+    the configured write interval. Sessions for cookieless requests stay in memory until
+    mutated.
+    """
+
     def __init__(self, app: ASGIApp) -> None:
         super().__init__(app)
         self.app = app
 
+    async def load_session(self, context: ServerContext, token: str) -> Session | None:
+        cached = context.sessions.get(token)
+        if cached:
+            return cached
+
+        result = await Session.from_storage(context.store, token)
+        if result:
+            context.sessions.set(result)
+        return result
+
+    async def store_session(
+        self, context: ServerContext, session: Session, user_changed: bool
+    ) -> None:
+        await session.to_storage(
+            context.store, expire=context.config.sessions.expire
+        )
+        if user_changed:
+            # Other workers may still hold it logged in (or out)
+            await context.sessions.revoke(session.id)
+        context.sessions.set(session)
+
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
-        if scope["type"] == "http":
+        if scope["type"] in ("http", "websocket"):
             connection = ASGIConnection(scope, receive=receive, send=send)
             context: ServerContext = connection.app.state.context
-            active_token = (
-                await Session.from_storage(
-                    context.store,
-                    connection.cookies.get("subtask-token", None),
-                    renew=timedelta(hours=2),
-                )
-                if "subtask-token" in connection.cookies.keys()
-                else None
-            )
-            if active_token:
-                active_token.access_time = datetime.now(UTC)
-                scope["token"] = active_token
-                await active_token.to_storage(context.store, expire=timedelta(hours=2))
-            else:
-                new_session = Session.create()
-                await new_session.to_storage(context.store, expire=timedelta(hours=2))
-                scope["token"] = new_session
+            token = connection.cookies.get("subtask-token", None)
+            active_token = await self.load_session(context, token) if token else None
+            persisted = active_token is not None
+            if not active_token:
+                active_token = Session.create()
+
+            stored_user = active_token.user_id
+            stored_access = active_token.access_time
+            active_token.access_time = datetime.now(UTC)
+            scope["token"] = active_token
+            write_interval = timedelta(seconds=context.config.sessions.write_interval)
 
             async def send_wrapper(message: Message) -> None:
+                nonlocal persisted
                 if message["type"] == "http.response.start":
-                    headers = MutableScopeHeaders.from_message(message=message)
-                    headers["Set-Cookie"] = f"subtask-token={scope['token'].id}"
+                    session: Session = scope["token"]
+                    user_changed = session.user_id != stored_user
+                    if user_changed or (
+                        persisted
+                        and session.access_time - stored_access > write_interval
+                    ):
+                        await self.store_session(
+                            context, session, user_changed and persisted
+                        )
+                        persisted = True
+
+                    if persisted:
+                        headers = MutableScopeHeaders.from_message(message=message)
+                        headers["Set-Cookie"] = (
+                            f"subtask-token={session.id}; Path=/; HttpOnly; SameSite=Lax"
+                        )
                 await send(message)
 
             await self.app(scope, receive, send_wrapper)
+        else:
+            await self.app(scope, receive, send)
 
 
 async def provide_session(scope: Scope) -> Session:
@@ -0,0 +1,132 @@
+import asyncio
+import random
+from typing import Awaitable, Callable, Literal
+from beanie.odm.utils.dump import get_dict
+from beanie.odm.utils.parsing import parse_obj
+from bson import json_util
+from redis.asyncio import Redis
+from ..models import BaseObject
+from .cache import LocalCache
+from .config import DocumentsConfig
+
+TOMBSTONE = "null"  # Cached in place of deleted documents
+TTL_JITTER = 0.1  # Fraction of the TTL shaved off at random, so entries don't expire together
+
+
+class RedisDocumentCache:
+    """Read-through cache of `from_id` lookups, for models with a `cache_ttl`.
+
+    Documents are cached in Redis as their stored (BSON-shaped) form, and for a few
+    seconds in each process. Writes replace the cached copy (deletes leave a tombstone),
+    and fills never overwrite an entry, so a slow read can't restore a stale document.
+    Concurrent misses for the same document share one Mongo read per process.
+    """
+
+    def __init__(self, redis: Redis, config: DocumentsConfig) -> None:
+        self.redis = redis
+        self.local: LocalCache[tuple[str, str], str] = LocalCache(
+            max_entries=config.local_size, ttl=config.local_ttl
+        )
+        self.loading: dict[tuple[str, str], asyncio.Task[str | None]] = {}
+        self.stats: dict[str, dict[str, int]] = {}
+
+    @staticmethod
+    def key(collection: str, id: str) -> str:
+        return f"SUBTASK_DOCUMENT:{collection}:{id}"
+
+    def count(self, model: type[BaseObject], result: str) -> None:
+        counts = self.stats.setdefault(
+            model.get_settings().name, {"local": 0, "redis": 0, "miss": 0}
+        )
+        counts[result] += 1
+
+    @staticmethod
+    def encode(document: BaseObject) -> str:
+        return json_util.dumps(get_dict(document, to_db=True, keep_nulls=True))
+
+    @staticmethod
+    def decode(model: type[BaseObject], encoded: str) -> BaseObject | None:
+        if encoded == TOMBSTONE:
+            return None
+        # Parsed as if read from Mongo, so state management sees an unchanged document
+        return parse_obj(model, json_util.loads(encoded))
+
+    @staticmethod
+    def expiry(model: type[BaseObject]) -> int:
+        return max(int(model.cache_ttl * (1 - random.random() * TTL_JITTER)), 1)
+
+    async def get(
+        self,
+        model: type[BaseObject],
+        id: str,
+        load: Callable[[], Awaitable[BaseObject | None]],
+    ) -> BaseObject | None:
+        """Gets a document from memory, then Redis, then (via `load`) Mongo
+
+        Args:
+            model (type[BaseObject]): Model to get
+            id (str): Document ID
+            load (Callable[[], Awaitable[BaseObject | None]]): Reads the document from Mongo
+
+        Returns:
+            BaseObject | None: A fresh copy of the document, or None if it doesn't exist
+        """
+        local_key = (model.get_settings().name, id)
+        encoded = self.local.get(local_key)
+        if encoded is not None:
+            self.count(model, "local")
+            return self.decode(model, encoded)
+
+        loading = self.loading.get(local_key)
+        if loading is None:
+            loading = asyncio.create_task(self.fill(model, id, load))
+            self.loading[local_key] = loading
+            loading.add_done_callback(lambda _: self.loading.pop(local_key, None))
+        # Shielded, so one caller giving up doesn't cancel the read for the others
+        encoded = await asyncio.shield(loading)
+        return None if encoded is None else self.decode(model, encoded)
+
+    async def fill(
+        self,
+        model: type[BaseObject],
+        id: str,
+        load: Callable[[], Awaitable[BaseObject | None]],
+    ) -> str | None:
+        collection = model.get_settings().name
+        encoded = await self.redis.get(self.key(collection, id))
+        if encoded is not None:
+            self.count(model, "redis")
+            encoded = encoded.decode()
+        else:
+            self.count(model, "miss")
+            document = await load()
+            if document is None:
+                return None
+            encoded = self.encode(document)
+            # Only fill an empty entry, a write since the read has the newer copy
+            if not await self.redis.set(
+                self.key(collection, id), encoded, ex=self.expiry(model), nx=True
+            ):
+                return encoded
+        self.local.set((collection, id), encoded)
+        return encoded
+
+    async def evict(self, model: type[BaseObject], id: str) -> None:
+        """Drops a cached document, after writing it without the document hooks"""
+        collection = model.get_settings().name
+        await self.redis.delete(self.key(collection, id))
+        self.local.pop((collection, id))
+
+    async def on_write(
+        self, document: BaseObject, action: Literal["save", "delete"]
+    ) -> None:
+        model = type(document)
+        if not model.cache_ttl:
+            return
+
+        collection = model.get_settings().name
+        encoded = TOMBSTONE if action == "delete" else self.encode(document)
+        await self.redis.set(
+            self.key(collection, document.id), encoded, ex=self.expiry(model)
+        )
+        self.local.pop((collection, document.id))
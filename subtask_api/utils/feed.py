@@ -0,0 +1,251 @@
+import asyncio
+from contextlib import asynccontextmanager
+import json
+import logging
+from typing import Any, AsyncIterator, Literal
+from pydantic import BaseModel
+from redis.asyncio import Redis
+from ..models import BaseObject, Project, Task, TaskAttribute
+from .config import FeedConfig
+
+logger = logging.getLogger("subtask.feed")
+
+ChangeKind = Literal["project", "task", "attribute"]
+
+
+class ChangeEvent(BaseModel):
+    kind: ChangeKind
+    action: Literal["created", "updated", "deleted", "resync"]
+    id: str
+    fields: dict[str, Any] = {}  # Full document when created, changed fields when updated
+
+    def merge(self, newer: "ChangeEvent") -> "ChangeEvent | None":
+        """Coalesces a newer event for the same object into this one
+
+        Args:
+            newer (ChangeEvent): The following event
+
+        Returns:
+            ChangeEvent | None: The combined event, or None if the two cancel out
+        """
+        if newer.action == "deleted":
+            return None if self.action == "created" else newer
+        if self.action == "deleted":
+            return newer
+        return ChangeEvent(
+            kind=self.kind,
+            action=self.action,
+            id=self.id,
+            fields={**self.fields, **newer.fields},
+        )
+
+
+def describe_change(
+    document: BaseObject, action: Literal["save", "delete"]
+) -> tuple[str, ChangeEvent] | None:
+    """Builds the change event for a written document, if it belongs to a project feed
+
+    Feed models enable Beanie's state management (saving the previous state), which
+    tells creations apart & lets updates carry only the changed fields.
+
+    Args:
+        document (BaseObject): The written document
+        action (Literal["save", "delete"]): What happened to it
+
+    Returns:
+        tuple[str, ChangeEvent] | None: (project ID, event), or None if nothing to publish
+    """
+    kind: ChangeKind
+    if isinstance(document, Project):
+        kind, project = "project", document.id
+    elif isinstance(document, Task):
+        kind, project = "task", document.project
+    elif isinstance(document, TaskAttribute):
+        kind, project = "attribute", document.project
+    else:
+        return None
+
+    if action == "delete":
+        return project, ChangeEvent(kind=kind, action="deleted", id=document.id)
+
+    if document.get_previous_saved_state() is None:
+        return project, ChangeEvent(
+            kind=kind,
+            action="created",
+            id=document.id,
+            fields=document.model_dump(mode="json"),
+        )
+
+    changes = document.get_previous_changes()
+    if len(changes) == 0:
+        return None
+    return project, ChangeEvent(
+        kind=kind, action="updated", id=document.id, fields=changes
+    )
+
+
+class FeedSubscription:
+    """One consumer's buffer of pending events, coalesced per object.
+
+    If a consumer falls so far behind that more than `max_pending` objects are waiting,
+    the buffer is dropped and replaced with a single "resync" event.
+    """
+
+    def __init__(self, project: str, max_pending: int) -> None:
+        self.project = project
+        self.max_pending = max_pending
+        self.pending: dict[tuple[str, str], ChangeEvent] = {}
+        self.overflowed = False
+        self.ready = asyncio.Event()
+
+    def push(self, event: ChangeEvent) -> None:
+        if self.overflowed:
+            return
+
+        key = (event.kind, event.id)
+        existing = self.pending.get(key, None)
+        merged = existing.merge(event) if existing else event
+        if merged is None:
+            self.pending.pop(key)
+        else:
+            self.pending[key] = merged
+
+        if len(self.pending) > self.max_pending:
+            self.pending.clear()
+            self.overflowed = True
+        self.ready.set()
+
+    def resync(self) -> None:
+        self.pending.clear()
+        self.overflowed = True
+        self.ready.set()
+
+    async def next_batch(self, timeout: float) -> list[ChangeEvent]:
+        """Waits for pending events, returning an empty batch if none arrive in time"""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+
+        self.ready.clear()
+        if self.overflowed:
+            self.overflowed = False
+            return [ChangeEvent(kind="project", action="resync", id=self.project)]
+
+        batch = list(self.pending.values())
+        self.pending.clear()
+        return batch
+
+
+class ProjectFeed:
+    """Publishes project change events to Redis, and fans them out to local subscribers.
+
+    Every worker holds a single pattern subscription, so events written by any worker
+    reach the subscribers of every other.
+    """
+
+    def __init__(self, redis: Redis, config: FeedConfig) -> None:
+        self.redis = redis
+        self.config = config
+        self.subscriptions: dict[str, set[FeedSubscription]] = {}
+        self.listener: asyncio.Task | None = None
+
+    @staticmethod
+    def channel(project: str) -> str:
+        return f"SUBTASK_FEED:{project}"
+
+    def start(self) -> None:
+        if self.listener is None:
+            self.listener = asyncio.create_task(self.listen())
+
+    async def listen(self) -> None:
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.psubscribe(self.channel("*"))
+                    async for message in pubsub.listen():
+                        if message["type"] == "pmessage":
+                            self.dispatch(message["channel"], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Change feed listener failed, reconnecting")
+                # Events may have been missed while disconnected
+                for subscriptions in self.subscriptions.values():
+                    for subscription in subscriptions:
+                        subscription.resync()
+                await asyncio.sleep(1)
+
+    def dispatch(self, channel: bytes | str, data: bytes | str) -> None:
+        if isinstance(channel, bytes):
+            channel = channel.decode()
+        subscriptions = self.subscriptions.get(channel.split(":", 1)[1], None)
+        if not subscriptions:
+            return
+
+        events = [ChangeEvent.model_validate(i) for i in json.loads(data)]
+        for subscription in subscriptions:
+            for event in events:
+                subscription.push(event)
+
+    async def publish(self, project: str, events: list[ChangeEvent]) -> None:
+        if len(events) == 0:
+            return
+
+        try:
+            await self.redis.publish(
+                self.channel(project),
+                json.dumps([i.model_dump(mode="json") for i in events]),
+            )
+        except Exception:
+            logger.exception("Failed to publish %s change events", len(events))
+
+    async def on_write(
+        self, document: BaseObject, action: Literal["save", "delete"]
+    ) -> None:
+        change = describe_change(document, action)
+        if change:
+            await self.publish(change[0], [change[1]])
+
+    @asynccontextmanager
+    async def subscribe(self, project: str) -> AsyncIterator[FeedSubscription]:
+        subscription = FeedSubscription(project, self.config.max_pending)
+        self.subscriptions.setdefault(project, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            remaining = self.subscriptions.get(project, set())
+            remaining.discard(subscription)
+            if len(remaining) == 0:
+                self.subscriptions.pop(project, None)
+
+    async def events(self, project: str) -> AsyncIterator[list[ChangeEvent]]:
+        """Yields batches of coalesced events for a project, or an empty batch each heartbeat"""
+        async with self.subscribe(project) as subscription:
+            while True:
+                yield await subscription.next_batch(self.config.heartbeat)
+
+    async def member_events(
+        self, project: str, user: str
+    ) -> AsyncIterator[list[ChangeEvent]]:
+        """Yields batches like `events`, ending once the user is no longer a member
+
+        Membership is re-checked (uncached) after any batch that may change it: member
+        changes, the project's deletion, or a resync that could have hidden either.
+        """
+        async for batch in self.events(project):
+            if any(
+                i.kind == "project" and (i.action != "updated" or "members" in i.fields)
+                for i in batch
+            ) and (await Project.member_permission(project, user)) is None:
+                return
+            yield batch
+
+    async def close(self) -> None:
+        if self.listener:
+            self.listener.cancel()
+            try:
+                await self.listener
+            except asyncio.CancelledError:
+                pass
+            self.listener = None
@@ -0,0 +1,117 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import pbkdf2_hmac
+import hmac
+import multiprocessing
+import os
+from litestar.exceptions import ServiceUnavailableException
+from .config import HashingConfig
+from .metrics import timed
+
+# Parameters of hashes stored before schemes were recorded (the model default)
+LEGACY_SCHEME = "pbkdf2_sha256$500000"
+
+
+class PasswordHasher:
+    """Runs PBKDF2 in a bounded process pool so password checks never block the event loop.
+
+    Hashes are tagged with a scheme string (`pbkdf2_<algorithm>$<iterations>`), so stored
+    hashes can be verified with the parameters they were created with and upgraded
+    when the configured cost changes.
+    """
+
+    def __init__(self, config: HashingConfig) -> None:
+        self.config = config
+        self.executor = ProcessPoolExecutor(
+            max_workers=config.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        self.limiter = asyncio.Semaphore(config.max_concurrency)
+        self.waiting = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def scheme(self) -> str:
+        return f"pbkdf2_{self.config.algorithm}${self.config.iterations}"
+
+    @staticmethod
+    def parse_scheme(scheme: str) -> tuple[str, int]:
+        name, iterations = scheme.split("$", maxsplit=1)
+        if not name.startswith("pbkdf2_"):
+            raise ValueError(f"Unsupported hash scheme `{scheme}`")
+        return name.removeprefix("pbkdf2_"), int(iterations)
+
+    async def hash(self, password: str, salt: bytes, scheme: str | None = None) -> str:
+        """Hashes a password in the process pool
+
+        Args:
+            password (str): Password to hash
+            salt (bytes): Salt to hash with
+            scheme (str | None, optional): Scheme to hash with. Defaults to the configured scheme.
+
+        Raises:
+            ServiceUnavailableException: If too many hashes are already queued
+
+        Returns:
+            str: Hex-encoded hash
+        """
+        algorithm, iterations = self.parse_scheme(scheme or self.scheme)
+        if self.waiting >= self.config.max_waiting:
+            self.rejected += 1
+            raise ServiceUnavailableException(
+                "Too many concurrent authentication requests, try again later."
+            )
+
+        with timed("hashing"):
+            self.waiting += 1
+            try:
+                await self.limiter.acquire()
+            finally:
+                self.waiting -= 1
+
+            self.active += 1
+            try:
+                result = await asyncio.get_running_loop().run_in_executor(
+                    self.executor,
+                    pbkdf2_hmac,
+                    algorithm,
+                    password.encode(),
+                    salt,
+                    iterations,
+                )
+            finally:
+                self.active -= 1
+                self.limiter.release()
+
+        self.completed += 1
+        return result.hex()
+
+    async def generate(self, password: str) -> tuple[str, str, str]:
+        """Hashes a password with a fresh salt and the configured scheme
+
+        Args:
+            password (str): Password to hash
+
+        Returns:
+            tuple[str, str, str]: (hash, salt, scheme), hash & salt hex-encoded
+        """
+        salt = os.urandom(32)
+        return await self.hash(password, salt), salt.hex(), self.scheme
+
+    async def verify(self, attempt: str, hashed: str, salt: str, scheme: str) -> bool:
+        hashed_attempt = await self.hash(attempt, bytes.fromhex(salt), scheme)
+        return hmac.compare_digest(hashed_attempt, hashed)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "waiting": self.waiting,
+            "active": self.active,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "max_concurrency": self.config.max_concurrency,
+        }
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,20 @@
+from ..models import identity_scope
+from litestar.types import Receive, Scope, Send
+from litestar.middleware.base import MiddlewareProtocol
+from litestar.types import ASGIApp
+
+
+class IdentityMapMiddleware(MiddlewareProtocol):
+    """Gives each request its own identity map, so guards, dependencies and handlers share loaded documents."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        super().__init__(app)
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] in ("http", "websocket"):
+            with identity_scope() as identities:
+                scope["identity_map"] = identities
+                await self.app(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
@@ -0,0 +1,160 @@
+import asyncio
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from PIL import Image, ImageOps
+from ..models import GridFile
+from .config import ImagesConfig
+
+logger = logging.getLogger("subtask.images")
+
+
+def render_variant(content: bytes, size: int, format: str, quality: int) -> bytes | None:
+    """Resizes & re-encodes an image to fit within a size x size box
+
+    Args:
+        content (bytes): Original image
+        size (int): Bounding size in pixels
+        format (str): Pillow format name to encode with
+        quality (int): Encoder quality
+
+    Returns:
+        bytes | None: The encoded derivative, or None if the original should be served instead
+    """
+    try:
+        with Image.open(BytesIO(content)) as image:
+            if getattr(image, "is_animated", False) or max(image.size) <= size:
+                return None
+
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+            if image.mode not in ("RGB", "RGBA"):
+                has_alpha = image.mode in ("LA", "PA") or "transparency" in image.info
+                image = image.convert("RGBA" if has_alpha else "RGB")
+
+            output = BytesIO()
+            image.save(output, format=format, quality=quality)
+            return output.getvalue()
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+class ImageVariants:
+    """Generates resized derivatives of uploaded images in a bounded worker pool.
+
+    Derivatives are stored as GridFiles linked from the original's `variants`, and are
+    generated at most once per (file, size) in this worker.
+    """
+
+    def __init__(self, config: ImagesConfig) -> None:
+        self.config = config
+        self.executor = ThreadPoolExecutor(
+            max_workers=config.workers, thread_name_prefix="subtask-images"
+        )
+        self.pending: dict[tuple[str, int], asyncio.Future[GridFile | None]] = {}
+        self.background: set[asyncio.Task] = set()
+
+    def supports(self, file: GridFile) -> bool:
+        return (
+            file.variant_of is None
+            and file.file_type in self.config.types
+            and (file.size is None or file.size <= self.config.max_source_size)
+        )
+
+    def pick_size(self, requested: int) -> int | None:
+        """Picks the smallest configured size that covers the requested size
+
+        Args:
+            requested (int): Requested bounding size
+
+        Returns:
+            int | None: Configured size, or None if the original should be served
+        """
+        candidates = [i for i in sorted(self.config.sizes) if i >= requested]
+        return candidates[0] if candidates else None
+
+    async def get_variant(self, original: GridFile, size: int) -> GridFile:
+        """Gets (generating if needed) the file to serve for a configured size
+
+        Args:
+            original (GridFile): Original file
+            size (int): A configured bounding size
+
+        Returns:
+            GridFile: The derivative, or the original if no derivative applies
+        """
+        if not self.supports(original):
+            return original
+
+        variant_id = original.variants.get(str(size))
+        if variant_id:
+            if variant_id == original.id:
+                return original
+            variant = await GridFile.from_id(variant_id)
+            if variant:
+                return variant
+
+        key = (original.id, size)
+        if key not in self.pending:
+            self.pending[key] = asyncio.ensure_future(self.generate(original, size))
+            self.pending[key].add_done_callback(lambda _: self.pending.pop(key, None))
+        return await asyncio.shield(self.pending[key]) or original
+
+    async def generate(self, original: GridFile, size: int) -> GridFile | None:
+        rendered = await asyncio.get_running_loop().run_in_executor(
+            self.executor,
+            render_variant,
+            await original.read(),
+            size,
+            self.config.format,
+            self.config.quality,
+        )
+        if rendered is None:
+            await original.link_variant(size, original.id)
+            return None
+
+        variant = await GridFile.create(
+            rendered,
+            original.owner_collection,
+            original.owner_id,
+            file_name=f"{original.id}_{size}.{self.config.format.lower()}",
+            file_type=Image.MIME[self.config.format.upper()],
+            variant_of=original.id,
+            variant=size,
+        )
+        linked = await original.link_variant(size, variant.id)
+        if linked != variant.id:
+            await variant.delete()
+            return await GridFile.from_id(linked)
+        return variant
+
+    def schedule(self, original: GridFile) -> None:
+        """Generates all configured derivatives of a newly uploaded file in the background
+
+        Args:
+            original (GridFile): Newly uploaded file
+        """
+        if not self.config.eager or not self.supports(original):
+            return
+
+        async def generate_all():
+            for size in self.config.sizes:
+                await self.get_variant(original, size)
+
+        # Outlives the request, so mustn't share its identity scope or timings
+        task = asyncio.create_task(generate_all(), context=contextvars.Context())
+        self.background.add(task)
+        task.add_done_callback(self.finish_background)
+
+    def finish_background(self, task: asyncio.Task) -> None:
+        self.background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(
+                "Failed to generate image derivatives", exc_info=task.exception()
+            )
+
+    def close(self) -> None:
+        for task in self.background:
+            task.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
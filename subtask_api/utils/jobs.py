@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import os
+from secrets import token_urlsafe
+import socket
+import time
+from typing import Any, Awaitable, Callable
+from pydantic import BaseModel, Field
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+from .config import JobsConfig
+
+logger = logging.getLogger("subtask.jobs")
+
+JobHandler = Callable[[dict[str, Any]], Awaitable[None]]
+PeriodicHandler = Callable[[], Awaitable[None]]
+
+STREAM_KEY = "SUBTASK_JOBS"
+DELAYED_KEY = "SUBTASK_JOBS_DELAYED"  # Jobs waiting to be retried, scored by due time
+DEAD_KEY = "SUBTASK_JOBS_DEAD"  # Jobs that failed every attempt
+GROUP = "workers"
+READ_BLOCK = 5  # Seconds a worker waits on the stream before checking in again
+IDLE_DELAY = 0.2  # Seconds a worker pauses after a read returns nothing
+SCHEDULE_INTERVAL = 1  # Seconds between moving due retries & reclaiming stale jobs
+
+# Moves due retries onto the stream in one step, so a job is never in both or neither
+MOVE_DUE_SCRIPT = """
+local due = redis.call("ZRANGEBYSCORE", KEYS[1], "-inf", ARGV[1], "LIMIT", 0, ARGV[2])
+for _, member in ipairs(due) do
+    redis.call("ZREM", KEYS[1], member)
+    redis.call("XADD", KEYS[2], "*", "job", member)
+end
+return #due
+"""
+
+
+class Job(BaseModel):
+    id: str = Field(default_factory=lambda: token_urlsafe(16))
+    kind: str
+    payload: dict[str, Any]
+    attempts: int = 0  # Failed attempts so far
+
+
+class JobQueue:
+    """Durable background jobs on a Redis stream, run by a few workers in every process.
+
+    A job stays pending in the stream's consumer group until its handler succeeds, so
+    jobs survive restarts. A worker re-claims its running job every half `claim_after`,
+    so a job idle for longer (its worker died) is requeued, however long handlers run.
+    Failed jobs are retried with exponential backoff, then moved to a dead letter list
+    once out of attempts.
+    """
+
+    def __init__(self, redis: Redis, config: JobsConfig) -> None:
+        self.redis = redis
+        self.config = config
+        self.handlers: dict[str, JobHandler] = {}
+        self.periodic: list[tuple[str, float, PeriodicHandler]] = []
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}-{token_urlsafe(4)}"
+        self.tasks: list[asyncio.Task] = []
+        self.move_due = redis.register_script(MOVE_DUE_SCRIPT)
+        self.stats = {"running": 0, "succeeded": 0, "retried": 0, "dead": 0}
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        """Sets the coroutine that runs jobs of a kind (with their payload)"""
+        self.handlers[kind] = handler
+
+    def every(self, name: str, interval: float, handler: PeriodicHandler) -> None:
+        """Runs a coroutine every `interval` seconds in each process, while workers run
+
+        Every process runs it, so it must be safe to overlap (e.g. guarded by a lock).
+        """
+        self.periodic.append((name, interval, handler))
+
+    async def enqueue(self, kind: str, payload: dict[str, Any]) -> Job:
+        job = Job(kind=kind, payload=payload)
+        await self.redis.xadd(STREAM_KEY, {"job": job.model_dump_json()})
+        return job
+
+    async def start(self) -> None:
+        if len(self.tasks) > 0:
+            return
+        try:
+            await self.redis.xgroup_create(STREAM_KEY, GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+        self.tasks = [
+            asyncio.create_task(self.work()) for _ in range(self.config.workers)
+        ]
+        self.tasks.append(asyncio.create_task(self.schedule()))
+        self.tasks.extend(
+            asyncio.create_task(self.repeat(name, interval, handler))
+            for name, interval, handler in self.periodic
+        )
+
+    async def work(self) -> None:
+        while True:
+            try:
+                entries = await self.redis.xreadgroup(
+                    GROUP,
+                    self.consumer,
+                    {STREAM_KEY: ">"},
+                    count=1,
+                    block=int(READ_BLOCK * 1000),
+                )
+                if not entries:
+                    # Not every server honours BLOCK on an empty stream, so don't spin
+                    await asyncio.sleep(IDLE_DELAY)
+                for _, messages in entries or []:
+                    for entry_id, fields in messages:
+                        job = Job.model_validate_json(fields[b"job"])
+                        await self.run(entry_id, job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job worker failed to read the queue, retrying")
+                await asyncio.sleep(READ_BLOCK)
+
+    async def run(self, entry_id: bytes, job: Job) -> None:
+        handler = self.handlers.get(job.kind)
+        self.stats["running"] += 1
+        holding = asyncio.create_task(self.hold(entry_id))
+        try:
+            if handler is None:
+                raise LookupError(f"No handler for `{job.kind}` jobs")
+            await handler(job.payload)
+        except Exception:
+            logger.exception("Job `%s` (%s) failed", job.id, job.kind)
+            await self.requeue(entry_id, job)
+        else:
+            self.stats["succeeded"] += 1
+            await self.finish(entry_id)
+        finally:
+            holding.cancel()
+            self.stats["running"] -= 1
+
+    async def hold(self, entry_id: bytes) -> None:
+        """Keeps resetting a running job's idle time, so it isn't presumed abandoned"""
+        while True:
+            await asyncio.sleep(self.config.claim_after / 2)
+            try:
+                await self.redis.xclaim(
+                    STREAM_KEY, GROUP, self.consumer, 0, [entry_id], justid=True
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Failed to extend the claim on a running job")
+
+    async def finish(self, entry_id: bytes) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xack(STREAM_KEY, GROUP, entry_id)
+            pipe.xdel(STREAM_KEY, entry_id)
+            await pipe.execute()
+
+    async def requeue(self, entry_id: bytes, job: Job) -> None:
+        """Schedules a failed job's retry (or buries it), removing it from the stream"""
+        job.attempts += 1
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if job.attempts >= self.config.max_attempts:
+                logger.error(
+                    "Job `%s` failed %s times, giving up", job.id, job.attempts
+                )
+                self.stats["dead"] += 1
+                pipe.lpush(DEAD_KEY, job.model_dump_json())
+            else:
+                self.stats["retried"] += 1
+                due = time.time() + self.config.retry_delay * 2 ** (job.attempts - 1)
+                pipe.zadd(DELAYED_KEY, {job.model_dump_json(): due})
+            pipe.xack(STREAM_KEY, GROUP, entry_id)
+            pipe.xdel(STREAM_KEY, entry_id)
+            await pipe.execute()
+
+    async def schedule(self) -> None:
+        """Moves due retries onto the stream, and requeues jobs abandoned by dead workers"""
+        while True:
+            try:
+                await self.move_due(
+                    keys=[DELAYED_KEY, STREAM_KEY], args=[time.time(), 100]
+                )
+
+                claimed = await self.redis.xautoclaim(
+                    STREAM_KEY,
+                    GROUP,
+                    self.consumer,
+                    min_idle_time=int(self.config.claim_after * 1000),
+                    count=100,
+                )
+                for entry_id, fields in claimed[1]:
+                    if not fields:  # Deleted since it was read (Redis 6.2 lists these)
+                        await self.redis.xack(STREAM_KEY, GROUP, entry_id)
+                        continue
+                    job = Job.model_validate_json(fields[b"job"])
+                    logger.warning("Job `%s` was abandoned, requeueing it", job.id)
+                    await self.requeue(entry_id, job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Failed to schedule queued jobs")
+            await asyncio.sleep(SCHEDULE_INTERVAL)
+
+    async def repeat(
+        self, name: str, interval: float, handler: PeriodicHandler
+    ) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await handler()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Periodic job `%s` failed", name)
+
+    async def close(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
@@ -0,0 +1,213 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from time import perf_counter
+from typing import Any, Iterator
+import httpx
+from pymongo import monitoring
+from redis.asyncio import Redis
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Seconds spent in each backend during the current request
+REQUEST_TIMINGS: ContextVar[dict[str, float] | None] = ContextVar(
+    "request_timings", default=None
+)
+# Mongo events are reported from driver threads
+TIMINGS_LOCK = Lock()
+
+Labels = tuple[tuple[str, str], ...]
+Gauges = dict[str, list[tuple[dict[str, str], float]]]
+
+
+def record(backend: str, seconds: float) -> None:
+    """Adds time spent in a backend to the current request's breakdown, if any"""
+    timings = REQUEST_TIMINGS.get()
+    if timings is not None:
+        with TIMINGS_LOCK:
+            timings[backend] = timings.get(backend, 0) + seconds
+
+
+@contextmanager
+def timed(backend: str) -> Iterator[None]:
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        record(backend, perf_counter() - started)
+
+
+class CommandTimer(monitoring.CommandListener):
+    """Attributes the duration of every Mongo command to the request that issued it"""
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        record("mongo", event.duration_micros / 1e6)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        record("mongo", event.duration_micros / 1e6)
+
+
+def time_redis(redis: Redis) -> Redis:
+    """Times every command sent through a Redis client (pub/sub excluded)"""
+    execute_command = redis.execute_command
+
+    async def timed_execute_command(*args, **options) -> Any:
+        with timed("redis"):
+            return await execute_command(*args, **options)
+
+    redis.execute_command = timed_execute_command
+    return redis
+
+
+def time_http(http: httpx.AsyncClient) -> httpx.AsyncClient:
+    """Times outbound requests (made by connection providers) up to their response headers"""
+
+    async def on_request(request: httpx.Request) -> None:
+        request.extensions["started"] = perf_counter()
+
+    async def on_response(response: httpx.Response) -> None:
+        started = response.request.extensions.get("started", None)
+        if started is not None:
+            record("provider", perf_counter() - started)
+
+    http.event_hooks["request"].append(on_request)
+    http.event_hooks["response"].append(on_response)
+    return http
+
+
+def executor_gauges(executor: Any) -> tuple[float, float]:
+    """(threads, queued work items) of a ThreadPoolExecutor, or zeros if it isn't one"""
+    if not isinstance(executor, ThreadPoolExecutor):
+        return 0, 0
+    return len(executor._threads), executor._work_queue.qsize()
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: Labels) -> list[str]:
+        lines = [
+            f"{name}_bucket{format_labels(labels + (('le', str(bound)),))} {count}"
+            for bound, count in zip(self.buckets, self.counts)
+        ]
+        lines.append(
+            f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {self.count}"
+        )
+        lines.append(f"{name}_sum{format_labels(labels)} {self.sum}")
+        lines.append(f"{name}_count{format_labels(labels)} {self.count}")
+        return lines
+
+
+def format_labels(labels: Labels) -> str:
+    if len(labels) == 0:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a sleeping task (how long callbacks queue)"""
+
+    def __init__(self, interval: float = 0.5) -> None:
+        self.interval = interval
+        self.lag = 0.0
+        self.max_lag = 0.0  # Since the last scrape
+        self.task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self.task is None:
+            self.task = asyncio.create_task(self.measure())
+
+    async def measure(self) -> None:
+        while True:
+            started = perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lag = max(perf_counter() - started - self.interval, 0)
+            self.max_lag = max(self.max_lag, self.lag)
+
+    async def close(self) -> None:
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+
+class Metrics:
+    """Per-route latency histograms, broken down by the backends each request waited on"""
+
+    def __init__(self) -> None:
+        self.requests: dict[Labels, Histogram] = {}
+        self.backends: dict[Labels, Histogram] = {}
+        self.loop_lag = LoopLagMonitor()
+
+    def observe_request(
+        self, method: str, route: str, seconds: float, timings: dict[str, float]
+    ) -> None:
+        labels: Labels = (("method", method), ("route", route))
+        self.requests.setdefault(labels, Histogram()).observe(seconds)
+        for backend, spent in timings.items():
+            self.backends.setdefault(
+                labels + (("backend", backend),), Histogram()
+            ).observe(spent)
+
+    def render(self, gauges: Gauges) -> str:
+        """Renders every metric in the Prometheus text exposition format
+
+        Args:
+            gauges (Gauges): Current gauge values, as name -> [(labels, value)]
+
+        Returns:
+            str: The exposition
+        """
+        lines = [
+            "# HELP subtask_request_seconds Time taken to handle requests",
+            "# TYPE subtask_request_seconds histogram",
+        ]
+        for labels, histogram in self.requests.items():
+            lines.extend(histogram.render("subtask_request_seconds", labels))
+
+        lines.extend(
+            [
+                "# HELP subtask_request_backend_seconds Time requests spent on a backend",
+                "# TYPE subtask_request_backend_seconds histogram",
+            ]
+        )
+        for labels, histogram in self.backends.items():
+            lines.extend(histogram.render("subtask_request_backend_seconds", labels))
+
+        gauges = {
+            **gauges,
+            "subtask_event_loop_lag_seconds": [({}, self.loop_lag.lag)],
+            "subtask_event_loop_max_lag_seconds": [({}, self.loop_lag.max_lag)],
+        }
+        self.loop_lag.max_lag = self.loop_lag.lag
+        for name, values in gauges.items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(
+                f"{name}{format_labels(tuple(labels.items()))} {value}"
+                for labels, value in values
+            )
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,59 @@
+from secrets import randbits
+from typing import Literal
+from redis.asyncio import Redis
+from ..models import BaseObject, Project, ProjectPermission
+from .cache import LocalCache
+
+VERSION_TTL = 86400  # Seconds a project's version stamp outlives its last write
+LOCAL_TTL = 3600  # Shorter than VERSION_TTL, so entries read before a write expire first
+
+
+class PermissionCache:
+    """In-process cache of each user's permission level in each project.
+
+    Lookups fetch only the matching member entry (not the whole project), and every
+    project write sets a new random version stamp in Redis, so all workers drop their
+    cached permissions for that project on their next lookup. Stamps expire a day
+    after the last write and then read as 0, like a project never written.
+    """
+
+    def __init__(self, redis: Redis, max_entries: int = 16384) -> None:
+        self.redis = redis
+        self.local: LocalCache[
+            tuple[str, str], tuple[int, ProjectPermission | None]
+        ] = LocalCache(max_entries=max_entries, ttl=LOCAL_TTL)
+
+    @staticmethod
+    def version_key(project: str) -> str:
+        return f"SUBTASK_PERMISSIONS_VERSION:{project}"
+
+    async def get(self, project: str, user: str) -> ProjectPermission | None:
+        """Gets a user's permission level in a project
+
+        Args:
+            project (str): Project ID
+            user (str): User ID
+
+        Returns:
+            ProjectPermission | None: The user's level, or None if not a member (or no such project)
+        """
+        version = int(await self.redis.get(self.version_key(project)) or 0)
+        cached = self.local.get((project, user))
+        if cached and cached[0] == version:
+            return cached[1]
+
+        permission = await Project.member_permission(project, user)
+        self.local.set((project, user), (version, permission))
+        return permission
+
+    async def invalidate(self, project: str) -> None:
+        # Random rather than counted, so a stamp can't recur once its key expires
+        await self.redis.set(
+            self.version_key(project), randbits(62) + 1, ex=VERSION_TTL
+        )
+
+    async def on_write(
+        self, document: BaseObject, action: Literal["save", "delete"]
+    ) -> None:
+        if isinstance(document, Project):
+            await self.invalidate(document.id)
@@ -0,0 +1,99 @@
+from threading import Lock
+from typing import Any
+from pydantic import BaseModel, computed_field
+from pymongo import monitoring
+
+
+class PoolStats(BaseModel):
+    open: int  # Connections currently open
+    in_use: int  # Connections checked out by an operation
+    waiting: int  # Operations waiting for a free connection
+    max_size: int
+
+    @computed_field
+    @property
+    def saturation(self) -> float:
+        return self.in_use / self.max_size if self.max_size > 0 else 0
+
+
+class MongoPoolMonitor(monitoring.ConnectionPoolListener):
+    """Tracks connection pool usage per server from PyMongo's CMAP events.
+
+    Events arrive from driver threads, so counters are updated under a lock.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.lock = Lock()
+        self.open: dict[Any, int] = {}
+        self.in_use: dict[Any, int] = {}
+        self.waiting: dict[Any, int] = {}
+
+    def adjust(self, counter: dict[Any, int], address: Any, change: int) -> None:
+        with self.lock:
+            counter[address] = max(counter.get(address, 0) + change, 0)
+
+    def stats(self) -> PoolStats:
+        """Reports the busiest server's pool, since each server has its own"""
+        with self.lock:
+            busiest = max(self.in_use, key=self.in_use.__getitem__, default=None)
+            return PoolStats(
+                open=self.open.get(busiest, 0),
+                in_use=self.in_use.get(busiest, 0),
+                waiting=sum(self.waiting.values()),
+                max_size=self.max_size,
+            )
+
+    def pool_created(self, event: monitoring.PoolCreatedEvent) -> None:
+        pass
+
+    def pool_ready(self, event: monitoring.PoolReadyEvent) -> None:
+        pass
+
+    def pool_cleared(self, event: monitoring.PoolClearedEvent) -> None:
+        pass
+
+    def pool_closed(self, event: monitoring.PoolClosedEvent) -> None:
+        with self.lock:
+            for counter in (self.open, self.in_use, self.waiting):
+                counter.pop(event.address, None)
+
+    def connection_created(self, event: monitoring.ConnectionCreatedEvent) -> None:
+        self.adjust(self.open, event.address, 1)
+
+    def connection_ready(self, event: monitoring.ConnectionReadyEvent) -> None:
+        pass
+
+    def connection_closed(self, event: monitoring.ConnectionClosedEvent) -> None:
+        self.adjust(self.open, event.address, -1)
+
+    def connection_check_out_started(
+        self, event: monitoring.ConnectionCheckOutStartedEvent
+    ) -> None:
+        self.adjust(self.waiting, event.address, 1)
+
+    def connection_check_out_failed(
+        self, event: monitoring.ConnectionCheckOutFailedEvent
+    ) -> None:
+        self.adjust(self.waiting, event.address, -1)
+
+    def connection_checked_out(
+        self, event: monitoring.ConnectionCheckedOutEvent
+    ) -> None:
+        self.adjust(self.waiting, event.address, -1)
+        self.adjust(self.in_use, event.address, 1)
+
+    def connection_checked_in(self, event: monitoring.ConnectionCheckedInEvent) -> None:
+        self.adjust(self.in_use, event.address, -1)
+
+
+def redis_pool_stats(pool: Any) -> PoolStats:
+    """Reports usage of a redis-py asyncio BlockingConnectionPool"""
+    in_use = len(getattr(pool, "_in_use_connections", ()))
+    available = len(getattr(pool, "_available_connections", ()))
+    return PoolStats(
+        open=in_use + available,
+        in_use=in_use,
+        waiting=0,  # Not tracked by redis-py
+        max_size=pool.max_connections,
+    )
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+from redis.asyncio import Redis
+from ..models import Session
+from .cache import LocalCache
+from .config import SessionConfig
+
+logger = logging.getLogger("subtask.sessions")
+
+REVOKED_CHANNEL = "SUBTASK_SESSIONS_REVOKED"
+
+
+class SessionCache:
+    """Short-lived in-process cache of decoded sessions, kept coherent across workers.
+
+    Changing a session's user (logging in or out) publishes its token, and every worker
+    drops its cached copy. The cache is bypassed whenever this worker isn't subscribed,
+    since revocations published meanwhile would be missed.
+    """
+
+    def __init__(self, redis: Redis, config: SessionConfig) -> None:
+        self.redis = redis
+        self.local: LocalCache[str, Session] = LocalCache(
+            max_entries=config.cache_size, ttl=config.cache_ttl
+        )
+        self.subscribed = False
+        self.listener: asyncio.Task | None = None
+
+    def get(self, token: str) -> Session | None:
+        cached = self.local.get(token) if self.subscribed else None
+        return cached.model_copy() if cached else None
+
+    def set(self, session: Session) -> None:
+        if self.subscribed:
+            self.local.set(session.id, session.model_copy())
+
+    async def revoke(self, token: str) -> None:
+        """Drops a session from the cache of every worker
+
+        Args:
+            token (str): ID of the changed session
+        """
+        self.local.pop(token)
+        await self.redis.publish(REVOKED_CHANNEL, token)
+
+    def start(self) -> None:
+        if self.listener is None:
+            self.listener = asyncio.create_task(self.listen())
+
+    async def listen(self) -> None:
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(REVOKED_CHANNEL)
+                    self.subscribed = True
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            token = message["data"]
+                            self.local.pop(
+                                token.decode() if isinstance(token, bytes) else token
+                            )
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Revocations may be missed until resubscribed
+                self.subscribed = False
+                self.local.clear()
+                logger.exception("Session revocation listener failed, reconnecting")
+                await asyncio.sleep(1)
+
+    async def close(self) -> None:
+        self.subscribed = False
+        if self.listener:
+            self.listener.cancel()
+            try:
+                await self.listener
+            except asyncio.CancelledError:
+                pass
+            self.listener = None
@@ -0,0 +1,49 @@
+from time import perf_counter
+from litestar.datastructures import MutableScopeHeaders
+from litestar.types import ASGIApp, Message, Receive, Scope, Send
+from litestar.middleware.base import MiddlewareProtocol
+from .metrics import REQUEST_TIMINGS
+
+
+class TimingMiddleware(MiddlewareProtocol):
+    """Times each HTTP request & the backends it waits on.
+
+    The breakdown is sent back in a `Server-Timing` header, and recorded in the route's
+    histograms once the response is complete.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        super().__init__(app)
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: dict[str, float] = {}
+        token = REQUEST_TIMINGS.set(timings)
+        started = perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                elapsed = perf_counter() - started
+                headers = MutableScopeHeaders.from_message(message=message)
+                headers["Server-Timing"] = ", ".join(
+                    [f"{k};dur={v * 1000:.1f}" for k, v in timings.items()]
+                    + [f"total;dur={elapsed * 1000:.1f}"]
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_TIMINGS.reset(token)
+            context = scope["app"].state.context
+            if context:
+                context.metrics.observe_request(
+                    scope["method"],
+                    scope.get("path_template", "unmatched"),  # Raw paths would explode the labels
+                    perf_counter() - started,
+                    timings,
+                )
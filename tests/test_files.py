@@ -0,0 +1,43 @@
+import asyncio
+import io
+import unittest
+from litestar.testing import AsyncTestClient
+from PIL import Image
+from subtask_api import app
+from benchmarks.scenarios import create_user
+from benchmarks.standins import gridfs_support, standin_context
+
+
+class FileVariantTests(unittest.TestCase):
+    """Runs on the benchmark stand-ins: python -m unittest discover tests"""
+
+    def test_variant_after_original(self):
+        async def run() -> None:
+            app.state.context = standin_context()
+            async with AsyncTestClient(app=app, raise_server_exceptions=False) as client:
+                await create_user(client)
+                image = io.BytesIO()
+                Image.new("RGB", (200, 200), "red").save(image, "PNG")
+                response = await client.put(
+                    "/user/self/settings/avatar",
+                    content=image.getvalue(),
+                    headers={"Content-Type": "image/png"},
+                )
+                response.raise_for_status()
+                file_id = response.json()["avatar"].split("/")[-1]
+
+                original = await client.get(f"/files/{file_id}")
+                self.assertEqual(original.content, image.getvalue())
+                variant = await client.get(f"/files/{file_id}", params={"size": 32})
+                self.assertEqual(variant.status_code, 200)
+                self.assertNotEqual(variant.headers["ETag"], original.headers["ETag"])
+                self.assertEqual(
+                    Image.open(io.BytesIO(variant.content)).size, (32, 32)
+                )
+
+        with gridfs_support(None):
+            asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()